@@ -0,0 +1,87 @@
+"""
+Serving of the fingerprinted and precompressed static assets built by scripts/build_assets.py.
+"""
+import os
+import json
+import anyio
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from compression import negotiate_encoder
+
+
+STATIC_DIR = "static"
+DIST_DIR = "dist"
+MANIFEST_PATH = os.path.join(STATIC_DIR, DIST_DIR, "manifest.json")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Third party assets copied under static/vendor by the build, the CDN is used until they are built
+VENDOR_ASSETS = {
+    "vendor/bootstrap.min.css": "https://cdn.jsdelivr.net/npm/bootstrap@5.3.0-alpha3/dist/css/bootstrap.min.css",
+    "vendor/bootstrap.bundle.min.js": "https://cdn.jsdelivr.net/npm/bootstrap@5.3.0-alpha3/dist/js/bootstrap.bundle.min.js",
+}
+# Suffix of the precompressed files of every encoding
+ENCODED_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def load_manifest(path: str = MANIFEST_PATH):
+    """
+    Reads the manifest written by the build.
+
+    Args:
+        path (str): The manifest location
+
+    Returns:
+        dict: The fingerprinted path of every asset, relative to the static directory, empty if it wasn't built
+    """
+    try:
+        with open(path) as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return {}
+
+
+manifest = load_manifest()
+
+
+def asset_url(path: str):
+    """
+    Resolves the url of a static asset, used by the templates.
+
+    Args:
+        path (str): The asset path relative to the static directory, like "css/styles.css"
+
+    Returns:
+        str: The url of the fingerprinted asset, or of the original one when the assets aren't built
+    """
+    if path in manifest:
+        return f"/static/{manifest[path]}"
+    return VENDOR_ASSETS.get(path, f"/static/{path}")
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    Static files that serves the brotli or gzip variant built next to a file when the client accepts it.
+
+    Fingerprinted files are cached by the browser for a year, any other file is revalidated on every use.
+
+    """
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if not isinstance(response, FileResponse):
+            return response
+        fingerprinted = path.replace(os.sep, "/").startswith(f"{DIST_DIR}/")
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if fingerprinted else "no-cache"
+        if not fingerprinted:
+            return response
+
+        response.headers["Vary"] = "Accept-Encoding"
+        encoder = negotiate_encoder(Headers(scope=scope).get("accept-encoding", ""))
+        if encoder is None:
+            return response
+        full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path,
+                                                                path + ENCODED_SUFFIXES[encoder.name])
+        if stat_result is None:
+            return response
+        headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "Vary": "Accept-Encoding",
+                   "Content-Encoding": encoder.name}
+        return FileResponse(full_path, stat_result=stat_result, headers=headers, media_type=response.media_type)
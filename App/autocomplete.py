@@ -0,0 +1,450 @@
+"""
+Type-ahead completion of movie titles from the titles this worker already knows.
+
+Every title is indexed under its normalized form and the suffixes starting at each of its words, so
+"godf" matches "The Godfather", in a sorted array searched with bisection. The matches of a prefix are
+ranked by how many users added the movie, then by its TMDB popularity. Prefixes matching too many
+keys to rank them on every keystroke keep their best ranked titles, updated as titles are added.
+
+Titles added between two compactions go to a short sorted list of recent keys, searched along the
+array, so no request pays for inserting into the whole array. The background task of the completer
+merges them into a new index, evicting the worst ranked titles past the maximum.
+"""
+import os
+import time
+import heapq
+import asyncio
+import logging
+import unicodedata
+from bisect import bisect_left, insort
+from dataclasses import dataclass, replace
+from sqlalchemy import select, func
+from db.client import AsyncSessionLocal
+from db.models.models import Catalog, CatalogStats
+
+
+AUTOCOMPLETE_MAX_TITLES = int(os.environ.get("AUTOCOMPLETE_MAX_TITLES", 50000))
+AUTOCOMPLETE_REFRESH_SECONDS = float(os.environ.get("AUTOCOMPLETE_REFRESH_SECONDS", 600))
+# Seconds between the checks for recent keys to merge or titles to evict
+AUTOCOMPLETE_COMPACT_SECONDS = float(os.environ.get("AUTOCOMPLETE_COMPACT_SECONDS", 10))
+# Recent keys above which they are merged at the next check
+AUTOCOMPLETE_RECENT_KEYS = int(os.environ.get("AUTOCOMPLETE_RECENT_KEYS", 2048))
+# Prefixes matching more keys than this keep their best ranked titles instead of ranking the matches
+AUTOCOMPLETE_SCAN_LIMIT = int(os.environ.get("AUTOCOMPLETE_SCAN_LIMIT", 64))
+# Typed texts shorter than this never fall back to a TMDB search
+AUTOCOMPLETE_TMDB_MIN_LENGTH = int(os.environ.get("AUTOCOMPLETE_TMDB_MIN_LENGTH", 3))
+# Maximum number of completions of a prefix
+AUTOCOMPLETE_LIMIT = 20
+# Only the suffixes starting at the first words of a title are indexed, and only up to this length
+MAX_KEY_WORDS = 8
+MAX_KEY_LENGTH = 64
+# Share of the maximum kept, the best ranked titles, when the index is compacted past its maximum
+EVICTION_RATIO = 0.9
+
+logger = logging.getLogger("mytopmovies.autocomplete")
+
+
+def normalize(text: str):
+    """
+    Lowercases a text, removes its accents and punctuation and collapses its whitespace.
+
+    Args:
+        text (str): The text
+
+    Returns:
+        str: The normalized text
+    """
+    text = unicodedata.normalize("NFKD", text).casefold()
+    text = "".join(char if char.isalnum() else " " for char in text if not unicodedata.combining(char))
+    return " ".join(text.split())[:MAX_KEY_LENGTH]
+
+
+def title_keys(title: str):
+    """
+    Computes the keys a title is indexed under, its normalized form and the suffixes starting at its words.
+
+    Args:
+        title (str): The movie title
+
+    Returns:
+        set: The keys of the title
+    """
+    words = normalize(title).split()
+    return {" ".join(words[start:])[:MAX_KEY_LENGTH] for start in range(min(len(words), MAX_KEY_WORDS))}
+
+
+def year_of(release_date: str):
+    """
+    Extracts the year of a TMDB release date.
+
+    Args:
+        release_date (str): The date, as in "1972-03-14", possibly empty
+
+    Returns:
+        int: The year, None if the date is unknown
+    """
+    year = (release_date or "").split("-")[0]
+    return int(year) if year.isdigit() else None
+
+
+@dataclass
+class Title:
+    """
+    A movie title known to the index.
+
+    Attributes:
+        tmdb_id (int): The TMDB id of the movie.
+        title (str): The title of the movie.
+        year (int): The release year of the movie, None if unknown.
+        users (int): How many users added the movie.
+        popularity (float): The TMDB popularity of the movie, 0 if it was never seen in a TMDB search.
+
+    """
+    tmdb_id: int
+    title: str
+    year: int = None
+    users: int = 0
+    popularity: float = 0.0
+
+    def rank(self):
+        """
+        The ranking of the title, by users first and TMDB popularity second.
+        """
+        return self.users, self.popularity
+
+
+class TitleIndex:
+    """
+    Prefix index of movie titles kept in memory.
+
+    The best ranked titles of a prefix only move up between two builds: a title whose rank drops keeps
+    its place until the next one.
+
+    Attributes:
+        max_titles (int): The maximum number of titles, the worst ranked ones are evicted past it when
+            the index is compacted.
+        scan_limit (int): The number of matching keys above which the best titles of a prefix are kept.
+        titles (dict): The Title of every TMDB id.
+
+    """
+    def __init__(self, max_titles: int = AUTOCOMPLETE_MAX_TITLES, scan_limit: int = AUTOCOMPLETE_SCAN_LIMIT):
+        self.max_titles = max_titles
+        self.scan_limit = scan_limit
+        self.titles = {}
+        self._keys = []
+        self._recent = []
+        self._top = {}
+
+    def __len__(self):
+        return len(self.titles)
+
+    @classmethod
+    def build(cls, titles, max_titles: int = AUTOCOMPLETE_MAX_TITLES, scan_limit: int = AUTOCOMPLETE_SCAN_LIMIT):
+        """
+        Builds an index sorting every key at once, keeping the best ranked titles if there are too many.
+
+        The prefixes matching more than scan_limit keys are the common prefixes of the keys scan_limit
+        apart in the sorted array, and their best titles are found walking the titles best first.
+
+        Args:
+            titles: Iterable of Title, a later one replaces an earlier one with the same TMDB id
+            max_titles (int): The maximum number of titles
+            scan_limit (int): The number of matching keys above which the best titles of a prefix are kept
+
+        Returns:
+            TitleIndex: The index
+        """
+        index = cls(max_titles=max_titles, scan_limit=scan_limit)
+        index.titles = {title.tmdb_id: title for title in titles}
+        if len(index.titles) > max_titles:
+            kept = heapq.nlargest(max_titles, index.titles.values(), key=Title.rank)
+            index.titles = {title.tmdb_id: title for title in kept}
+        keys_of = {tmdb_id: title_keys(title.title) for tmdb_id, title in index.titles.items()}
+        index._keys = sorted((key, tmdb_id) for tmdb_id, keys in keys_of.items() for key in keys)
+
+        keys = [key for key, _ in index._keys]
+        common = {os.path.commonprefix([first, last]) for first, last in zip(keys, keys[scan_limit:])}
+        index._top = {prefix[:end]: [] for prefix in common for end in range(1, len(prefix) + 1)}
+        for title in sorted(index.titles.values(), key=Title.rank, reverse=True):
+            for key in keys_of[title.tmdb_id]:
+                for end in range(1, len(key) + 1):
+                    top = index._top.get(key[:end])
+                    if top is None:
+                        break
+                    if len(top) < AUTOCOMPLETE_LIMIT and (not top or top[-1] != title.tmdb_id):
+                        top.append(title.tmdb_id)
+        return index
+
+    def add(self, title: Title):
+        """
+        Adds a title or updates the year, users and popularity of a known one.
+
+        Unknown years keep the known year, and users and popularity only change when they are given,
+        as greater than zero, so a TMDB result doesn't reset the users counted from the database.
+
+        Args:
+            title (Title): The title
+        """
+        known = self.titles.get(title.tmdb_id)
+        if known is None:
+            self.titles[title.tmdb_id] = title
+            for key in title_keys(title.title):
+                insort(self._recent, (key, title.tmdb_id))
+            self._promote(title)
+            return
+        rank = known.rank()
+        known.year = title.year or known.year
+        known.users = title.users or known.users
+        known.popularity = title.popularity or known.popularity
+        if known.rank() != rank:
+            self._promote(known)
+
+    def _promote(self, title: Title):
+        """
+        Places a title among the best titles of the prefixes of its keys that keep them.
+        """
+        rank = title.rank()
+        for key in title_keys(title.title):
+            for end in range(1, len(key) + 1):
+                top = self._top.get(key[:end])
+                if top is None:
+                    break
+                if title.tmdb_id in top:
+                    top.remove(title.tmdb_id)
+                position = next((position for position, tmdb_id in enumerate(top)
+                                 if self.titles[tmdb_id].rank() < rank), len(top))
+                if position < AUTOCOMPLETE_LIMIT:
+                    top.insert(position, title.tmdb_id)
+                    del top[AUTOCOMPLETE_LIMIT:]
+
+    def needs_compaction(self):
+        """
+        Tells whether the recent keys should be merged or titles evicted.
+        """
+        return len(self._recent) > AUTOCOMPLETE_RECENT_KEYS or len(self.titles) > self.max_titles
+
+    def _matches(self, keys: list, prefix: str):
+        """
+        Finds the keys that start with a prefix in a sorted list.
+        """
+        start = bisect_left(keys, (prefix,))
+        return keys[start:bisect_left(keys, (prefix + "\U0010ffff",), start)]
+
+    def search(self, query: str, limit: int = 10):
+        """
+        Completes a partially typed title.
+
+        Args:
+            query (str): The typed text
+            limit (int): Maximum number of titles, at most AUTOCOMPLETE_LIMIT
+
+        Returns:
+            list: The matched Title objects, best ranked first
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        ranked = self._top.get(prefix)
+        if ranked is None:
+            tmdb_ids = {tmdb_id for _, tmdb_id in self._matches(self._keys, prefix) + self._matches(self._recent, prefix)}
+            return heapq.nlargest(limit, (self.titles[tmdb_id] for tmdb_id in tmdb_ids), key=Title.rank)
+        return [self.titles[tmdb_id] for tmdb_id in ranked[:limit]]
+
+
+def compact_titles(titles: list, max_titles: int):
+    """
+    Builds a new index of copies of titles, only the best ranked share of the maximum if there are more.
+
+    Args:
+        titles (list): The Title objects of the current index
+        max_titles (int): The maximum number of titles
+
+    Returns:
+        TitleIndex: The index
+    """
+    if len(titles) > max_titles:
+        titles = heapq.nlargest(int(max_titles * EVICTION_RATIO), titles, key=Title.rank)
+    return TitleIndex.build([replace(title) for title in titles], max_titles=max_titles)
+
+
+async def load_titles(db, limit: int):
+    """
+    Reads the titles of the catalog, the most added first.
+
+    Args:
+        db (AsyncSession): The async database session
+        limit (int): Maximum number of titles
+
+    Returns:
+        list: The Title objects
+    """
+    users = func.coalesce(CatalogStats.movie_count, 0)
+    result = await db.execute(
+        select(Catalog.tmdb_id, Catalog.title, Catalog.year, users)
+        .outerjoin(CatalogStats, CatalogStats.catalog_id == Catalog.id)
+        .where(Catalog.tmdb_id.is_not(None))
+        .order_by(users.desc(), Catalog.id)
+        .limit(limit)
+    )
+    return [Title(tmdb_id=tmdb_id, title=title, year=year, users=count) for tmdb_id, title, year, count in result]
+
+
+def merge_titles(titles: list, known: list, max_titles: int):
+    """
+    Builds an index of the catalog titles and the TMDB search results seen before.
+
+    Args:
+        titles (list): The Title objects read from the catalog
+        known (list): The Title objects of the current index, their TMDB popularity is kept
+        max_titles (int): The maximum number of titles
+
+    Returns:
+        TitleIndex: The index
+    """
+    by_id = {title.tmdb_id: title for title in titles}
+    for title in known:
+        if not title.popularity:
+            continue
+        if title.tmdb_id in by_id:
+            by_id[title.tmdb_id].popularity = title.popularity
+        else:
+            by_id[title.tmdb_id] = Title(tmdb_id=title.tmdb_id, title=title.title, year=title.year,
+                                         popularity=title.popularity)
+    return TitleIndex.build(by_id.values(), max_titles=max_titles)
+
+
+class TitleCompleter:
+    """
+    Keeps the title index of this worker up to date in the background.
+
+    The index is rebuilt from the catalog every refresh_interval, which updates how many users added
+    every movie. In between, the catalog entries created and the TMDB search results seen by this worker
+    are added as they come, and the index is compacted every compact_interval when it needs it.
+
+    Attributes:
+        refresh_interval (float): Seconds between rebuilds.
+        compact_interval (float): Seconds between the checks for a compaction.
+        max_titles (int): The maximum number of titles of the index.
+        index (TitleIndex): The current index, empty until it's first built.
+        built_at (float): The monotonic time of the last rebuild, None until the first one.
+
+    """
+    def __init__(self, refresh_interval: float = AUTOCOMPLETE_REFRESH_SECONDS,
+                 compact_interval: float = AUTOCOMPLETE_COMPACT_SECONDS,
+                 max_titles: int = AUTOCOMPLETE_MAX_TITLES):
+        self.refresh_interval = refresh_interval
+        self.compact_interval = compact_interval
+        self.max_titles = max_titles
+        self.index = TitleIndex(max_titles=max_titles)
+        self.built_at = None
+        self._pending = None
+        self._task = None
+
+    def add(self, titles):
+        """
+        Adds titles to the index, and to the one being built if a rebuild is running.
+
+        Args:
+            titles: Iterable of Title
+        """
+        for title in titles:
+            self.index.add(title)
+            if self._pending is not None:
+                self._pending.append(title)
+
+    def add_catalog_movies(self, movies):
+        """
+        Adds new catalog entries to the index.
+
+        Args:
+            movies: Iterable of CatalogMovieCreate
+        """
+        self.add(Title(tmdb_id=movie.tmdb_id, title=movie.title, year=movie.year) for movie in movies)
+
+    def add_tmdb_results(self, results):
+        """
+        Adds the movies of a TMDB search to the index.
+
+        Args:
+            results (list): The TMDB search results
+        """
+        self.add(Title(tmdb_id=result["id"], title=result["original_title"], year=year_of(result.get("release_date")),
+                       popularity=result.get("popularity") or 0.0) for result in results)
+
+    def complete(self, query: str, limit: int = 10):
+        """
+        Completes a partially typed title.
+
+        Args:
+            query (str): The typed text
+            limit (int): Maximum number of titles
+
+        Returns:
+            list: The matched Title objects, best ranked first
+        """
+        return self.index.search(query, limit)
+
+    async def _replace(self, build, *args):
+        """
+        Builds a new index in a thread, then adds the titles added to the current one meanwhile.
+        """
+        self._pending = []
+        try:
+            index = await asyncio.to_thread(build, *args)
+            for title in self._pending:
+                index.add(title)
+            self.index = index
+        finally:
+            self._pending = None
+
+    async def rebuild(self):
+        """
+        Builds the index again from the catalog, keeping the TMDB results already seen.
+        """
+        async with AsyncSessionLocal() as db:
+            titles = await load_titles(db, self.max_titles)
+        start = time.perf_counter()
+        await self._replace(merge_titles, titles, list(self.index.titles.values()), self.max_titles)
+        self.built_at = time.monotonic()
+        logger.info("Indexed %d titles in %.2f s", len(self.index), time.perf_counter() - start)
+
+    async def compact(self):
+        """
+        Merges the recent keys into the sorted array and evicts the worst ranked titles past the maximum.
+        """
+        start = time.perf_counter()
+        await self._replace(compact_titles, list(self.index.titles.values()), self.max_titles)
+        logger.info("Compacted %d titles in %.2f s", len(self.index), time.perf_counter() - start)
+
+    async def _run(self):
+        while True:
+            try:
+                if self.built_at is None or time.monotonic() - self.built_at >= self.refresh_interval:
+                    await self.rebuild()
+                elif self.index.needs_compaction():
+                    await self.compact()
+            except Exception:
+                logger.exception("Couldn't rebuild the titles index")
+            await asyncio.sleep(self.compact_interval)
+
+    def start(self):
+        """
+        Starts rebuilding and compacting the index in the background.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """
+        Stops rebuilding and compacting the index.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+completer = TitleCompleter()
@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import logging
+from collections import OrderedDict
+
+
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+CACHE_REDIS_TIMEOUT = float(os.environ.get("CACHE_REDIS_TIMEOUT", 0.5))
+# Seconds the shared backend is skipped after it fails, so an outage doesn't slow every lookup down
+CACHE_REDIS_RETRY_SECONDS = float(os.environ.get("CACHE_REDIS_RETRY_SECONDS", 5))
+
+logger = logging.getLogger("mytopmovies.cache")
+
+
+class LRUCache:
+    """
+    In-process cache with a time to live per entry and least recently used eviction.
+
+    Attributes:
+        maxsize (int): Maximum number of entries kept, the least recently used one is evicted first.
+        ttl (float): Seconds an entry is considered fresh.
+        hits (int): Number of lookups that found a fresh entry.
+        misses (int): Number of lookups that didn't find a fresh entry.
+
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key):
+        """
+        Retrieve a fresh entry and mark it as the most recently used.
+
+        Args:
+            key: The entry key
+
+        Returns:
+            The cached value or None if missing or expired
+        """
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key, value, ttl: float = None):
+        """
+        Store an entry evicting the least recently used ones when the cache is full.
+
+        Args:
+            key: The entry key
+            value: The value to cache
+            ttl (float): Overrides the default time to live for this entry
+        """
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        """
+        Remove an entry if present.
+
+        Args:
+            key: The entry key
+        """
+        self._data.pop(key, None)
+
+    def clear(self):
+        """
+        Remove every entry.
+        """
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """
+    Cache backend stored in redis so every worker shares the same entries, values are stored as json.
+
+    Attributes:
+        url (str): The redis connection url.
+        errors (tuple): The exceptions raised when redis can't be reached or fails.
+
+    """
+    def __init__(self, url: str, timeout: float = CACHE_REDIS_TIMEOUT):
+        import redis.asyncio as redis
+
+        self.url = url
+        self.errors = (redis.RedisError, OSError)
+        self._redis = redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    async def get(self, key: str):
+        value = await self._redis.get(key)
+        return None if value is None else json.loads(value)
+
+    async def set(self, key: str, value, ttl: float):
+        await self._redis.set(key, json.dumps(value), ex=max(int(ttl), 1))
+
+    async def delete(self, key: str):
+        await self._redis.delete(key)
+
+    async def close(self):
+        await self._redis.close()
+
+
+class Cache:
+    """
+    Read-through cache with an in-process LRU in front of an optional shared backend.
+
+    When the shared backend fails the cache keeps working with the local layer only, and the backend
+    is tried again after CACHE_REDIS_RETRY_SECONDS.
+
+    Attributes:
+        namespace (str): Prefix added to every key, so several caches can share a backend.
+        local (LRUCache): The in-process layer.
+        backend (RedisBackend): The optional shared layer, None when only the local layer is used.
+        hits (int): Number of lookups served by either layer.
+        misses (int): Number of lookups that had to call the loader.
+        errors (int): Number of failed calls to the shared backend.
+
+    """
+    def __init__(self, namespace: str, maxsize: int = 1024, ttl: float = 300, backend_url: str = CACHE_REDIS_URL):
+        self.namespace = namespace
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.backend = RedisBackend(backend_url) if backend_url else None
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._backend_retry_at = 0.0
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    async def _call_backend(self, method: str, *args):
+        """
+        Calls the shared backend, unless it failed recently.
+
+        Args:
+            method (str): The backend method
+            *args: Its arguments
+
+        Returns:
+            The result of the call, None if there's no backend or it failed
+        """
+        if self.backend is None or time.monotonic() < self._backend_retry_at:
+            return None
+        try:
+            return await getattr(self.backend, method)(*args)
+        except self.backend.errors as error:
+            self.errors += 1
+            self._backend_retry_at = time.monotonic() + CACHE_REDIS_RETRY_SECONDS
+            logger.warning("The %s cache backend failed, using the local layer only for %.0f s: %r",
+                           self.namespace, CACHE_REDIS_RETRY_SECONDS, error)
+            return None
+
+    async def get(self, key):
+        """
+        Retrieve an entry from the local layer, falling back to the shared one.
+
+        Args:
+            key: The entry key
+
+        Returns:
+            The cached value or None if missing or expired
+        """
+        key = self._key(key)
+        value = self.local.get(key)
+        if value is None:
+            value = await self._call_backend("get", key)
+            if value is not None:
+                self.local.set(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key, value):
+        """
+        Store an entry in both layers.
+
+        Args:
+            key: The entry key
+            value: The value to cache, it must be json serializable when a shared backend is used
+        """
+        key = self._key(key)
+        self.local.set(key, value)
+        await self._call_backend("set", key, value, self.local.ttl)
+
+    async def delete(self, key):
+        """
+        Remove an entry from both layers.
+
+        Args:
+            key: The entry key
+        """
+        key = self._key(key)
+        self.local.delete(key)
+        await self._call_backend("delete", key)
+
+    async def fetch(self, key, loader):
+        """
+        Retrieve an entry, calling the loader and caching its result on a miss.
+
+        Args:
+            key: The entry key
+            loader: Coroutine function without arguments that returns the value to cache
+
+        Returns:
+            The cached or loaded value
+        """
+        value = await self.get(key)
+        if value is None:
+            value = await loader()
+            await self.set(key, value)
+        return value
+
+    async def close(self):
+        """
+        Closes the connection to the shared backend.
+        """
+        if self.backend is not None:
+            try:
+                await self.backend.close()
+            except self.backend.errors:
+                pass
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: hits, misses, failed backend calls and the number of entries in the local layer
+        """
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors, "size": len(self.local)}
@@ -0,0 +1,144 @@
+"""
+Response compression negotiated with the Accept-Encoding of the client.
+"""
+import os
+import zlib
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+
+
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", 4))
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "application/x-ndjson",
+                      "image/svg+xml")
+
+
+class GzipEncoder:
+    """
+    Incremental gzip compressor.
+    """
+    name = "gzip"
+
+    def __init__(self, level: int = COMPRESSION_GZIP_LEVEL):
+        self._compressor = zlib.compressobj(level, wbits=31)
+
+    def compress(self, data: bytes):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    """
+    Incremental brotli compressor.
+    """
+    name = "br"
+
+    def __init__(self, quality: int = COMPRESSION_BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def negotiate_encoder(accept_encoding: str):
+    """
+    Picks the encoder of the best encoding accepted by the client, brotli over gzip.
+
+    Args:
+        accept_encoding (str): The Accept-Encoding header
+
+    Returns:
+        The encoder class, None if the client doesn't accept any of them
+    """
+    accepted = set()
+    for value in accept_encoding.lower().split(","):
+        coding, _, params = value.partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip())
+    if "br" in accepted:
+        return BrotliEncoder
+    if "gzip" in accepted:
+        return GzipEncoder
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Compresses the text responses of at least minimum_size bytes with brotli or gzip.
+
+    Responses that are already encoded are sent as they are. Streamed responses are compressed as they
+    are sent, every chunk is flushed so the client can render it right away.
+
+    Attributes:
+        app: The ASGI application
+        minimum_size (int): Responses smaller than this are sent uncompressed.
+
+    """
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoder_class = negotiate_encoder(Headers(scope=scope).get("accept-encoding", ""))
+        if encoder_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message, encoder = None, None
+
+        async def compressed_send(message):
+            nonlocal start_message, encoder
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if encoder is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                compressible = (headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+                                and "content-encoding" not in headers
+                                and (more_body or len(body) >= self.minimum_size))
+                if not compressible:
+                    await send(start_message)
+                    start_message = None
+                    await send(message)
+                    return
+                encoder = encoder_class()
+                headers["Content-Encoding"] = encoder.name
+                headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["content-length"]
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+                await send(start_message)
+
+            if more_body:
+                await send({"type": "http.response.body", "body": encoder.compress(body) + encoder.flush(),
+                            "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": encoder.compress(body) + encoder.finish()})
+
+        await self.app(scope, receive, compressed_send)
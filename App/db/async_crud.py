@@ -0,0 +1,624 @@
+from sqlalchemy import and_, case, cast, delete, func, insert, literal, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer, joinedload
+from db.models.models import Catalog, CatalogStats, Leaderboard, Movies, Users
+from db.schemas.schemas import CatalogMovieCreate, MovieCreate, UserCreate
+
+# Key of the postgres advisory lock taken while refreshing the leaderboard, so workers don't refresh it at once
+LEADERBOARD_LOCK_KEY = 20230717
+# Ranking of the movies added until the rankings are recomputed, after every movie of a manual order
+NEW_MOVIE_RANKING = 2 ** 31 - 1
+
+async def get_all_movies(db: AsyncSession, user_id: int, limit: int = None, after: tuple = None,
+                         load_description: bool = False):
+    """
+    Retrieve the movies owned by a user ordered by ranking, one page at a time when a limit is given.
+
+    Pages are read with a keyset on (ranking, id) so every page costs the same no matter how deep it is.
+
+    Args:
+        db (AsyncSession): The async database session.
+        user_id (int): The ID of the user.
+        limit (int): Maximum number of movies to return, all of them if None.
+        after (tuple): The (ranking, id) of the last movie of the previous page.
+        load_description (bool): Whether to load the description, it's deferred by default.
+
+    Returns:
+        List[Movie]: A list of Movie objects.
+
+    """
+    query = select(Movies).where(Movies.owner_id == user_id).order_by(Movies.ranking, Movies.id)
+    if after is not None:
+        ranking, movie_id = after
+        query = query.where(or_(Movies.ranking > ranking, and_(Movies.ranking == ranking, Movies.id > movie_id)))
+    if limit is not None:
+        query = query.limit(limit)
+    if not load_description:
+        query = query.options(joinedload(Movies.catalog, innerjoin=True).defer(Catalog.description, raiseload=True))
+    result = await db.scalars(query)
+    return result.all()
+
+
+async def get_movie_by_id(db: AsyncSession, movie_id: int, user_id: int):
+    """
+    Retrieve a movie by its ID for a specific user.
+
+    Args:
+        db (AsyncSession): The async database session.
+        movie_id (int): The ID of the movie.
+        user_id (int): The ID of the user.
+
+    Returns:
+        Optional[Movie]: The Movie object if found, None otherwise.
+
+    """
+    return await db.scalar(select(Movies).where(Movies.owner_id == user_id, Movies.id == movie_id))
+
+
+async def stream_all_movies(db: AsyncSession, user_id: int, batch_size: int = 100, load_description: bool = False):
+    """
+    Stream all movies owned by a user ordered by ranking through a server-side cursor.
+
+    Args:
+        db (AsyncSession): The async database session.
+        user_id (int): The ID of the user.
+        batch_size (int): Number of rows fetched from the cursor at a time.
+        load_description (bool): Whether to load the description, it's deferred by default.
+
+    Returns:
+        AsyncScalarResult: An async iterator of Movie objects.
+
+    """
+    query = (
+        select(Movies)
+        .where(Movies.owner_id == user_id)
+        .order_by(Movies.ranking, Movies.id)
+        .execution_options(yield_per=batch_size)
+    )
+    if not load_description:
+        query = query.options(joinedload(Movies.catalog, innerjoin=True).defer(Catalog.description, raiseload=True))
+    return await db.stream_scalars(query)
+
+
+async def get_movie_description(db: AsyncSession, movie_id: int, user_id: int):
+    """
+    Retrieve only the description of a movie for a specific user.
+
+    Args:
+        db (AsyncSession): The async database session.
+        movie_id (int): The ID of the movie.
+        user_id (int): The ID of the user.
+
+    Returns:
+        Optional[str]: The description if the movie is found, None otherwise.
+
+    """
+    return await db.scalar(
+        select(Catalog.description)
+        .join(Movies, Movies.catalog_id == Catalog.id)
+        .where(Movies.owner_id == user_id, Movies.id == movie_id)
+    )
+
+
+async def get_catalog_movie(db: AsyncSession, tmdb_id: int):
+    """
+    Retrieve the catalog entry of a movie by its TMDB id.
+
+    Args:
+        db (AsyncSession): The async database session.
+        tmdb_id (int): The TMDB id of the movie.
+
+    Returns:
+        Optional[Catalog]: The Catalog object if found, None otherwise.
+
+    """
+    return await db.scalar(select(Catalog).where(Catalog.tmdb_id == tmdb_id))
+
+
+async def find_catalog_movie(db: AsyncSession, tmdb_id: int, user_id: int):
+    """
+    Retrieve the catalog entry of a movie by its TMDB id and the movie a user added from it, in one query.
+
+    Args:
+        db (AsyncSession): The async database session.
+        tmdb_id (int): The TMDB id of the movie.
+        user_id (int): The ID of the user.
+
+    Returns:
+        tuple: The Catalog object, None if not found, and the ID of the movie of the user, None if they
+        didn't add it.
+
+    """
+    result = await db.execute(
+        select(Catalog, Movies.id)
+        .outerjoin(Movies, and_(Movies.catalog_id == Catalog.id, Movies.owner_id == user_id))
+        .where(Catalog.tmdb_id == tmdb_id)
+    )
+    return tuple(result.one_or_none() or (None, None))
+
+
+async def get_owned_movie_ids(db: AsyncSession, user_id: int, tmdb_ids: list):
+    """
+    Retrieve which of the given movies a user already added, in one query.
+
+    Args:
+        db (AsyncSession): The async database session.
+        user_id (int): The ID of the user.
+        tmdb_ids (list): The TMDB ids of the movies.
+
+    Returns:
+        dict: The ID of the movie of the user for every TMDB id they added.
+
+    """
+    tmdb_ids = [tmdb_id for tmdb_id in tmdb_ids if tmdb_id is not None]
+    if not tmdb_ids:
+        return {}
+    result = await db.execute(
+        select(Catalog.tmdb_id, Movies.id)
+        .join(Movies, Movies.catalog_id == Catalog.id)
+        .where(Movies.owner_id == user_id, Catalog.tmdb_id.in_(tmdb_ids))
+    )
+    return dict(result.all())
+
+
+async def search_catalog(db: AsyncSession, title: str, limit: int = 20):
+    """
+    Search the catalog entries whose title contains the given text, ignoring case.
+
+    Args:
+        db (AsyncSession): The async database session.
+        title (str): The searched title.
+        limit (int): Maximum number of results.
+
+    Returns:
+        List[Catalog]: The matched Catalog objects, shortest titles first.
+
+    """
+    query = (
+        select(Catalog)
+        .where(Catalog.tmdb_id.is_not(None), func.lower(Catalog.title).contains(title.lower(), autoescape=True))
+        .order_by(func.length(Catalog.title), Catalog.id)
+        .limit(limit)
+    )
+    result = await db.scalars(query)
+    return result.all()
+
+
+async def create_catalog_movies(db: AsyncSession, movies: list):
+    """
+    Add the movies missing from the catalog, in a single statement, without committing.
+
+    Entries that already exist, or are inserted at the same time by another request, are kept as they are.
+
+    Args:
+        db (AsyncSession): The async database session.
+        movies (List[CatalogMovieCreate]): The catalog entries to add.
+
+    Returns:
+        dict: The ID of the catalog entry of every given TMDB id.
+
+    """
+    if not movies:
+        return {}
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    rows = list({movie.tmdb_id: movie.dict() for movie in movies}.values())
+    await db.execute(dialect.insert(Catalog).on_conflict_do_nothing(index_elements=[Catalog.tmdb_id]), rows)
+    tmdb_ids = [row["tmdb_id"] for row in rows]
+    result = await db.execute(select(Catalog.tmdb_id, Catalog.id).where(Catalog.tmdb_id.in_(tmdb_ids)))
+    return dict(result.all())
+
+
+async def update_catalog_stats(db: AsyncSession, changes: dict):
+    """
+    Add to the number of users and the rating sum of catalog entries, in a single statement, without committing.
+
+    The counters are incremented in place, so concurrent changes to the same entry are all counted.
+
+    Args:
+        db (AsyncSession): The async database session.
+        changes (dict): The (movie count, rating sum) to add to every catalog ID.
+
+    """
+    if not changes:
+        return
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(CatalogStats)
+    statement = statement.on_conflict_do_update(
+        index_elements=[CatalogStats.catalog_id],
+        set_={"movie_count": CatalogStats.movie_count + statement.excluded.movie_count,
+              "rating_sum": CatalogStats.rating_sum + statement.excluded.rating_sum},
+    )
+    # Sorted so concurrent transactions lock the rows in the same order
+    await db.execute(statement, [{"catalog_id": catalog_id, "movie_count": count, "rating_sum": rating_sum}
+                                 for catalog_id, (count, rating_sum) in sorted(changes.items())])
+
+
+async def refresh_leaderboard(db: AsyncSession, size: int, min_ratings: int):
+    """
+    Recompute the top movies across every user from the catalog stats, replacing the previous ones in
+    a single transaction.
+
+    Args:
+        db (AsyncSession): The async database session.
+        size (int): The number of movies of every ranking.
+        min_ratings (int): The number of users that must have added a movie to rank it by its average rating.
+
+    Returns:
+        bool: False if another worker is refreshing it at the same time, True otherwise.
+
+    """
+    if db.bind.dialect.name == "postgresql":
+        if not await db.scalar(select(func.pg_try_advisory_xact_lock(LEADERBOARD_LOCK_KEY))):
+            return False
+    average = CatalogStats.rating_sum / CatalogStats.movie_count
+    boards = {
+        "most_added": (CatalogStats.movie_count > 0, (CatalogStats.movie_count.desc(), CatalogStats.catalog_id)),
+        "top_rated": (CatalogStats.movie_count >= max(min_ratings, 1),
+                      (average.desc(), CatalogStats.movie_count.desc(), CatalogStats.catalog_id)),
+    }
+    columns = ["board", "position", "catalog_id", "movie_count", "average_rating"]
+    await db.execute(delete(Leaderboard))
+    for board, (condition, order) in boards.items():
+        ranked = (
+            select(cast(literal(board), Leaderboard.board.type), func.row_number().over(order_by=order),
+                   CatalogStats.catalog_id, CatalogStats.movie_count, average)
+            .where(condition)
+            .order_by(*order)
+            .limit(size)
+        )
+        await db.execute(insert(Leaderboard).from_select(columns, ranked))
+    await db.commit()
+    return True
+
+
+async def get_leaderboard(db: AsyncSession, board: str, limit: int = None):
+    """
+    Retrieve a ranking of the top movies across every user, as of its last refresh.
+
+    Args:
+        db (AsyncSession): The async database session.
+        board (str): The ranking, "most_added" or "top_rated".
+        limit (int): Maximum number of movies to return, all of them if None.
+
+    Returns:
+        List[Leaderboard]: The entries of the ranking with their catalog entry, in order.
+
+    """
+    query = (
+        select(Leaderboard)
+        .options(joinedload(Leaderboard.catalog, innerjoin=True).defer(Catalog.description, raiseload=True))
+        .where(Leaderboard.board == board)
+        .order_by(Leaderboard.position)
+        .limit(limit)
+    )
+    result = await db.scalars(query)
+    return result.all()
+
+
+async def get_user_ratings(db: AsyncSession, user_id: int):
+    """
+    Retrieve the rating a user gave to every movie of their list.
+
+    Args:
+        db (AsyncSession): The async database session.
+        user_id (int): The ID of the user.
+
+    Returns:
+        dict: The rating of every catalog ID.
+
+    """
+    result = await db.execute(select(Movies.catalog_id, Movies.rating).where(Movies.owner_id == user_id))
+    return dict(result.all())
+
+
+async def get_catalog_movies(db: AsyncSession, catalog_ids: list):
+    """
+    Retrieve catalog entries by their ID, without their description.
+
+    Args:
+        db (AsyncSession): The async database session.
+        catalog_ids (list): The IDs of the catalog entries.
+
+    Returns:
+        List[Catalog]: The Catalog objects in the order of the given IDs, the missing ones left out.
+
+    """
+    if not catalog_ids:
+        return []
+    result = await db.scalars(select(Catalog).options(defer(Catalog.description, raiseload=True))
+                              .where(Catalog.id.in_(catalog_ids)))
+    entries = {entry.id: entry for entry in result}
+    return [entries[catalog_id] for catalog_id in catalog_ids if catalog_id in entries]
+
+
+async def create_movie_item(db: AsyncSession, movie: MovieCreate, user_id: int):
+    """
+    Create a new movie item for a user.
+
+    Args:
+        db (AsyncSession): The async database session.
+        movie (MovieCreate): The details of the movie to create.
+        user_id (int): The ID of the user.
+
+    Returns:
+        Movie: The created Movie object.
+
+    """
+    db_movie = Movies(**movie.dict(), owner_id=user_id)
+    db.add(db_movie)
+    await update_catalog_stats(db=db, changes={movie.catalog_id: (1, movie.rating)})
+    await db.commit()
+    await db.refresh(db_movie)
+    return db_movie
+
+
+async def update_movie_item(db: AsyncSession, movie_id: int, user_id: int, version: int, values: dict):
+    """
+    Update the rating and/or review of a movie only if it's still at the given version, without committing.
+
+    The check and the write are a single compare-and-swap statement returning the rating it replaced,
+    so concurrent edits can't overwrite each other and nothing is read before writing. A rating change
+    is added to the stats of the catalog entry.
+
+    SQLite can't return the columns of the other tables of an UPDATE, so there the rating change is
+    added to the stats first, reading the rating it replaces in the same statement. That write holds
+    the database lock until the commit, so the movie can't change before its own compare-and-swap.
+
+    Args:
+        db (AsyncSession): The async database session.
+        movie_id (int): The ID of the movie.
+        user_id (int): The ID of the user.
+        version (int): The version of the movie the change is based on.
+        values (dict): The new rating and/or review.
+
+    Returns:
+        Optional[tuple]: The catalog ID and the previous rating of the movie if it was updated, None if it
+        doesn't exist or changed since that version.
+
+    """
+    current = Movies.owner_id == user_id, Movies.id == movie_id, Movies.version == version
+    # The tables rather than the models, the ORM can't return the columns of other tables
+    movies, stats = Movies.__table__, CatalogStats.__table__
+    if db.bind.dialect.name == "postgresql":
+        previous = select(movies.c.id, movies.c.rating).where(*current).subquery("previous")
+        result = await db.execute(
+            update(movies)
+            .where(movies.c.id == previous.c.id, movies.c.version == version)
+            .values(**values, version=movies.c.version + 1)
+            .returning(movies.c.catalog_id, previous.c.rating)
+        )
+        updated = result.first()
+        if updated is None:
+            return None
+        catalog_id, previous_rating = updated
+        if "rating" in values:
+            await update_catalog_stats(db=db, changes={catalog_id: (0, values["rating"] - previous_rating)})
+        return catalog_id, previous_rating
+
+    previous_rating = None
+    if "rating" in values:
+        replaced = select(movies.c.rating).where(*current).scalar_subquery()
+        result = await db.execute(
+            update(stats)
+            .where(stats.c.catalog_id == select(movies.c.catalog_id).where(*current).scalar_subquery())
+            .values(rating_sum=stats.c.rating_sum + values["rating"] - replaced)
+            .returning(replaced)
+        )
+        previous_rating = result.scalar_one_or_none()
+        if previous_rating is None:
+            return None
+    result = await db.execute(
+        update(Movies)
+        .where(*current)
+        .values(**values, version=Movies.version + 1)
+        .returning(Movies.catalog_id, Movies.rating)
+        .execution_options(synchronize_session=False)
+    )
+    updated = result.first()
+    if updated is None:
+        return None
+    return updated.catalog_id, updated.rating if previous_rating is None else previous_rating
+
+
+async def delete_movie_item(db: AsyncSession, movie_id: int, user_id: int):
+    """
+    Delete a movie item for a specific user.
+
+    Args:
+        db (AsyncSession): The async database session.
+        movie_id (int): The ID of the movie.
+        user_id (int): The ID of the user.
+
+    Returns:
+        Optional[int]: The catalog ID of the deleted movie, None if the user doesn't have it.
+
+    """
+    result = await db.execute(
+        delete(Movies)
+        .where(Movies.owner_id == user_id, Movies.id == movie_id)
+        .returning(Movies.catalog_id, Movies.rating)
+    )
+    deleted = result.first()
+    if deleted is not None:
+        await update_catalog_stats(db=db, changes={deleted.catalog_id: (-1, -deleted.rating)})
+    await db.commit()
+    return deleted.catalog_id if deleted is not None else None
+
+
+async def update_movie_rankings(db: AsyncSession, user_id: int):
+    """
+    Recompute the ranking of every movie owned by a user in a single statement, and commit the changes.
+
+    The new ranking is the position of the movie when ordered by rating, or by its current ranking when
+    the user ordered their movies, which closes the gaps of the deleted movies and puts the added ones
+    last. Only the rows whose ranking actually changed are written.
+
+    Args:
+        db (AsyncSession): The async database session.
+        user_id (int): The ID of the user.
+
+    """
+    await db.flush()
+    manual_order = await increment_movies_version(db=db, user_id=user_id)
+    order = (Movies.ranking, Movies.id) if manual_order else (Movies.rating.desc(), Movies.id)
+    ranked = (
+        select(Movies.id, func.row_number().over(order_by=order).label("new_ranking"))
+        .where(Movies.owner_id == user_id)
+        .subquery()
+    )
+    await db.execute(
+        update(Movies)
+        .where(Movies.id == ranked.c.id, Movies.ranking != ranked.c.new_ranking)
+        .values(ranking=ranked.c.new_ranking)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+
+async def commit_movie_changes(db: AsyncSession, user_id: int):
+    """
+    Commit the changes of the movies of a user that leave their rankings as they were.
+
+    Args:
+        db (AsyncSession): The async database session.
+        user_id (int): The ID of the user.
+
+    """
+    await increment_movies_version(db=db, user_id=user_id)
+    await db.commit()
+
+
+async def increment_movies_version(db: AsyncSession, user_id: int):
+    """
+    Increment the version of the movie list of a user, without committing.
+
+    Every change of the movies of a user increments it in its transaction, through update_movie_rankings
+    or commit_movie_changes.
+
+    Args:
+        db (AsyncSession): The async database session.
+        user_id (int): The ID of the user.
+
+    Returns:
+        bool: Whether the user ordered their movies instead of ranking them by rating.
+
+    """
+    return await db.scalar(
+        update(Users)
+        .where(Users.id == user_id)
+        .values(movies_version=Users.movies_version + 1)
+        .returning(Users.manual_order)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def reorder_movies(db: AsyncSession, user_id: int, movie_ids: list):
+    """
+    Rank the movies of a user in the given order and keep it as they change, in a single transaction.
+
+    Args:
+        db (AsyncSession): The async database session.
+        user_id (int): The ID of the user.
+        movie_ids (list): The IDs of every movie of the user, from the first to the last ranked.
+
+    Returns:
+        bool: Whether the movies were reordered, not if the IDs aren't exactly the movies of the user.
+
+    """
+    count, listed = (await db.execute(
+        select(func.count(), func.count().filter(Movies.id.in_(movie_ids))).where(Movies.owner_id == user_id)
+    )).one()
+    if len(set(movie_ids)) != len(movie_ids) or not count == listed == len(movie_ids):
+        return False
+    if movie_ids:
+        ranking = case({movie_id: position for position, movie_id in enumerate(movie_ids, start=1)}, value=Movies.id)
+        await db.execute(
+            update(Movies)
+            .where(Movies.owner_id == user_id, Movies.id.in_(movie_ids))
+            .values(ranking=ranking)
+            .execution_options(synchronize_session=False)
+        )
+    await set_manual_order(db=db, user_id=user_id, manual_order=True)
+    await commit_movie_changes(db=db, user_id=user_id)
+    return True
+
+
+async def rank_movies_by_rating(db: AsyncSession, user_id: int):
+    """
+    Drop the manual order of the movies of a user and rank them by rating again, in a single transaction.
+
+    Args:
+        db (AsyncSession): The async database session.
+        user_id (int): The ID of the user.
+
+    """
+    await set_manual_order(db=db, user_id=user_id, manual_order=False)
+    await update_movie_rankings(db=db, user_id=user_id)
+
+
+async def set_manual_order(db: AsyncSession, user_id: int, manual_order: bool):
+    """
+    Set whether the rankings of a user follow their manual order, without committing.
+
+    Args:
+        db (AsyncSession): The async database session.
+        user_id (int): The ID of the user.
+        manual_order (bool): Whether the user orders their movies instead of ranking them by rating.
+
+    """
+    await db.execute(
+        update(Users)
+        .where(Users.id == user_id)
+        .values(manual_order=manual_order)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def get_movies_version(db: AsyncSession, user_id: int):
+    """
+    Retrieve what identifies the current state of the movie list of a user, without loading the movies.
+
+    Args:
+        db (AsyncSession): The async database session.
+        user_id (int): The ID of the user.
+
+    Returns:
+        int: The version of the movie list, incremented on every change of the movies of the user.
+
+    """
+    return await db.scalar(select(Users.movies_version).where(Users.id == user_id))
+
+
+async def get_user_by_username(db: AsyncSession, username: str):
+    """
+    Retrieve a user by their username.
+
+    Args:
+        db (AsyncSession): The async database session.
+        username (str): The username of the user.
+
+    Returns:
+        Optional[User]: The User object if found, None otherwise.
+
+    """
+    return await db.scalar(select(Users).where(Users.username == username))
+
+
+async def create_user(db: AsyncSession, user: UserCreate):
+    """
+    Create a new user.
+
+    Args:
+        db (AsyncSession): The async database session.
+        user (UserCreate): The details of the user to create.
+
+    Returns:
+        User: The created User object.
+
+    """
+    db_user = Users(**user.dict())
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
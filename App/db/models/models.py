@@ -1,37 +1,121 @@
 from db.client import  Base
-from sqlalchemy import Column, ForeignKey, Integer, String, Text, Float
+from sqlalchemy import Column, ForeignKey, Integer, String, Text, Float, DateTime, Boolean, Index, UniqueConstraint
+from sqlalchemy import func
+from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import relationship
 
 
-class Movies(Base):
+class Catalog(Base):
     """
-    Model representing movies in the database.
+    Model representing the TMDB metadata of a movie, stored once and shared by every user that adds it.
 
     Attributes:
-        id (int): The unique identifier for the movie.
+        id (int): The unique identifier for the catalog entry.
+        tmdb_id (int): The TMDB id of the movie, None for movies added before the catalog existed.
         title (str): The title of the movie.
         year (int): The release year of the movie.
         description (str): The description or summary of the movie.
+        img_url (str): The URL of the movie's image.
+
+    """
+    __tablename__ = "catalog"
+    id = Column(Integer, primary_key=True)
+    tmdb_id = Column(Integer, unique=True)
+    title = Column(String, nullable=False)
+    year = Column(Integer, nullable=False)
+    description = Column(Text, nullable=False)
+    img_url = Column(String, nullable=False)
+
+
+class CatalogStats(Base):
+    """
+    Model representing how many users added a catalog entry and the sum of their ratings.
+
+    The counters are updated in the same transaction as the movies that change them, so they are
+    always consistent with the movies table without aggregating it.
+
+    Attributes:
+        catalog_id (int): The ID of the catalog entry.
+        movie_count (int): The number of users that added the movie.
+        rating_sum (float): The sum of the ratings given by those users.
+
+    """
+    __tablename__ = "catalog_stats"
+    catalog_id = Column(Integer, ForeignKey("catalog.id"), primary_key=True)
+    movie_count = Column(Integer, nullable=False, server_default="0")
+    rating_sum = Column(Float, nullable=False, server_default="0")
+    __table_args__ = (
+        Index("ix_catalog_stats_movie_count", movie_count.desc(), catalog_id),
+    )
+
+
+class Leaderboard(Base):
+    """
+    Model representing the top movies across every user, recomputed periodically from the catalog stats.
+
+    Attributes:
+        board (str): The ranking the entry belongs to, "most_added" or "top_rated".
+        position (int): The position of the movie in the ranking, starting at 1.
+        catalog_id (int): The ID of the catalog entry.
+        catalog (Catalog): The relationship to the catalog entry, loaded with the entry.
+        movie_count (int): The number of users that added the movie when the ranking was computed.
+        average_rating (float): The average rating of the movie when the ranking was computed.
+
+    """
+    __tablename__ = "leaderboard"
+    board = Column(String(16), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    catalog_id = Column(Integer, ForeignKey("catalog.id"), nullable=False)
+    catalog = relationship("Catalog", lazy="joined", innerjoin=True)
+    movie_count = Column(Integer, nullable=False)
+    average_rating = Column(Float, nullable=False)
+
+
+class Movies(Base):
+    """
+    Model representing the movies of a user in the database.
+
+    Attributes:
+        id (int): The unique identifier for the movie.
+        catalog_id (int): The ID of the catalog entry of the movie.
+        catalog (Catalog): The relationship to the catalog entry, loaded with the movie.
+        title (str): The title of the movie, read from the catalog.
+        year (int): The release year of the movie, read from the catalog.
+        description (str): The description or summary of the movie, read from the catalog.
         rating (float): The rating of the movie.
-        ranking (int): The ranking of the movie.
+        ranking (int): The position of the movie in the list of the user, by rating unless the user ordered it.
         review (str): A review or comment about the movie.
-        img_url (str): The URL of the movie's image.
+        img_url (str): The URL of the movie's image, read from the catalog.
         owner_id (int): The ID of the user who owns the movie.
         owner (Users): The relationship to the owner user object.
+        updated_at (datetime): When the movie was created or last changed, including its ranking.
+        version (int): Incremented on every change of the rating or review, to detect concurrent edits.
+
+    A catalog entry can only be added once per user, and the movies of a user are indexed by ranking to
+    serve their list without sorting, and by rating to rank them.
 
     """
     __tablename__ = "movies"
     id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, unique=True, nullable=False)
-    year = Column(Integer, nullable=False)
-    description = Column(Text, nullable=False)
+    catalog_id = Column(Integer, ForeignKey("catalog.id"), nullable=False)
+    catalog = relationship("Catalog", lazy="joined", innerjoin=True)
+    title = association_proxy("catalog", "title")
+    year = association_proxy("catalog", "year")
+    description = association_proxy("catalog", "description")
+    img_url = association_proxy("catalog", "img_url")
     rating = Column(Float, nullable=False)
     ranking = Column(Integer, nullable=False)
-    review = Column(String, unique=True, nullable=False)
-    img_url = Column(String, unique=True, nullable=False)
+    review = Column(String, nullable=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
     owner = relationship("Users", back_populates="movies")
-    
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+    version = Column(Integer, nullable=False, server_default="1")
+    __table_args__ = (
+        UniqueConstraint(owner_id, catalog_id, name="uq_movies_owner_catalog"),
+        Index("ix_movies_owner_rating", owner_id, rating.desc(), id),
+        Index("ix_movies_owner_ranking", owner_id, ranking, id),
+    )
+
 
 class Users(Base):
     """
@@ -43,6 +127,8 @@ class Users(Base):
         username (str): The username of the user.
         password (str): The password of the user.
         movies (List[Movies]): The list of movies owned by the user.
+        movies_version (int): Incremented on every change of the movies of the user, to version their list.
+        manual_order (bool): Whether the user ordered their movies, instead of ranking them by rating.
 
     """
     __tablename__ = "users"
@@ -51,3 +137,5 @@ class Users(Base):
     username = Column(String, unique=True, nullable=False)
     password = Column(String, nullable=False)
     movies = relationship("Movies", back_populates="owner")
+    movies_version = Column(Integer, nullable=False, server_default="0")
+    manual_order = Column(Boolean, nullable=False, server_default="0")
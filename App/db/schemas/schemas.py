@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel, EmailStr
 
 class MovieBase(BaseModel):
@@ -22,15 +23,40 @@ class MovieBase(BaseModel):
     review: str
     img_url: str
 
-class MovieCreate(MovieBase):
+class MovieCreate(BaseModel):
     """
-    Schema representing the data for creating a movie.
+    Schema representing the data for creating a movie, the TMDB metadata comes from its catalog entry.
 
-    Inherits:
-        MovieBase
+    Attributes:
+        catalog_id (int): The ID of the catalog entry of the movie.
+        rating (float): The rating of the movie.
+        ranking (int): The ranking of the movie.
+        review (str): A review or comment about the movie.
+
+    """
+    catalog_id: int
+    rating: float
+    ranking: int
+    review: str
+
+
+class CatalogMovieCreate(BaseModel):
+    """
+    Schema representing the data for creating a catalog entry from TMDB.
+
+    Attributes:
+        tmdb_id (int): The TMDB id of the movie.
+        title (str): The title of the movie.
+        year (int): The release year of the movie.
+        description (str): The description or summary of the movie.
+        img_url (str): The URL of the movie's image.
 
     """
-    pass
+    tmdb_id: int
+    title: str
+    year: int
+    description: str
+    img_url: str
 
 class Movie(MovieBase):
     """
@@ -51,6 +77,43 @@ class Movie(MovieBase):
         orm_mode = True
 
 
+class MovieFromTMDB(BaseModel):
+    """
+    Schema representing a movie to add from its TMDB data.
+
+    Attributes:
+        tmdb_id (int): The TMDB id of the movie.
+
+    """
+    tmdb_id: int
+
+
+class MovieUpdate(BaseModel):
+    """
+    Schema representing the fields of a movie a user can change.
+
+    Attributes:
+        rating (Optional[float]): The new rating of the movie.
+        review (Optional[str]): The new review of the movie.
+        version (Optional[int]): The version of the movie the change is based on, the current one if None.
+
+    """
+    rating: Optional[float] = None
+    review: Optional[str] = None
+    version: Optional[int] = None
+
+
+class MovieOrder(BaseModel):
+    """
+    Schema representing a manual order of the movies of a user.
+
+    Attributes:
+        movie_ids (list[int]): The IDs of every movie of the user, from the first to the last ranked.
+
+    """
+    movie_ids: list[int]
+
+
 class UserBase(BaseModel):
     """
     Schema representing the base user data.
@@ -93,3 +156,20 @@ class User(UserBase):
 
     class Config:
         orm_mode = True
+
+
+class CurrentUser(UserBase):
+    """
+    Schema representing the identity of the authenticated user, without its movies.
+
+    Inherits:
+        UserBase
+
+    Attributes:
+        id (int): The unique identifier for the user.
+
+    """
+    id: int
+
+    class Config:
+        orm_mode = True
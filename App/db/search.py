@@ -0,0 +1,133 @@
+from markupsafe import escape
+from sqlalchemy import func, literal, literal_column, or_, select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
+from db.models.models import Catalog, Movies
+
+
+# Must stay equivalent to the expressions of the ix_catalog_search and ix_movies_review_search GIN
+# indexes for postgres to use them
+CATALOG_DOCUMENT = "to_tsvector('english'::regconfig, catalog.title || ' ' || catalog.description)"
+REVIEW_DOCUMENT = "to_tsvector('english'::regconfig, movies.review)"
+SEARCH_CONFIG = literal_column("'english'::regconfig")
+HIGHLIGHT_START, HIGHLIGHT_STOP = "\ue000", "\ue001"
+HIGHLIGHT_OPTIONS = f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=2, MaxWords=20, MinWords=5"
+HIGHLIGHT_FIELDS = ("title", "description", "review")
+FIELD_COLUMNS = {"title": Catalog.title, "description": Catalog.description, "review": Movies.review}
+
+
+def to_html(text: str):
+    """
+    Escapes a highlighted text and wraps the matched words in mark tags.
+
+    Args:
+        text (str): The text with the highlight markers
+
+    Returns:
+        str: The safe html
+    """
+    return str(escape(text)).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_STOP, "</mark>")
+
+
+def highlight(text: str, words: list):
+    """
+    Marks the occurrences of the searched words in a text, used when the database can't highlight.
+
+    Args:
+        text (str): The text to highlight
+        words (list): The lowercase searched words
+
+    Returns:
+        str: The text with the highlight markers, None if no word is found
+    """
+    lowered, marks = text.lower(), []
+    for word in words:
+        start = lowered.find(word)
+        while start != -1:
+            marks.append((start, start + len(word)))
+            start = lowered.find(word, start + len(word))
+    if not marks:
+        return None
+    result, position = [], 0
+    for start, end in sorted(marks):
+        if start < position:
+            continue
+        result.extend((text[position:start], HIGHLIGHT_START, text[start:end], HIGHLIGHT_STOP))
+        position = end
+    result.append(text[position:])
+    return "".join(result)
+
+
+async def search_movies(db: AsyncSession, user_id: int, query: str, limit: int = 20):
+    """
+    Search the movies of a user by title, description and review.
+
+    In postgres it uses full text search over the title and description of the catalog and the review of
+    the user, backed by GIN indexes, plus trigram word similarity on the title to tolerate typos, and the
+    database highlights the matches. Every kind of match is looked up through its own index before the
+    matched movies are ranked. Other databases fall back to a substring match.
+
+    Args:
+        db (AsyncSession): The async database session.
+        user_id (int): The ID of the user.
+        query (str): The searched text.
+        limit (int): Maximum number of results.
+
+    Returns:
+        List[dict]: The matched movies, best first, with their score and the html highlights of every matched field.
+            Empty if the query has no words.
+
+    """
+    query = query.strip()
+    if not query:
+        return []
+    if db.bind.dialect.name == "postgresql":
+        catalog_document = literal_column(CATALOG_DOCUMENT)
+        review_document = literal_column(REVIEW_DOCUMENT)
+        ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+        title = func.lower(Catalog.title)
+        owned = select(Movies.id).join(Catalog, Movies.catalog_id == Catalog.id).where(Movies.owner_id == user_id)
+        matched = union(
+            owned.where(catalog_document.op("@@")(ts_query)),
+            owned.where(literal(query.lower()).op("<%")(title)),
+            select(Movies.id).where(Movies.owner_id == user_id, review_document.op("@@")(ts_query)),
+        )
+        score = (func.ts_rank(catalog_document, ts_query) + func.ts_rank(review_document, ts_query)
+                 + func.word_similarity(query.lower(), title)).label("score")
+        headlines = [func.ts_headline(SEARCH_CONFIG, FIELD_COLUMNS[field], ts_query, HIGHLIGHT_OPTIONS)
+                     .label(f"{field}_highlight") for field in HIGHLIGHT_FIELDS]
+        statement = (
+            select(Movies.id, Catalog.title, Catalog.year, Movies.rating, Movies.ranking, score, *headlines)
+            .join(Catalog, Movies.catalog_id == Catalog.id)
+            .where(Movies.id.in_(matched))
+            .order_by(score.desc())
+            .limit(limit)
+        )
+        rows = (await db.execute(statement)).mappings().all()
+        results = []
+        for row in rows:
+            result = {key: row[key] for key in ("id", "title", "year", "rating", "ranking", "score")}
+            result["highlights"] = {field: to_html(row[f"{field}_highlight"]) for field in HIGHLIGHT_FIELDS
+                                    if HIGHLIGHT_START in row[f"{field}_highlight"]}
+            results.append(result)
+        return results
+
+    words = query.lower().split()
+    matches = [or_(*(func.lower(column).contains(word, autoescape=True) for column in FIELD_COLUMNS.values()))
+               for word in words]
+    statement = (
+        select(Movies)
+        .join(Catalog, Movies.catalog_id == Catalog.id)
+        .where(Movies.owner_id == user_id, or_(*matches))
+        .options(contains_eager(Movies.catalog))
+        .order_by(Movies.ranking)
+        .limit(limit)
+    )
+    results = []
+    for movie in (await db.scalars(statement)).all():
+        highlights = {field: highlight(getattr(movie, field), words) for field in HIGHLIGHT_FIELDS}
+        results.append({"id": movie.id, "year": movie.year, "rating": movie.rating, "ranking": movie.ranking,
+                        "score": float(sum(value is not None for value in highlights.values())),
+                        "title": movie.title,
+                        "highlights": {field: to_html(value) for field, value in highlights.items() if value}})
+    return sorted(results, key=lambda result: -result["score"])
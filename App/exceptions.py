@@ -1,5 +1,5 @@
 from fastapi import Request
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, PlainTextResponse
 
 class NotAuthenticatedException(Exception):
     """
@@ -7,6 +7,23 @@ class NotAuthenticatedException(Exception):
     """
     pass
 
+class MovieAlreadyAddedException(Exception):
+    """
+    Exception to trigger when a user adds a movie that is already in their list.
+
+    Attributes:
+        movie_id (int): The ID of the movie already in the list.
+    """
+    def __init__(self, movie_id: int):
+        super().__init__(movie_id)
+        self.movie_id = movie_id
+
+class ServiceBusyException(Exception):
+    """
+    Exception to trigger when a bounded worker pool has too many queued operations.
+    """
+    pass
+
 def auth_exception_handler(request: Request, exc: NotAuthenticatedException):
     """
     Redirect the user to the login page if not logged in
@@ -14,8 +31,17 @@ def auth_exception_handler(request: Request, exc: NotAuthenticatedException):
     return RedirectResponse(url="/user/signin")
 
 
+def busy_exception_handler(request: Request, exc: ServiceBusyException):
+    """
+    Tell the client to retry later when the server is overloaded
+    """
+    return PlainTextResponse("The server is busy, try again in a moment", status_code=503, headers={"Retry-After": "1"})
+
+
 def include_app(app):
     """
-    Creates the exception handler to redirect the user to the login when not authenticated.
+    Creates the exception handlers to redirect the user to the login when not authenticated,
+    and to answer with a 503 when the server is overloaded.
     """
     app.add_exception_handler(NotAuthenticatedException, auth_exception_handler)
+    app.add_exception_handler(ServiceBusyException, busy_exception_handler)
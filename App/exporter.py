@@ -0,0 +1,57 @@
+"""
+Streaming export of a user's ranked movie list as CSV or NDJSON.
+"""
+import io
+import csv
+import zlib
+from db.schemas.schemas import Movie
+
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+
+async def export_movies(movies, export_format: str):
+    """
+    Serializes movies through the Movie schema, one buffer of rows at a time.
+
+    Args:
+        movies: Async iterator of Movie objects, in the order they are exported
+        export_format (str): Either "csv" or "ndjson"
+
+    Yields:
+        str: Chunks of the exported file of about EXPORT_BUFFER_SIZE characters
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(Movie.__fields__))
+    if export_format == "csv":
+        writer.writeheader()
+    async for movie in movies:
+        row = Movie.from_orm(movie)
+        if export_format == "csv":
+            writer.writerow(row.dict())
+        else:
+            buffer.write(row.json() + "\n")
+        if buffer.tell() >= EXPORT_BUFFER_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def gzip_chunks(chunks):
+    """
+    Compresses a stream of text chunks into a single gzip stream.
+
+    Args:
+        chunks: Async iterator of str
+
+    Yields:
+        bytes: The compressed chunks
+    """
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk.encode())
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,35 @@
+import hashlib
+from fastapi import Request
+
+
+def make_etag(*parts, weak: bool = False):
+    """
+    Builds an entity tag from the values that identify a version of a resource.
+
+    Args:
+        *parts: The values that change whenever the resource changes
+        weak (bool): Whether the tag is weak, for representations that are only semantically equivalent
+
+    Returns:
+        str: The quoted entity tag
+    """
+    digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:20]
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str):
+    """
+    Checks the If-None-Match header of a request with weak comparison.
+
+    Args:
+        request (Request): The incoming HTTP request object
+        etag (str): The current entity tag of the resource
+
+    Returns:
+        bool: True if the client already has the current version
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
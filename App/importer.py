@@ -0,0 +1,315 @@
+"""
+Bulk import of movie lists from CSV, JSON, NDJSON or Letterboxd exports.
+
+Usage, from the App directory:
+    python -m importer --username <username> <file>
+"""
+import io
+import os
+import csv
+import sys
+import json
+import asyncio
+import argparse
+import itertools
+import httpx
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import tmdb
+from db.client import AsyncSessionLocal, async_engine
+from db.models.models import Catalog, Movies
+from db.async_crud import get_user_by_username, update_movie_rankings, create_catalog_movies, update_catalog_stats
+from db.async_crud import NEW_MOVIE_RANKING
+from recommendations import recommender
+from autocomplete import completer
+
+
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", 200))
+IMPORT_CONCURRENCY = int(os.environ.get("IMPORT_CONCURRENCY", 8))
+
+
+JSON_READ_SIZE = 64 * 1024
+
+
+def read_json_array(text):
+    """
+    Decodes the elements of a JSON array one at a time, reading the file in chunks.
+
+    Args:
+        text: The text file object, positioned after the opening bracket
+
+    Yields:
+        The decoded elements
+
+    Raises:
+        json.JSONDecodeError: If the array is malformed or truncated
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = "", 0, False
+    # What may come next: "value_or_end" after the bracket, "value" after a comma, "comma_or_end" after a value
+    expected = "value_or_end"
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        if position == len(buffer):
+            if eof:
+                raise json.JSONDecodeError("Unterminated array", buffer, position)
+            buffer, position = text.read(JSON_READ_SIZE), 0
+            eof = not buffer
+            continue
+        if buffer[position] == "]" and expected != "value":
+            return
+        if expected == "comma_or_end":
+            if buffer[position] != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, position)
+            position, expected = position + 1, "value"
+            continue
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            end = None
+        # A value ending the buffer, like a number, may continue in the next chunk
+        if end is None or (end == len(buffer) and not eof):
+            chunk = text.read(JSON_READ_SIZE)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield value
+        position, expected = end, "comma_or_end"
+
+
+def read_json_lines(text):
+    """
+    Decodes a file with one JSON value per line.
+
+    Args:
+        text: The text file object
+
+    Yields:
+        The decoded values, or the JSONDecodeError of the lines that can't be decoded
+    """
+    for line in text:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                yield error
+
+
+def invalid_row(error: str, title: str = None):
+    return {"title": title, "year": None, "rating": None, "review": None, "error": error}
+
+
+def parse_record(record, letterboxd: bool):
+    """
+    Extracts the title, year, rating and review of an exported row.
+
+    Args:
+        record: The CSV row or decoded JSON value
+        letterboxd (bool): Whether the row comes from a Letterboxd export, with 0.5 to 5 stars ratings
+
+    Returns:
+        dict: The title, year, rating and review of the row, missing values are None, with the reason
+        under "error" when the row is invalid
+    """
+    if isinstance(record, json.JSONDecodeError):
+        return invalid_row(f"Invalid JSON: {record.msg}")
+    if not isinstance(record, dict):
+        return invalid_row("Not an object")
+    record = {key.strip().lower(): value for key, value in record.items() if key}
+    title = record.get("name") if letterboxd else record.get("title")
+    title = str(title).strip() or None if title is not None else None
+    try:
+        rating = float(record["rating"]) * (2 if letterboxd else 1) if record.get("rating") else None
+        year = int(record["year"]) if record.get("year") else None
+    except (TypeError, ValueError):
+        return invalid_row("Invalid rating or year", title)
+    review = record.get("review")
+    return {"title": title,
+            "year": year,
+            "rating": rating,
+            "review": str(review) if review else None,
+            "error": None if title else "Missing title"}
+
+
+def read_rows(file, filename: str):
+    """
+    Reads the movies of an exported list one row at a time.
+
+    CSV files may use title, year, rating and review columns or the Name, Year, Rating and Review
+    columns of a Letterboxd export, whose 0.5 to 5 stars ratings are doubled. JSON files may be an
+    array of objects or one object per line, both are read incrementally.
+
+    Invalid rows are yielded with the reason under "error". A file that can't be read any further,
+    because it isn't UTF-8 or its JSON array or CSV is malformed, ends with such a row.
+
+    Args:
+        file: The binary file object
+        filename (str): The file name, used to detect the format
+
+    Yields:
+        dict: The title, year, rating, review and error of each row, missing values are None
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        if filename.lower().endswith((".json", ".ndjson", ".jsonl")):
+            first = text.read(1)
+            while first.isspace():
+                first = text.read(1)
+            if first == "[":
+                records = read_json_array(text)
+            else:
+                records = read_json_lines(itertools.chain([first + text.readline()], text))
+            letterboxd = False
+        else:
+            records = csv.DictReader(text)
+            letterboxd = records.fieldnames is not None and "Name" in records.fieldnames
+        for record in records:
+            yield parse_record(record, letterboxd)
+    except UnicodeDecodeError:
+        yield invalid_row("The file isn't UTF-8 encoded")
+    except json.JSONDecodeError as error:
+        yield invalid_row(f"Invalid JSON: {error.msg}")
+    except csv.Error as error:
+        yield invalid_row(f"Invalid CSV: {error}")
+
+
+async def resolve_movie(row: dict, semaphore: asyncio.Semaphore):
+    """
+    Finds the TMDB movie that matches an imported row, preferring the one released in the row year.
+
+    Args:
+        row (dict): The imported row
+        semaphore (asyncio.Semaphore): Bounds how many rows are resolved at the same time
+
+    Returns:
+        dict: The matched TMDB search result or None if there isn't one
+    """
+    async with semaphore:
+        results = await tmdb.client.search_movies(row["title"])
+    results = [result for result in results if result.get("release_date")]
+    if row["year"]:
+        same_year = [result for result in results if result["release_date"].startswith(str(row["year"]))]
+        results = same_year or results
+    return results[0] if results else None
+
+
+def describe_error(error: Exception):
+    """
+    Describes why a row couldn't be resolved, without the TMDB urls that carry the api key.
+
+    Args:
+        error (Exception): The error raised while resolving the row
+
+    Returns:
+        str: The reason shown in the import report
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"TMDB answered {error.response.status_code}"
+    if isinstance(error, httpx.TransportError):
+        return "TMDB couldn't be reached"
+    return f"{type(error).__name__}: {error}"
+
+
+async def import_movies(db: AsyncSession, user_id: int, rows):
+    """
+    Imports movies for a user in chunks. The titles of a chunk are resolved against TMDB concurrently with
+    no transaction open, then the chunk is written in a short transaction of its own: the matched movies
+    missing from the catalog are added to it, the stats of their catalog entries are updated and the
+    rankings recomputed. Once a chunk is committed, its ratings are queued for the recommendations and its
+    titles added to the type-ahead index.
+
+    Args:
+        db (AsyncSession): The async database session
+        user_id (int): The ID of the user
+        rows: Iterable of the rows returned by read_rows
+
+    Returns:
+        list: One report entry per row with its status, the reason when it's invalid or couldn't be resolved,
+        and the matched title and TMDB id when it was found
+    """
+    existing = await db.scalars(
+        select(Catalog.tmdb_id)
+        .join(Movies, Movies.catalog_id == Catalog.id)
+        .where(Movies.owner_id == user_id)
+    )
+    tmdb_ids = set(existing)
+    await db.commit()
+
+    semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+    report, chunk = [], []
+    rows = enumerate(rows, start=1)
+    while True:
+        chunk.clear()
+        for number, row in rows:
+            chunk.append((number, row))
+            if len(chunk) == IMPORT_CHUNK_SIZE:
+                break
+        if not chunk:
+            break
+
+        valid = [(number, row) for number, row in chunk if not row["error"]]
+        report.extend({"row": number, "title": row["title"], "status": "invalid", "error": row["error"]}
+                      for number, row in chunk if row["error"])
+        matches = await asyncio.gather(*(resolve_movie(row, semaphore) for number, row in valid),
+                                       return_exceptions=True)
+        new_movies = []
+        for (number, row), match in zip(valid, matches):
+            entry = {"row": number, "title": row["title"]}
+            if isinstance(match, Exception):
+                entry.update(status="error", error=describe_error(match))
+            elif match is None:
+                entry["status"] = "not_found"
+            else:
+                entry.update(matched_title=match["original_title"], tmdb_id=match["id"])
+                if match["id"] in tmdb_ids:
+                    entry["status"] = "duplicate"
+                else:
+                    entry["status"] = "imported"
+                    tmdb_ids.add(match["id"])
+                    new_movies.append((match, row))
+            report.append(entry)
+        if new_movies:
+            chunk_catalog_movies = [tmdb.to_catalog_movie(match) for match, row in new_movies]
+            catalog_ids = await create_catalog_movies(db=db, movies=chunk_catalog_movies)
+            movies = [{"catalog_id": catalog_ids[match["id"]],
+                       "rating": row["rating"] if row["rating"] is not None else 1.0,
+                       "ranking": NEW_MOVIE_RANKING,
+                       "review": row["review"] or " ",
+                       "owner_id": user_id} for match, row in new_movies]
+            await db.execute(insert(Movies), movies)
+            await update_catalog_stats(db=db, changes={movie["catalog_id"]: (1, movie["rating"])
+                                                       for movie in movies})
+            await update_movie_rankings(db=db, user_id=user_id)
+            for movie in movies:
+                recommender.record(user_id, movie["catalog_id"], movie["rating"])
+            completer.add_catalog_movies(chunk_catalog_movies)
+
+    return sorted(report, key=lambda entry: entry["row"])
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Import a movie list for a user")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("file")
+    args = parser.parse_args()
+
+    await tmdb.client.start()
+    try:
+        async with AsyncSessionLocal() as db:
+            user = await get_user_by_username(db=db, username=args.username)
+            if user is None:
+                sys.exit(f"The user {args.username} doesn't exist")
+            with open(args.file, "rb") as file:
+                report = await import_movies(db=db, user_id=user.id, rows=read_rows(file, args.file))
+    finally:
+        await tmdb.client.close()
+        await async_engine.dispose()
+    for entry in report:
+        print(json.dumps(entry))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
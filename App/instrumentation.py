@@ -0,0 +1,190 @@
+"""
+Instrumentation of the hot paths: latency per route, SQL statements run by every request, timed spans
+around TMDB calls, password hashing and template rendering, and the log of slow requests.
+"""
+import os
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from jinja2 import Template
+from sqlalchemy import event
+from metrics import Histogram, HistogramFamily
+
+
+# Requests slower than this are logged with their SQL statements, 0 disables the log
+SLOW_REQUEST_SECONDS = float(os.environ.get("SLOW_REQUEST_SECONDS", 0))
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+STATEMENT_KINDS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+logger = logging.getLogger("mytopmovies.slow_requests")
+
+REQUEST_DURATION = HistogramFamily("http_request_duration_seconds", "Latency of the HTTP requests.",
+                                   ("method", "route", "status"))
+REQUEST_QUERIES = HistogramFamily("db_queries_per_request", "SQL statements run by every HTTP request.",
+                                  ("route",), QUERY_COUNT_BUCKETS)
+REQUEST_QUERY_DURATION = HistogramFamily("db_query_seconds_per_request",
+                                         "Time spent running SQL statements by every HTTP request.", ("route",))
+QUERY_DURATION = HistogramFamily("db_query_duration_seconds", "Latency of the SQL statements.", ("statement",))
+EXTERNAL_DURATION = HistogramFamily("external_request_duration_seconds", "Latency of the calls to other services.",
+                                    ("service",))
+PASSWORD_DURATION = HistogramFamily("password_hashing_duration_seconds",
+                                    "Time spent hashing and verifying passwords, waiting for the pool included.",
+                                    ("operation",))
+TEMPLATE_DURATION = HistogramFamily("template_render_duration_seconds", "Time spent rendering templates.",
+                                    ("template",))
+
+
+@dataclass
+class RequestStats:
+    """
+    What a request spent its time on.
+
+    Attributes:
+        queries (list): The SQL statements run and their duration in seconds.
+        spans (list): The name and duration in seconds of the timed spans.
+
+    """
+    queries: list = field(default_factory=list)
+    spans: list = field(default_factory=list)
+
+
+request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+@contextmanager
+def span(name: str, histogram: Histogram):
+    """
+    Times a block, recording it in a histogram and in the stats of the current request.
+
+    Args:
+        name (str): The span name shown in the slow request log
+        histogram (Histogram): The histogram of the block duration
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.spans.append((name, elapsed))
+
+
+class InstrumentedTemplate(Template):
+    """
+    Jinja template that times its rendering.
+    """
+    def render(self, *args, **kwargs):
+        with span(f"template {self.name}", TEMPLATE_DURATION.labels(self.name)):
+            return super().render(*args, **kwargs)
+
+
+def statement_kind(statement: str):
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return keyword if keyword in STATEMENT_KINDS else "OTHER"
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    QUERY_DURATION.labels(statement_kind(statement)).observe(elapsed)
+    stats = request_stats.get()
+    if stats is not None:
+        stats.queries.append((statement, elapsed))
+
+
+def handle_error(exception_context):
+    if exception_context.connection is not None and exception_context.connection.info.get("query_start"):
+        exception_context.connection.info["query_start"].pop()
+
+
+def instrument_engine(engine):
+    """
+    Times every SQL statement run by an engine.
+
+    Args:
+        engine (Engine): The engine, the sync_engine of an async engine
+    """
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(engine, "handle_error", handle_error)
+
+
+class InstrumentationMiddleware:
+    """
+    Records the latency and the SQL statements of every request by route, and logs the slow ones.
+
+    Attributes:
+        app: The ASGI application
+        slow_request_seconds (float): Requests slower than this are logged with their statements, 0 disables it.
+
+    """
+    def __init__(self, app, slow_request_seconds: float = SLOW_REQUEST_SECONDS):
+        self.app = app
+        self.slow_request_seconds = slow_request_seconds
+        self._route_paths = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def instrumented_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, instrumented_send)
+        finally:
+            elapsed = time.perf_counter() - start
+            request_stats.reset(token)
+            self.record(scope, status_code, elapsed, stats)
+
+    def route_path(self, scope):
+        """
+        Finds the path template of the route that handled a request, so the metrics aren't split by ids.
+
+        Args:
+            scope (dict): The ASGI scope, once the request was handled
+
+        Returns:
+            str: The route path, "unmatched" if no route handled it
+        """
+        if self._route_paths is None:
+            self._route_paths = {getattr(route, "endpoint", getattr(route, "app", None)): route.path
+                                 for route in scope["app"].routes}
+        return self._route_paths.get(scope.get("endpoint"), "unmatched")
+
+    def record(self, scope, status_code: int, elapsed: float, stats: RequestStats):
+        """
+        Records a finished request.
+
+        Args:
+            scope (dict): The ASGI scope
+            status_code (int): The response status
+            elapsed (float): The request duration in seconds
+            stats (RequestStats): The statements and spans of the request
+        """
+        route = self.route_path(scope)
+        query_seconds = sum(seconds for _, seconds in stats.queries)
+        REQUEST_DURATION.labels(scope["method"], route, status_code).observe(elapsed)
+        REQUEST_QUERIES.labels(route).observe(len(stats.queries))
+        REQUEST_QUERY_DURATION.labels(route).observe(query_seconds)
+        if self.slow_request_seconds and elapsed >= self.slow_request_seconds:
+            lines = [f"{seconds * 1000:8.1f} ms  {statement}" for statement, seconds in stats.queries]
+            lines += [f"{seconds * 1000:8.1f} ms  {name}" for name, seconds in stats.spans]
+            logger.warning("Slow request %s %s: %d in %.3f s, %d queries in %.3f s\n%s", scope["method"],
+                           scope["path"], status_code, elapsed, len(stats.queries), query_seconds, "\n".join(lines))
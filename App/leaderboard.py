@@ -0,0 +1,74 @@
+"""
+Periodic refresh of the leaderboard of the most loved movies across every user.
+"""
+import os
+import asyncio
+import logging
+from db.client import AsyncSessionLocal
+from db.async_crud import refresh_leaderboard
+
+
+LEADERBOARD_SIZE = int(os.environ.get("LEADERBOARD_SIZE", 50))
+LEADERBOARD_MIN_RATINGS = int(os.environ.get("LEADERBOARD_MIN_RATINGS", 3))
+LEADERBOARD_REFRESH_SECONDS = float(os.environ.get("LEADERBOARD_REFRESH_SECONDS", 300))
+BOARDS = ("most_added", "top_rated")
+
+logger = logging.getLogger("mytopmovies.leaderboard")
+
+
+class LeaderboardRefresher:
+    """
+    Recomputes the leaderboard in the background every interval, the first time when it starts.
+
+    Attributes:
+        interval (float): Seconds between refreshes.
+        size (int): The number of movies of every ranking.
+        min_ratings (int): The number of users that must have added a movie to rank it by its average rating.
+
+    """
+    def __init__(self, interval: float = LEADERBOARD_REFRESH_SECONDS, size: int = LEADERBOARD_SIZE,
+                 min_ratings: int = LEADERBOARD_MIN_RATINGS):
+        self.interval = interval
+        self.size = size
+        self.min_ratings = min_ratings
+        self._task = None
+
+    async def refresh(self):
+        """
+        Recomputes the leaderboard now.
+
+        Returns:
+            bool: False if another worker was refreshing it, True otherwise
+        """
+        async with AsyncSessionLocal() as db:
+            return await refresh_leaderboard(db=db, size=self.size, min_ratings=self.min_ratings)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Couldn't refresh the leaderboard")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """
+        Starts refreshing the leaderboard in the background.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """
+        Stops refreshing the leaderboard.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+refresher = LeaderboardRefresher()
@@ -1,10 +1,52 @@
 from fastapi import FastAPI
-from routers import routes
-from fastapi.staticfiles import StaticFiles
+from routers import routes, api, metrics, posters
+from assets import PrecompressedStaticFiles
+from compression import CompressionMiddleware
+from instrumentation import InstrumentationMiddleware, instrument_engine
 import exceptions
+import tmdb
+import passwords
+import leaderboard
+import recommendations
+import autocomplete
+from db.client import engine, async_engine
 
 
 app = FastAPI()
 app.include_router(routes.router)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.include_router(api.router)
+app.include_router(metrics.router)
+app.include_router(posters.router)
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(InstrumentationMiddleware)
+instrument_engine(async_engine.sync_engine)
+instrument_engine(engine)
 exceptions.include_app(app)
+
+
+@app.on_event("startup")
+async def startup():
+    """
+    Opens the shared TMDB connection pool, compiles the templates and starts refreshing the leaderboard,
+    the recommendations and the titles index.
+    """
+    await tmdb.client.start()
+    routes.precompile_templates()
+    leaderboard.refresher.start()
+    recommendations.recommender.start()
+    autocomplete.completer.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Stops refreshing the leaderboard, the recommendations and the titles index and closes the shared TMDB
+    connection pool, the password hashing pool and the database connections.
+    """
+    await leaderboard.refresher.close()
+    await recommendations.recommender.close()
+    await autocomplete.completer.close()
+    await tmdb.client.close()
+    await async_engine.dispose()
+    passwords.executor.shutdown(wait=False)
@@ -0,0 +1,181 @@
+import math
+
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """
+    Histogram of observed values with fixed cumulative buckets.
+
+    Attributes:
+        buckets (tuple): Upper bounds of the buckets, an implicit infinite bucket is always added.
+        count (int): Number of observed values.
+        sum (float): Sum of the observed values.
+
+    """
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """
+        Records a value in the smallest bucket that can hold it.
+
+        Args:
+            value (float): The observed value
+        """
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        """
+        Returns the current state of the histogram.
+
+        Returns:
+            dict: The cumulative count per bucket upper bound, the total count and the sum
+        """
+        cumulative, total = {}, 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            cumulative["+Inf" if bound == math.inf else str(bound)] = total
+        return {"buckets": cumulative, "count": self.count, "sum": self.sum}
+
+
+class HistogramFamily:
+    """
+    Histograms of one metric, one per combination of label values.
+
+    Every family is registered so the /metrics endpoint can expose it.
+
+    Attributes:
+        name (str): The metric name.
+        documentation (str): The help text of the metric.
+        labelnames (tuple): The names of the labels.
+        buckets (tuple): Upper bounds of the buckets of every histogram.
+
+    """
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._histograms = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        """
+        Retrieves the histogram of some label values, creating it the first time.
+
+        Args:
+            *values: The value of every label, in the order of labelnames
+
+        Returns:
+            Histogram: The histogram of those label values
+        """
+        key = tuple(str(value) for value in values)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(self.buckets)
+        return histogram
+
+    def render(self):
+        """
+        Formats every histogram of the family in the Prometheus text format.
+
+        Returns:
+            list: The lines of the family
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for values, histogram in sorted(self._histograms.items()):
+            lines.extend(format_histogram(self.name, histogram, dict(zip(self.labelnames, values))))
+        return lines
+
+
+REGISTRY = []
+
+
+def escape_label_value(value: str):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: dict):
+    """
+    Formats label pairs in the Prometheus text format, escaping their values.
+
+    Args:
+        labels (dict): The label values by name
+
+    Returns:
+        str: The labels between braces, empty if there aren't any
+    """
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def format_histogram(name: str, histogram: Histogram, labels: dict = None):
+    """
+    Formats a histogram in the Prometheus text format.
+
+    Args:
+        name (str): The metric name
+        histogram (Histogram): The histogram
+        labels (dict): The label values of the histogram
+
+    Returns:
+        list: The bucket, sum and count lines
+    """
+    labels = labels or {}
+    snapshot = histogram.snapshot()
+    lines = [f"{name}_bucket{format_labels({**labels, 'le': bound})} {count}"
+             for bound, count in snapshot["buckets"].items()]
+    lines.append(f"{name}_sum{format_labels(labels)} {snapshot['sum']}")
+    lines.append(f"{name}_count{format_labels(labels)} {snapshot['count']}")
+    return lines
+
+
+CACHE_METRICS = (
+    ("cache_hits_total", "counter", "Lookups served by the cache.", "hits"),
+    ("cache_misses_total", "counter", "Lookups that had to load the value.", "misses"),
+    ("cache_backend_errors_total", "counter", "Failed calls to the shared cache backend.", "errors"),
+    ("cache_entries", "gauge", "Entries in the in-process layer of the cache.", "size"),
+)
+
+
+def format_cache_stats(caches: dict):
+    """
+    Formats the counters of read-through caches in the Prometheus text format.
+
+    Args:
+        caches (dict): The Cache of every cache name
+
+    Returns:
+        list: The help, type and sample lines of every counter
+    """
+    stats = {name: cache.stats() for name, cache in caches.items()}
+    lines = []
+    for metric, kind, documentation, field in CACHE_METRICS:
+        lines.extend((f"# HELP {metric} {documentation}", f"# TYPE {metric} {kind}"))
+        lines.extend(f"{metric}{format_labels({'cache': name})} {values[field]}" for name, values in stats.items())
+    return lines
+
+
+def render_prometheus(families: list = REGISTRY):
+    """
+    Formats metric families in the Prometheus text format.
+
+    Args:
+        families (list): The families to expose, every registered one by default
+
+    Returns:
+        str: The exposition text
+    """
+    return "\n".join(line for family in families for line in family.render()) + "\n"
@@ -0,0 +1,35 @@
+from logging.config import fileConfig
+from alembic import context
+from db.client import engine, Base
+import db.models.models
+
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+
+def run_migrations_offline():
+    """
+    Emits the migrations as SQL without connecting to the database.
+    """
+    context.configure(url=engine.url, target_metadata=Base.metadata, literal_binds=True,
+                      dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    """
+    Runs the migrations against the database configured in DATABASE_URL.
+    """
+    with engine.connect() as connection:
+        context.configure(connection=connection, target_metadata=Base.metadata, render_as_batch=True)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
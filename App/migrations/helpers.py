@@ -0,0 +1,24 @@
+"""
+Operations shared by the migrations.
+"""
+import contextlib
+from alembic import op
+import sqlalchemy as sa
+
+
+@contextlib.contextmanager
+def batch_alter_movies():
+    """
+    Alters the movies table in batch, which rebuilds it on sqlite.
+
+    The rebuilt table gets ix_movies_owner_rating without its descending rating, so on sqlite the index
+    is recreated as the model defines it once the batch is applied.
+
+    Yields:
+        BatchOperations: The operations of the batch
+    """
+    with op.batch_alter_table("movies") as batch_op:
+        yield batch_op
+    if op.get_bind().dialect.name == "sqlite":
+        op.drop_index("ix_movies_owner_rating", table_name="movies")
+        op.create_index("ix_movies_owner_rating", "movies", ["owner_id", sa.text("rating DESC"), "id"])
@@ -0,0 +1,55 @@
+"""Initial schema
+
+Creates the users and movies tables as they were created by Base.metadata.create_all, so databases
+created before the migrations existed can be upgraded without changes.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("password", sa.String(), nullable=False),
+            sa.UniqueConstraint("email", name="users_email_key"),
+            sa.UniqueConstraint("username", name="users_username_key"),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+    if not inspector.has_table("movies"):
+        op.create_table(
+            "movies",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("title", sa.String(), nullable=False),
+            sa.Column("year", sa.Integer(), nullable=False),
+            sa.Column("description", sa.Text(), nullable=False),
+            sa.Column("rating", sa.Float(), nullable=False),
+            sa.Column("ranking", sa.Integer(), nullable=False),
+            sa.Column("review", sa.String(), nullable=False),
+            sa.Column("img_url", sa.String(), nullable=False),
+            sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.UniqueConstraint("title", name="movies_title_key"),
+            sa.UniqueConstraint("review", name="movies_review_key"),
+            sa.UniqueConstraint("img_url", name="movies_img_url_key"),
+        )
+        op.create_index("ix_movies_id", "movies", ["id"])
+
+
+def downgrade():
+    op.drop_table("movies")
+    op.drop_table("users")
@@ -0,0 +1,38 @@
+"""Per owner movie constraints and indexes
+
+Replaces the global unique constraints on title, review and img_url with per owner ones and adds
+the (owner_id, rating DESC, id) index used to list the movies of a user by ranking.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("movies") as batch_op:
+        batch_op.drop_constraint("movies_title_key", type_="unique")
+        batch_op.drop_constraint("movies_review_key", type_="unique")
+        batch_op.drop_constraint("movies_img_url_key", type_="unique")
+        batch_op.create_unique_constraint("uq_movies_owner_title", ["owner_id", "title"])
+        batch_op.create_unique_constraint("uq_movies_owner_img_url", ["owner_id", "img_url"])
+    op.create_index("ix_movies_owner_rating", "movies", ["owner_id", sa.text("rating DESC"), "id"])
+
+
+def downgrade():
+    op.drop_index("ix_movies_owner_rating", table_name="movies")
+    with op.batch_alter_table("movies") as batch_op:
+        batch_op.drop_constraint("uq_movies_owner_img_url", type_="unique")
+        batch_op.drop_constraint("uq_movies_owner_title", type_="unique")
+        batch_op.create_unique_constraint("movies_img_url_key", ["img_url"])
+        batch_op.create_unique_constraint("movies_review_key", ["review"])
+        batch_op.create_unique_constraint("movies_title_key", ["title"])
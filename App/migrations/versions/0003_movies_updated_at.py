@@ -0,0 +1,32 @@
+"""Movies updated_at
+
+Adds the timestamp of the last change of every movie, used to version the list of a user.
+
+On sqlite the column has a non constant default, so the movies table is rebuilt, and the rebuilt table
+gets ix_movies_owner_rating without its descending rating, which batch_alter_movies recreates as the
+model defines it. Postgres alters the table in place and keeps it.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00
+
+"""
+import sqlalchemy as sa
+from migrations.helpers import batch_alter_movies
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with batch_alter_movies() as batch_op:
+        batch_op.add_column(sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False,
+                                      server_default=sa.func.now()))
+
+
+def downgrade():
+    with batch_alter_movies() as batch_op:
+        batch_op.drop_column("updated_at")
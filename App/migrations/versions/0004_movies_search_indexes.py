@@ -0,0 +1,36 @@
+"""Movies search indexes
+
+Adds a GIN full text index over the title, description and review of the movies and a trigram GIN
+index over the lowercase title for typo tolerant search. Only postgres supports them, other
+databases search without an index.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+# The document searched at this revision, 0005 splits it into the catalog and review documents of db/search.py
+SEARCH_DOCUMENT = "to_tsvector('english'::regconfig, title || ' ' || description || ' ' || review)"
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(f"CREATE INDEX ix_movies_search ON movies USING gin (({SEARCH_DOCUMENT}))")
+    op.execute("CREATE INDEX ix_movies_title_trgm ON movies USING gin (lower(title) gin_trgm_ops)")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("DROP INDEX ix_movies_title_trgm")
+    op.execute("DROP INDEX ix_movies_search")
@@ -0,0 +1,98 @@
+"""Shared movie catalog
+
+Moves the TMDB metadata of the movies (title, year, description and image) to a catalog table shared
+by every user, the movies keep only what belongs to the user and reference their catalog entry. The
+existing movies are backfilled with one catalog entry per distinct movie, without a TMDB id since it
+wasn't stored. The postgres search indexes move with the columns they cover.
+
+On sqlite the movies table is rebuilt, and the rebuilt table gets ix_movies_owner_rating without its
+descending rating, so batch_alter_movies recreates it as the model defines it.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from migrations.helpers import batch_alter_movies
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+CATALOG_COLUMNS = ("title", "year", "description", "img_url")
+# Must stay equivalent to CATALOG_DOCUMENT and REVIEW_DOCUMENT in db/search.py
+CATALOG_DOCUMENT = "to_tsvector('english'::regconfig, title || ' ' || description)"
+REVIEW_DOCUMENT = "to_tsvector('english'::regconfig, review)"
+# The indexes created by 0004
+SEARCH_DOCUMENT = "to_tsvector('english'::regconfig, title || ' ' || description || ' ' || review)"
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == "postgresql"
+    op.create_table(
+        "catalog",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("tmdb_id", sa.Integer()),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=False),
+        sa.Column("img_url", sa.String(), nullable=False),
+        sa.UniqueConstraint("tmdb_id", name="uq_catalog_tmdb_id"),
+    )
+    with batch_alter_movies() as batch_op:
+        batch_op.add_column(sa.Column("catalog_id", sa.Integer()))
+
+    columns = ", ".join(CATALOG_COLUMNS)
+    matches = " AND ".join(f"catalog.{column} = movies.{column}" for column in CATALOG_COLUMNS)
+    op.execute(f"INSERT INTO catalog ({columns}) SELECT DISTINCT {columns} FROM movies")
+    op.execute(f"UPDATE movies SET catalog_id = (SELECT catalog.id FROM catalog WHERE {matches})")
+
+    if postgres:
+        op.execute("DROP INDEX ix_movies_title_trgm")
+        op.execute("DROP INDEX ix_movies_search")
+    with batch_alter_movies() as batch_op:
+        batch_op.alter_column("catalog_id", existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key("fk_movies_catalog_id", "catalog", ["catalog_id"], ["id"])
+        batch_op.drop_constraint("uq_movies_owner_img_url", type_="unique")
+        batch_op.drop_constraint("uq_movies_owner_title", type_="unique")
+        batch_op.create_unique_constraint("uq_movies_owner_catalog", ["owner_id", "catalog_id"])
+        for column in CATALOG_COLUMNS:
+            batch_op.drop_column(column)
+    if postgres:
+        op.execute(f"CREATE INDEX ix_catalog_search ON catalog USING gin (({CATALOG_DOCUMENT}))")
+        op.execute("CREATE INDEX ix_catalog_title_trgm ON catalog USING gin (lower(title) gin_trgm_ops)")
+        op.execute(f"CREATE INDEX ix_movies_review_search ON movies USING gin (({REVIEW_DOCUMENT}))")
+
+
+def downgrade():
+    postgres = op.get_bind().dialect.name == "postgresql"
+    if postgres:
+        op.execute("DROP INDEX ix_movies_review_search")
+        op.execute("DROP INDEX ix_catalog_title_trgm")
+        op.execute("DROP INDEX ix_catalog_search")
+    with batch_alter_movies() as batch_op:
+        batch_op.add_column(sa.Column("title", sa.String()))
+        batch_op.add_column(sa.Column("year", sa.Integer()))
+        batch_op.add_column(sa.Column("description", sa.Text()))
+        batch_op.add_column(sa.Column("img_url", sa.String()))
+
+    for column in CATALOG_COLUMNS:
+        op.execute(f"UPDATE movies SET {column} = (SELECT catalog.{column} FROM catalog "
+                   f"WHERE catalog.id = movies.catalog_id)")
+
+    with batch_alter_movies() as batch_op:
+        for column, column_type in zip(CATALOG_COLUMNS, (sa.String(), sa.Integer(), sa.Text(), sa.String())):
+            batch_op.alter_column(column, existing_type=column_type, nullable=False)
+        batch_op.drop_constraint("uq_movies_owner_catalog", type_="unique")
+        batch_op.create_unique_constraint("uq_movies_owner_title", ["owner_id", "title"])
+        batch_op.create_unique_constraint("uq_movies_owner_img_url", ["owner_id", "img_url"])
+        batch_op.drop_constraint("fk_movies_catalog_id", type_="foreignkey")
+        batch_op.drop_column("catalog_id")
+    op.drop_table("catalog")
+    if postgres:
+        op.execute(f"CREATE INDEX ix_movies_search ON movies USING gin (({SEARCH_DOCUMENT}))")
+        op.execute("CREATE INDEX ix_movies_title_trgm ON movies USING gin (lower(title) gin_trgm_ops)")
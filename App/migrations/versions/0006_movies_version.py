@@ -0,0 +1,31 @@
+"""Movies version
+
+Adds the version of every movie, incremented when its rating or review changes, so concurrent edits
+are detected instead of overwriting each other.
+
+On sqlite the movies table is rebuilt, and the rebuilt table gets ix_movies_owner_rating without its
+descending rating, so batch_alter_movies recreates it as the model defines it.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:00
+
+"""
+import sqlalchemy as sa
+from migrations.helpers import batch_alter_movies
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with batch_alter_movies() as batch_op:
+        batch_op.add_column(sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade():
+    with batch_alter_movies() as batch_op:
+        batch_op.drop_column("version")
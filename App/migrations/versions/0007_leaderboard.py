@@ -0,0 +1,44 @@
+"""Leaderboard
+
+Adds the counters of how many users added every catalog entry and the sum of their ratings, backfilled
+from the existing movies, and the table holding the periodically computed top movies across users.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "catalog_stats",
+        sa.Column("catalog_id", sa.Integer(), sa.ForeignKey("catalog.id"), primary_key=True),
+        sa.Column("movie_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("rating_sum", sa.Float(), nullable=False, server_default="0"),
+    )
+    op.create_index("ix_catalog_stats_movie_count", "catalog_stats", [sa.text("movie_count DESC"), "catalog_id"])
+    op.create_table(
+        "leaderboard",
+        sa.Column("board", sa.String(16), primary_key=True),
+        sa.Column("position", sa.Integer(), primary_key=True),
+        sa.Column("catalog_id", sa.Integer(), sa.ForeignKey("catalog.id"), nullable=False),
+        sa.Column("movie_count", sa.Integer(), nullable=False),
+        sa.Column("average_rating", sa.Float(), nullable=False),
+    )
+    op.execute("INSERT INTO catalog_stats (catalog_id, movie_count, rating_sum) "
+               "SELECT catalog_id, count(*), sum(rating) FROM movies GROUP BY catalog_id")
+
+
+def downgrade():
+    op.drop_table("leaderboard")
+    op.drop_index("ix_catalog_stats_movie_count", table_name="catalog_stats")
+    op.drop_table("catalog_stats")
@@ -0,0 +1,28 @@
+"""Users movies version
+
+Adds a counter to every user, incremented on every change of their movies, that versions the list of the
+user. The count of the movies and their last update time didn't tell apart changes made in the same second.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.add_column(sa.Column("movies_version", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade():
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("movies_version")
@@ -0,0 +1,31 @@
+"""Manual order
+
+Lets users order their movies themselves instead of by rating: the users get a flag telling whether
+their rankings follow their manual order, and the movies of a user are indexed by ranking so their list
+is read in either order without sorting.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.add_column(sa.Column("manual_order", sa.Boolean(), nullable=False, server_default="0"))
+    op.create_index("ix_movies_owner_ranking", "movies", ["owner_id", "ranking", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_movies_owner_ranking", table_name="movies")
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("manual_order")
@@ -0,0 +1,82 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+from exceptions import ServiceBusyException
+from instrumentation import span, PASSWORD_DURATION
+
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+PASSWORD_POOL_SIZE = int(os.environ.get("PASSWORD_POOL_SIZE", 4))
+PASSWORD_QUEUE_LIMIT = int(os.environ.get("PASSWORD_QUEUE_LIMIT", 64))
+
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+executor = ThreadPoolExecutor(max_workers=PASSWORD_POOL_SIZE, thread_name_prefix="bcrypt")
+_pending = 0
+
+
+async def _run(func, *args):
+    """
+    Runs a bcrypt operation in the password pool so it doesn't block the event loop.
+
+    Args:
+        func: The passlib function to call
+        *args: The arguments of the function
+
+    Returns:
+        The result of the function
+
+    Raises:
+        ServiceBusyException: If there are already PASSWORD_QUEUE_LIMIT operations waiting or running
+    """
+    global _pending
+    if _pending >= PASSWORD_QUEUE_LIMIT:
+        raise ServiceBusyException()
+    _pending += 1
+    try:
+        with span(f"bcrypt {func.__name__}", PASSWORD_DURATION.labels(func.__name__)):
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    finally:
+        _pending -= 1
+
+
+async def verify_password(plain_password, hashed_password):
+    """
+    Checks the user password with the hashed password in the database.
+
+    Args:
+        plain_password (str): User password
+        hashed_password (str): User hashed password in db
+
+    Returns:
+        bool: Returns true if the password matches with the one in the db and false if not
+    """
+    return await _run(pwd_context.verify, plain_password, hashed_password)
+
+
+async def verify_and_update_password(plain_password, hashed_password):
+    """
+    Checks the user password and rehashes it when the stored hash uses an outdated bcrypt cost.
+
+    Args:
+        plain_password (str): User password
+        hashed_password (str): User hashed password in db
+
+    Returns:
+        tuple: Whether the password matches and the new hash to store, None if it doesn't need an update
+    """
+    return await _run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash(password):
+    """
+    Hashes the user password with passlib.
+
+    Args:
+        password (str): user inputed password
+
+    Returns:
+        str: hashed password
+    """
+    return await _run(pwd_context.hash, password)
@@ -0,0 +1,194 @@
+"""
+Local cache of the TMDB posters, so the cards are served from this app instead of hotlinking TMDB.
+
+Images are stored by the sha256 of their content under blobs/, and refs/<size>/<name> holds the
+digest of every downloaded poster variant. The least recently served blobs are evicted once the
+cache grows over its size limit, their refs are then downloaded again the next time. A blob is marked as
+used when it's looked up, so it's among the last ones any worker would evict while it's being sent.
+"""
+import os
+import re
+import asyncio
+import hashlib
+import tmdb
+
+
+POSTER_CACHE_DIR = os.environ.get("POSTER_CACHE_DIR", "/tmp/posters")
+POSTER_CACHE_MAX_BYTES = int(os.environ.get("POSTER_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+POSTER_SIZES = ("w92", "w154", "w185", "w342", "w500", "w780", "original")
+POSTER_NAME = re.compile(r"^[A-Za-z0-9_-]+\.(jpg|jpeg|png|webp)$")
+TMDB_IMAGE_PREFIX = tmdb.IMAGE_PATH.rsplit("/", 1)[0] + "/"
+
+
+def poster_name(img_url: str):
+    """
+    Extracts the TMDB file name of a poster url.
+
+    Args:
+        img_url (str): The poster url stored in the catalog
+
+    Returns:
+        str: The file name, None if the url isn't a TMDB poster
+    """
+    if not img_url or not img_url.startswith(TMDB_IMAGE_PREFIX):
+        return None
+    name = img_url.rsplit("/", 1)[-1]
+    return name if POSTER_NAME.match(name) else None
+
+
+class PosterCache:
+    """
+    Content addressed on-disk cache of poster images with size bounded, least recently used eviction.
+
+    Attributes:
+        directory (str): Where the images are stored.
+        max_bytes (int): The size the blobs may take before the least recently used ones are evicted.
+        size (int): The bytes used by the blobs, as last counted by this worker.
+        hits (int): Number of posters served from disk.
+        misses (int): Number of posters downloaded from TMDB.
+
+    """
+    def __init__(self, directory: str = POSTER_CACHE_DIR, max_bytes: int = POSTER_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = None
+        self.hits = 0
+        self.misses = 0
+        self._downloads = {}
+
+    def _ref_path(self, name: str, size: str):
+        return os.path.join(self.directory, "refs", size, name)
+
+    def _blob_path(self, digest: str, name: str):
+        return os.path.join(self.directory, "blobs", digest[:2], digest + os.path.splitext(name)[1])
+
+    def _blobs(self):
+        """
+        Lists the stored blobs.
+
+        Returns:
+            list: The path, size and last access time of every blob
+        """
+        blobs = []
+        for root, _, files in os.walk(os.path.join(self.directory, "blobs")):
+            for file in files:
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                blobs.append((path, stat.st_size, stat.st_mtime))
+        return blobs
+
+    def _lookup(self, name: str, size: str):
+        """
+        Finds the blob of a poster variant and marks it as recently used.
+
+        Args:
+            name (str): The poster file name
+            size (str): The poster size
+
+        Returns:
+            tuple: The blob path and its digest, None if the variant isn't stored
+        """
+        try:
+            with open(self._ref_path(name, size)) as ref:
+                digest = ref.read().strip()
+            path = self._blob_path(digest, name)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path, digest
+
+    def _store(self, name: str, size: str, content: bytes):
+        """
+        Writes a poster variant, evicting the least recently used blobs if the cache gets too big.
+
+        Args:
+            name (str): The poster file name
+            size (str): The poster size
+            content (bytes): The image
+
+        Returns:
+            tuple: The blob path and its digest
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._blob_path(digest, name)
+        if self.size is None:
+            self.size = sum(blob_size for _, blob_size, _ in self._blobs())
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as blob:
+                blob.write(content)
+            os.replace(temporary, path)
+            self.size += len(content)
+        ref_path = self._ref_path(name, size)
+        os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+        temporary = f"{ref_path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as ref:
+            ref.write(digest)
+        os.replace(temporary, ref_path)
+        if self.size > self.max_bytes:
+            self._evict(keep=path)
+        return path, digest
+
+    def _evict(self, keep: str):
+        """
+        Deletes the least recently used blobs until the cache takes 90% of its limit.
+
+        Args:
+            keep (str): The path of a blob that must not be deleted
+        """
+        blobs = sorted(self._blobs(), key=lambda blob: blob[2])
+        self.size = sum(blob_size for _, blob_size, _ in blobs)
+        for path, blob_size, _ in blobs:
+            if self.size <= self.max_bytes * 0.9:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= blob_size
+
+    async def get(self, name: str, size: str):
+        """
+        Retrieves a poster variant, downloading it from TMDB only once when it isn't stored.
+
+        Args:
+            name (str): The poster file name
+            size (str): The poster size
+
+        Returns:
+            tuple: The path of the image on disk and its digest
+        """
+        found = await asyncio.to_thread(self._lookup, name, size)
+        if found is not None:
+            self.hits += 1
+            return found
+        key = (name, size)
+        download = self._downloads.get(key)
+        if download is None:
+            self.misses += 1
+            download = asyncio.ensure_future(self._download(name, size))
+            self._downloads[key] = download
+            download.add_done_callback(lambda _: self._downloads.pop(key, None))
+        return await asyncio.shield(download)
+
+    async def _download(self, name: str, size: str):
+        content, _ = await tmdb.client.get_image(name, size)
+        return await asyncio.to_thread(self._store, name, size, content)
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: hits, misses and the bytes used by the blobs
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": self.size, "max_bytes": self.max_bytes}
+
+
+cache = PosterCache()
@@ -0,0 +1,503 @@
+"""
+Item to item recommendations, the movies that users with a similar taste also loved.
+
+The ratings of every user form a sparse users x movies matrix. Two movies are similar when the same
+users rate them above or below their own average rating (adjusted cosine similarity), computed for
+a block of movies at a time with sparse matrix products and reduced to the top neighbors of every
+movie. A user is recommended the neighbors of the movies they rated, weighted by how much they liked
+them.
+
+The workers of a machine share the model through a file, the one that gets its lock rebuilds it from
+the database and the others load it.
+"""
+import os
+import time
+import asyncio
+import logging
+import contextlib
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select
+from db.client import AsyncSessionLocal
+from db.models.models import Movies
+
+try:
+    import fcntl
+except ImportError:  # Windows, the workers don't coordinate and may all rebuild the model
+    fcntl = None
+
+RECOMMENDATIONS_NEIGHBORS = int(os.environ.get("RECOMMENDATIONS_NEIGHBORS", 50))
+# Similarities of movies rated by few users in common are shrunk by common / (common + shrinkage)
+RECOMMENDATIONS_SHRINKAGE = float(os.environ.get("RECOMMENDATIONS_SHRINKAGE", 10))
+RECOMMENDATIONS_MEMORY_MB = float(os.environ.get("RECOMMENDATIONS_MEMORY_MB", 256))
+RECOMMENDATIONS_REBUILD_SECONDS = float(os.environ.get("RECOMMENDATIONS_REBUILD_SECONDS", 3600))
+RECOMMENDATIONS_UPDATE_SECONDS = float(os.environ.get("RECOMMENDATIONS_UPDATE_SECONDS", 60))
+RECOMMENDATIONS_MODEL_PATH = os.environ.get("RECOMMENDATIONS_MODEL_PATH", "/tmp/mytopmovies-recommendations.npz")
+LOAD_BATCH_SIZE = 50000
+# Seconds to wait before loading the model another worker is building, when this one has none yet
+LOCK_RETRY_SECONDS = 1
+# Bytes of every rating kept by the model, its value and its movie index in the ratings matrix
+RATING_BYTES = 8
+# Bytes of every neighbor of a movie, its index and its similarity
+NEIGHBOR_BYTES = 8
+# Bytes of every movie and user besides their ratings, the catalog ID, and the user ID and row offset
+ITEM_BYTES = 8
+USER_BYTES = 12
+
+logger = logging.getLogger("mytopmovies.recommendations")
+
+
+def centered(ratings):
+    """
+    Subtracts from every rating the average rating of its user, keeping the zeros it produces as
+    explicit entries so the matrix structure still tells which movies were rated.
+
+    Args:
+        ratings (sparse.csr_matrix): The users x movies ratings
+
+    Returns:
+        sparse.csr_matrix: The centered ratings
+    """
+    counts = np.diff(ratings.indptr)
+    sums = np.asarray(ratings.sum(axis=1)).ravel()
+    means = np.divide(sums, counts, out=np.zeros(len(counts), np.float32), where=counts > 0)
+    result = ratings.copy()
+    result.data -= np.repeat(means, counts).astype(np.float32)
+    return result
+
+
+def item_neighbors(ratings, items, k: int, shrinkage: float, block_bytes: int):
+    """
+    Computes the most similar movies of some movies, a block of movies at a time.
+
+    Args:
+        ratings (sparse.csr_matrix): The users x movies ratings
+        items (np.ndarray): The indexes of the movies whose neighbors are computed
+        k (int): The number of neighbors of every movie
+        shrinkage (float): How much the similarity of movies with few users in common is shrunk
+        block_bytes (int): The memory used by the dense similarity block of every batch of movies
+
+    Returns:
+        tuple: The neighbor indexes and their similarity, arrays of len(items) x k, zero when there
+        are less than k similar movies
+    """
+    item_count = ratings.shape[1]
+    neighbors = np.zeros((len(items), k), np.int32)
+    weights = np.zeros((len(items), k), np.float32)
+    k = min(k, item_count - 1)
+    if k <= 0 or not len(items):
+        return neighbors, weights
+
+    matrix = centered(ratings)
+    by_item = matrix.T.tocsr()
+    rated = sparse.csr_matrix((np.ones_like(ratings.data), ratings.indices, ratings.indptr), shape=ratings.shape)
+    rated_by_item = rated.T.tocsr()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel()).astype(np.float32)
+
+    # The products, the common users and the similarity are dense blocks of batch x item_count float32
+    batch = max(1, block_bytes // (item_count * 4 * 3))
+    for start in range(0, len(items), batch):
+        block = items[start:start + batch]
+        rows = np.arange(len(block))
+        similarity = (by_item[block] @ matrix).toarray()
+        common = (rated_by_item[block] @ rated).toarray()
+        denominator = norms[block, None] * norms[None, :]
+        np.divide(similarity, denominator, out=similarity, where=denominator > 0)
+        similarity *= common / (common + shrinkage)
+        similarity[rows, block] = 0
+
+        top = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        top_weights = np.take_along_axis(similarity, top, axis=1)
+        top_weights[top_weights < 0] = 0
+        neighbors[start:start + len(block), :k] = np.where(top_weights > 0, top, 0)
+        weights[start:start + len(block), :k] = top_weights
+    return neighbors, weights
+
+
+class RecommendationModel:
+    """
+    The ratings matrix and the neighbors of every movie.
+
+    Attributes:
+        ratings (sparse.csr_matrix): The users x movies ratings.
+        user_ids (np.ndarray): The user ID of every row.
+        item_ids (np.ndarray): The catalog ID of every column.
+        neighbors (np.ndarray): The column of the most similar movies of every movie, items x k.
+        weights (np.ndarray): The similarity of those movies, 0 for the padding.
+        memory_bytes (int): The memory budget of the model, the updates can't grow it past it.
+
+    """
+    def __init__(self, ratings, user_ids, item_ids, neighbors, weights, memory_bytes: int = None):
+        self.ratings = ratings
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.neighbors = neighbors
+        self.weights = weights
+        self.memory_bytes = memory_bytes or int(RECOMMENDATIONS_MEMORY_MB * 2 ** 20)
+        self.user_index = {user_id: row for row, user_id in enumerate(user_ids.tolist())}
+        self.item_index = {item_id: column for column, item_id in enumerate(item_ids.tolist())}
+
+    @property
+    def nbytes(self):
+        return (self.ratings.data.nbytes + self.ratings.indices.nbytes + self.ratings.indptr.nbytes
+                + self.user_ids.nbytes + self.item_ids.nbytes + self.neighbors.nbytes + self.weights.nbytes)
+
+    def save(self, path: str):
+        """
+        Writes the model to a file, replaced at once so the other workers never read it half written.
+
+        Args:
+            path (str): The file
+        """
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            np.savez(file, data=self.ratings.data, indices=self.ratings.indices, indptr=self.ratings.indptr,
+                     shape=np.array(self.ratings.shape), user_ids=self.user_ids, item_ids=self.item_ids,
+                     neighbors=self.neighbors, weights=self.weights, memory_bytes=np.array(self.memory_bytes))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Reads a model written by save.
+
+        Args:
+            path (str): The file
+
+        Returns:
+            RecommendationModel: The model
+        """
+        with np.load(path) as arrays:
+            ratings = sparse.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]),
+                                        shape=tuple(arrays["shape"]))
+            return cls(ratings, arrays["user_ids"], arrays["item_ids"], arrays["neighbors"], arrays["weights"],
+                       int(arrays["memory_bytes"]))
+
+    def recommend(self, ratings: dict, limit: int):
+        """
+        Scores the neighbors of the movies rated by a user.
+
+        Every rated movie adds its similarity to each of its neighbors times how much the user liked it
+        compared to their average, or just its similarity if the user rates everything the same.
+
+        Args:
+            ratings (dict): The rating of the user for every catalog ID
+            limit (int): The number of movies to recommend
+
+        Returns:
+            list: The catalog IDs of the recommended movies, best first, without the ones already rated
+        """
+        known = [(self.item_index[catalog_id], rating) for catalog_id, rating in ratings.items()
+                 if catalog_id in self.item_index]
+        if not known:
+            return []
+        columns = np.array([column for column, _ in known], np.int64)
+        values = np.array([rating for _, rating in known], np.float32)
+        preference = values - values.mean()
+        if not preference.any():
+            preference = np.ones_like(values)
+
+        scores = np.bincount(self.neighbors[columns].ravel(),
+                             (self.weights[columns] * preference[:, None]).ravel(),
+                             minlength=len(self.item_ids))
+        scores[columns] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return self.item_ids[candidates].tolist()
+
+    def updated(self, changes: dict, shrinkage: float = RECOMMENDATIONS_SHRINKAGE, block_bytes: int = None):
+        """
+        Applies new, changed and deleted ratings, recomputing the neighbors of the movies they rated.
+
+        The neighbor lists of the other movies keep their old similarity to those movies until the
+        next full rebuild. Ratings that would grow the model past its memory budget, of movies or users
+        it doesn't have yet, are left out until then too.
+
+        Args:
+            changes (dict): The new rating of every (user ID, catalog ID), None if it was deleted
+            shrinkage (float): How much the similarity of movies with few users in common is shrunk
+            block_bytes (int): The memory used by the dense similarity blocks
+
+        Returns:
+            RecommendationModel: A new model, this one is left as it was
+        """
+        user_ids, item_ids = self.user_ids.tolist(), self.item_ids.tolist()
+        user_index, item_index = dict(self.user_index), dict(self.item_index)
+        rows, columns, deltas = [], [], []
+        size, k = self.nbytes, self.neighbors.shape[1]
+        for (user_id, catalog_id), rating in changes.items():
+            new_user, new_item = user_id not in user_index, catalog_id not in item_index
+            if rating is None and (new_user or new_item):
+                continue
+            row, column = user_index.get(user_id), item_index.get(catalog_id)
+            known = not new_user and not new_item and row < self.ratings.shape[0] and column < self.ratings.shape[1]
+            previous = self.ratings[row, column] if known else 0
+            growth = (new_user * USER_BYTES + new_item * (k * NEIGHBOR_BYTES + ITEM_BYTES)
+                      + (not previous and rating is not None) * RATING_BYTES)
+            if growth and size + growth > self.memory_bytes:
+                continue
+            size += growth
+            if new_user:
+                row = user_index[user_id] = len(user_ids)
+                user_ids.append(user_id)
+            if new_item:
+                column = item_index[catalog_id] = len(item_ids)
+                item_ids.append(catalog_id)
+            rows.append(row)
+            columns.append(column)
+            deltas.append((rating or 0) - previous)
+
+        shape = (len(user_ids), len(item_ids))
+        ratings = self.ratings.copy()
+        ratings.resize(shape)
+        ratings = ratings + sparse.csr_matrix((np.array(deltas, np.float32), (rows, columns)), shape=shape)
+        ratings.eliminate_zeros()
+        ratings.sort_indices()
+
+        neighbors = np.zeros((shape[1], self.neighbors.shape[1]), np.int32)
+        weights = np.zeros((shape[1], self.weights.shape[1]), np.float32)
+        neighbors[:len(self.neighbors)] = self.neighbors
+        weights[:len(self.weights)] = self.weights
+        dirty = np.unique(np.array(columns, np.int64))
+        block_bytes = block_bytes or self.memory_bytes // 4
+        neighbors[dirty], weights[dirty] = item_neighbors(ratings, dirty, neighbors.shape[1], shrinkage, block_bytes)
+        return RecommendationModel(ratings, np.array(user_ids, np.int64), np.array(item_ids, np.int64),
+                                   neighbors, weights, self.memory_bytes)
+
+
+def build_model(user_ids, item_ids, ratings, k: int = RECOMMENDATIONS_NEIGHBORS,
+                shrinkage: float = RECOMMENDATIONS_SHRINKAGE, memory_bytes: int = None):
+    """
+    Builds the model from every rating.
+
+    When the ratings and neighbors of every movie don't fit in the memory budget, the movies rated by
+    fewer users are left out until they do.
+
+    Args:
+        user_ids (np.ndarray): The user ID of every rating
+        item_ids (np.ndarray): The catalog ID of every rating
+        ratings (np.ndarray): The ratings
+        k (int): The number of neighbors of every movie
+        shrinkage (float): How much the similarity of movies with few users in common is shrunk
+        memory_bytes (int): The memory budget of the model, a quarter of it more is used while it's built
+
+    Returns:
+        RecommendationModel: The model
+    """
+    memory_bytes = memory_bytes or int(RECOMMENDATIONS_MEMORY_MB * 2 ** 20)
+    users, user_rows = np.unique(user_ids, return_inverse=True)
+    items, item_columns = np.unique(item_ids, return_inverse=True)
+
+    counts = np.bincount(item_columns, minlength=len(items))
+    by_popularity = np.argsort(-counts, kind="stable")
+    sizes = (np.cumsum(counts[by_popularity]) * RATING_BYTES
+             + np.arange(1, len(items) + 1) * (k * NEIGHBOR_BYTES + ITEM_BYTES))
+    kept = by_popularity[:np.searchsorted(sizes, memory_bytes - len(users) * USER_BYTES, side="right")]
+    if len(kept) < len(items):
+        logger.warning("Recommendations use the %d most rated of %d movies to fit in %d bytes",
+                       len(kept), len(items), memory_bytes)
+        kept = np.sort(kept)
+        columns = np.full(len(items), -1, np.int64)
+        columns[kept] = np.arange(len(kept))
+        item_columns = columns[item_columns]
+        selected = item_columns >= 0
+        user_rows, item_columns, ratings = user_rows[selected], item_columns[selected], ratings[selected]
+        items = items[kept]
+
+    matrix = sparse.csr_matrix((np.asarray(ratings, np.float32), (user_rows, item_columns)),
+                               shape=(len(users), len(items)))
+    matrix.sort_indices()
+    neighbors, weights = item_neighbors(matrix, np.arange(len(items)), k, shrinkage, memory_bytes // 4)
+    return RecommendationModel(matrix, users.astype(np.int64), items.astype(np.int64), neighbors, weights,
+                               memory_bytes)
+
+
+@contextlib.contextmanager
+def try_lock(path: str):
+    """
+    Takes an exclusive lock shared by the processes of this machine, without waiting for it.
+
+    Args:
+        path (str): The lock file, created if it doesn't exist
+
+    Yields:
+        bool: True if the lock was taken, False if another process holds it
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(path, "a") as file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def file_age(path: str):
+    """
+    Tells how long ago a file was written.
+
+    Args:
+        path (str): The file
+
+    Returns:
+        float: The seconds since it was last written, None if it doesn't exist
+    """
+    try:
+        return time.time() - os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+async def load_ratings(db):
+    """
+    Reads every rating in batches.
+
+    Args:
+        db (AsyncSession): The async database session
+
+    Returns:
+        tuple: The user IDs, catalog IDs and ratings, as arrays
+    """
+    result = await db.stream(select(Movies.owner_id, Movies.catalog_id, Movies.rating)
+                             .execution_options(yield_per=LOAD_BATCH_SIZE))
+    chunks = [np.array(rows, np.float64) async for rows in result.partitions()]
+    table = np.concatenate(chunks) if chunks else np.zeros((0, 3))
+    return table[:, 0].astype(np.int64), table[:, 1].astype(np.int64), table[:, 2].astype(np.float32)
+
+
+class Recommender:
+    """
+    Keeps the model of this worker up to date in the background.
+
+    The model is rebuilt every rebuild_interval, by a single worker of the machine that writes it to
+    model_path for the others to load. In between, the ratings changed in this worker are applied every
+    update_interval, the other workers see them on their next rebuild.
+
+    Attributes:
+        rebuild_interval (float): Seconds between full rebuilds.
+        update_interval (float): Seconds between the applications of the changed ratings.
+        model_path (str): The file the model is shared through.
+        model (RecommendationModel): The current model, None until it's first built.
+        built_at (float): The monotonic time of the last full rebuild.
+
+    """
+    def __init__(self, rebuild_interval: float = RECOMMENDATIONS_REBUILD_SECONDS,
+                 update_interval: float = RECOMMENDATIONS_UPDATE_SECONDS,
+                 model_path: str = RECOMMENDATIONS_MODEL_PATH):
+        self.rebuild_interval = rebuild_interval
+        self.update_interval = update_interval
+        self.model_path = model_path
+        self.model = None
+        self.built_at = None
+        self._changes = {}
+        self._task = None
+
+    def record(self, user_id: int, catalog_id: int, rating: float = None):
+        """
+        Queues a new, changed or deleted rating to be applied to the model.
+
+        Args:
+            user_id (int): The ID of the user
+            catalog_id (int): The catalog ID of the movie
+            rating (float): The new rating, None if the movie was deleted
+        """
+        self._changes[(user_id, catalog_id)] = rating
+
+    def recommend(self, ratings: dict, limit: int):
+        """
+        Recommends movies to a user.
+
+        Args:
+            ratings (dict): The rating of the user for every catalog ID
+            limit (int): The number of movies to recommend
+
+        Returns:
+            list: The catalog IDs of the recommended movies, best first, empty until the model is built
+        """
+        return self.model.recommend(ratings, limit) if self.model is not None else []
+
+    async def rebuild(self):
+        """
+        Builds the model again from every rating in the database, unless another worker just did.
+
+        The worker holding the lock of the shared model loads it if it was written less than a rebuild
+        interval ago, and builds and writes it otherwise. The ratings changed in this worker are kept
+        queued when the model is loaded, it may have been built before them.
+
+        Returns:
+            bool: False if another worker is rebuilding the model, True otherwise
+        """
+        with try_lock(f"{self.model_path}.lock") as locked:
+            if not locked:
+                return False
+            age = file_age(self.model_path)
+            if age is not None and age < self.rebuild_interval:
+                self.model = await asyncio.to_thread(RecommendationModel.load, self.model_path)
+                self.built_at = time.monotonic() - age
+                logger.info("Loaded the recommendations of %d users and %d movies built %.0f s ago",
+                            len(self.model.user_ids), len(self.model.item_ids), age)
+                return True
+
+            self._changes = {}
+            async with AsyncSessionLocal() as db:
+                user_ids, item_ids, ratings = await load_ratings(db)
+            start = time.perf_counter()
+            self.model = await asyncio.to_thread(build_model, user_ids, item_ids, ratings)
+            self.built_at = time.monotonic()
+            await asyncio.to_thread(self.model.save, self.model_path)
+        logger.info("Built the recommendations of %d users and %d movies in %.1f s, %d bytes",
+                    len(self.model.user_ids), len(self.model.item_ids), time.perf_counter() - start,
+                    self.model.nbytes)
+        return True
+
+    async def update(self):
+        """
+        Applies the changed ratings queued since the last update.
+        """
+        if self.model is None or not self._changes:
+            return
+        changes, self._changes = self._changes, {}
+        self.model = await asyncio.to_thread(self.model.updated, changes)
+
+    async def _run(self):
+        while True:
+            delay = self.update_interval
+            try:
+                if self.model is None or time.monotonic() - self.built_at >= self.rebuild_interval:
+                    if not await self.rebuild() and self.model is None:
+                        delay = LOCK_RETRY_SECONDS
+                else:
+                    await self.update()
+            except Exception:
+                logger.exception("Couldn't update the recommendations")
+            await asyncio.sleep(delay)
+
+    def start(self):
+        """
+        Starts building and updating the model in the background.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """
+        Stops updating the model.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+recommender = Recommender()
@@ -0,0 +1,351 @@
+import tmdb
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.schemas.schemas import Movie, MovieFromTMDB, MovieUpdate, MovieOrder, CurrentUser
+from db.async_crud import get_movie_by_id, delete_movie_item, update_movie_rankings, update_movie_item
+from db.async_crud import get_movies_version, get_leaderboard, get_user_ratings, get_catalog_movies
+from db.async_crud import get_owned_movie_ids, commit_movie_changes, reorder_movies, rank_movies_by_rating
+from db.search import search_movies
+from routers.routes import get_db, manager, get_movies_page, add_movie_from_tmdb
+from http_cache import make_etag, etag_matches
+from exceptions import MovieAlreadyAddedException
+from leaderboard import BOARDS
+from recommendations import recommender
+from autocomplete import completer, year_of, AUTOCOMPLETE_LIMIT, AUTOCOMPLETE_TMDB_MIN_LENGTH
+
+
+MOVIE_FIELDS = (*Movie.__fields__, "version")
+
+router = APIRouter(prefix="/api/v1", default_response_class=ORJSONResponse)
+
+
+def parse_fields(fields: str = Query(None, description="Comma separated movie fields to return")):
+    """
+    Validates the fields selected by the client.
+
+    Args:
+        fields (str): The comma separated field names, all of them if None
+
+    Returns:
+        tuple: The selected field names
+
+    Raises:
+        HTTPException: If a field doesn't exist
+    """
+    if not fields:
+        return MOVIE_FIELDS
+    selected = tuple(field.strip() for field in fields.split(",") if field.strip())
+    unknown = set(selected) - set(MOVIE_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return selected
+
+
+def serialize_movie(movie, fields: tuple):
+    """
+    Serializes the selected fields of a movie straight from the model, without building a schema.
+
+    Args:
+        movie (Movies): The movie object
+        fields (tuple): The field names of the Movie schema to include
+
+    Returns:
+        dict: The selected fields
+    """
+    return {field: getattr(movie, field) for field in fields}
+
+
+async def get_owned_movie(movie_id: int, user = Depends(manager), db: AsyncSession = Depends(get_db)):
+    """
+    Retrieves a movie of the current user.
+
+    Args:
+        movie_id (int): The id of the movie
+        user: Current logged user
+        db (AsyncSession): The async database session
+
+    Returns:
+        Movies: The movie object
+
+    Raises:
+        HTTPException: If the user doesn't own a movie with that id
+    """
+    movie = await get_movie_by_id(db=db, movie_id=movie_id, user_id=user.id)
+    if movie is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Movie not found")
+    return movie
+
+
+@router.get("/user", response_model=CurrentUser)
+async def current_user(user = Depends(manager)):
+    """
+    Returns the logged user.
+
+    Args:
+        user: Current logged user
+
+    Returns:
+        CurrentUser: The user identity
+    """
+    return user
+
+
+@router.get("/movies")
+async def list_movies(request: Request, response: Response, fields: tuple = Depends(parse_fields),
+                      limit: int = Query(100, ge=1, le=1000), after: str = None,
+                      user = Depends(manager), db: AsyncSession = Depends(get_db)):
+    """
+    Lists the movies of the user ordered by ranking, one page at a time.
+
+    The list is versioned with an ETag, so a client sending If-None-Match with the current one gets a
+    304 without the movies being queried.
+
+    Args:
+        request (Request): The incoming HTTP request object
+        response (Response): The outgoing response, used to set the ETag
+        fields (tuple): The movie fields to return
+        limit (int): The page size
+        after (str): The cursor returned with the previous page
+        user: Current logged user
+        db (AsyncSession): The async database session
+
+    Returns:
+        dict: The movies of the page and the cursor of the next page
+    """
+    version = await get_movies_version(db=db, user_id=user.id)
+    etag = make_etag(user.id, version, fields, limit, after)
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    movies, next_cursor = await get_movies_page(db=db, user_id=user.id, cursor=after, limit=limit,
+                                                load_description="description" in fields)
+    response.headers["ETag"] = etag
+    return {"movies": [serialize_movie(movie, fields) for movie in movies], "next_cursor": next_cursor}
+
+
+@router.post("/movies", status_code=status.HTTP_201_CREATED)
+async def create_movie(data: MovieFromTMDB, user = Depends(manager), db: AsyncSession = Depends(get_db)):
+    """
+    Adds a movie to the list of the user from its TMDB data.
+
+    Args:
+        data (MovieFromTMDB): The TMDB id of the movie
+        user: Current logged user
+        db (AsyncSession): The async database session
+
+    Returns:
+        dict: The created movie
+
+    Raises:
+        HTTPException: If TMDB doesn't know the movie or it's already in the list of the user
+    """
+    try:
+        movie = await add_movie_from_tmdb(db=db, user_id=user.id, tmdb_id=data.tmdb_id)
+    except MovieAlreadyAddedException as error:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail={"message": "Movie already added", "id": error.movie_id})
+    await db.refresh(movie)
+    return serialize_movie(movie, MOVIE_FIELDS)
+
+
+@router.get("/movies/search")
+async def search(q: str = Query(..., min_length=1, max_length=200), limit: int = Query(20, ge=1, le=100),
+                 user = Depends(manager), db: AsyncSession = Depends(get_db)):
+    """
+    Searches the movies of the user by title, description and review.
+
+    Args:
+        q (str): The searched text, quoted phrases, OR and -word are supported in postgres
+        limit (int): Maximum number of results
+        user: Current logged user
+        db (AsyncSession): The async database session
+
+    Returns:
+        dict: The matched movies, best first, with the html highlights of the matched fields
+    """
+    return {"results": await search_movies(db=db, user_id=user.id, query=q, limit=limit)}
+
+
+@router.put("/movies/order", status_code=status.HTTP_204_NO_CONTENT)
+async def reorder(data: MovieOrder, user = Depends(manager), db: AsyncSession = Depends(get_db)):
+    """
+    Ranks the movies of the user in the given order, which is kept as movies are added, rated or deleted.
+
+    Args:
+        data (MovieOrder): The IDs of every movie of the user, in their new order
+        user: Current logged user
+        db (AsyncSession): The async database session
+
+    Raises:
+        HTTPException: If the IDs aren't exactly the movies of the user
+    """
+    if not await reorder_movies(db=db, user_id=user.id, movie_ids=data.movie_ids):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="The order must list every movie of the user once")
+
+
+@router.delete("/movies/order", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_order(user = Depends(manager), db: AsyncSession = Depends(get_db)):
+    """
+    Drops the manual order of the user and ranks their movies by rating again.
+
+    Args:
+        user: Current logged user
+        db (AsyncSession): The async database session
+    """
+    await rank_movies_by_rating(db=db, user_id=user.id)
+
+
+@router.get("/movies/{movie_id}")
+async def get_movie(movie = Depends(get_owned_movie), fields: tuple = Depends(parse_fields)):
+    """
+    Returns a movie of the user.
+
+    Args:
+        movie (Movies): The movie object
+        fields (tuple): The movie fields to return
+
+    Returns:
+        dict: The selected fields of the movie
+    """
+    return serialize_movie(movie, fields)
+
+
+@router.patch("/movies/{movie_id}")
+async def update_movie(data: MovieUpdate, movie = Depends(get_owned_movie), user = Depends(manager),
+                       db: AsyncSession = Depends(get_db)):
+    """
+    Updates the rating and/or the review of a movie of the user.
+
+    The change is only applied if the movie is still at the given version, or at the version just read
+    when none is given. A request without a rating or a review changes nothing, and the rankings are
+    only recomputed when the rating changed.
+
+    Args:
+        data (MovieUpdate): The fields to change
+        movie (Movies): The movie object
+        user: Current logged user
+        db (AsyncSession): The async database session
+
+    Returns:
+        dict: The updated movie
+
+    Raises:
+        HTTPException: If the movie changed since that version
+    """
+    values = data.dict(exclude_unset=True, exclude_none=True, exclude={"version"})
+    if not values:
+        return serialize_movie(movie, MOVIE_FIELDS)
+    version = data.version if data.version is not None else movie.version
+    updated = await update_movie_item(db=db, movie_id=movie.id, user_id=user.id, version=version, values=values)
+    if updated is None:
+        await db.refresh(movie)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail={"message": "The movie was changed by another request",
+                                    "version": movie.version})
+    catalog_id, previous_rating = updated
+    if values.get("rating", previous_rating) != previous_rating:
+        await update_movie_rankings(db=db, user_id=user.id)
+        recommender.record(user.id, catalog_id, values["rating"])
+    else:
+        await commit_movie_changes(db=db, user_id=user.id)
+    await db.refresh(movie)
+    return serialize_movie(movie, MOVIE_FIELDS)
+
+
+@router.delete("/movies/{movie_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_movie(movie = Depends(get_owned_movie), user = Depends(manager), db: AsyncSession = Depends(get_db)):
+    """
+    Deletes a movie of the user.
+
+    Args:
+        movie (Movies): The movie object
+        user: Current logged user
+        db (AsyncSession): The async database session
+    """
+    catalog_id = await delete_movie_item(db=db, movie_id=movie.id, user_id=user.id)
+    await update_movie_rankings(db=db, user_id=user.id)
+    if catalog_id is not None:
+        recommender.record(user.id, catalog_id, None)
+
+
+@router.get("/leaderboard/{board}")
+async def leaderboard(board: str, limit: int = Query(None, ge=1, le=100), user = Depends(manager),
+                      db: AsyncSession = Depends(get_db)):
+    """
+    Returns the most added or the top rated movies across every user, as of the last refresh.
+
+    Args:
+        board (str): The ranking, "most_added" or "top_rated"
+        limit (int): Maximum number of movies, all the ranked ones if None
+        user: Current logged user
+        db (AsyncSession): The async database session
+
+    Returns:
+        dict: The ranked movies with the number of users that added them and their average rating
+
+    Raises:
+        HTTPException: If the ranking doesn't exist
+    """
+    if board not in BOARDS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Leaderboard not found")
+    entries = await get_leaderboard(db=db, board=board, limit=limit)
+    return {"results": [{"position": entry.position, "tmdb_id": entry.catalog.tmdb_id, "title": entry.catalog.title,
+                         "year": entry.catalog.year, "img_url": entry.catalog.img_url,
+                         "movie_count": entry.movie_count, "average_rating": entry.average_rating}
+                        for entry in entries]}
+
+
+@router.get("/recommendations")
+async def recommendations(limit: int = Query(20, ge=1, le=100), user = Depends(manager),
+                          db: AsyncSession = Depends(get_db)):
+    """
+    Returns the movies that users with a taste like the user's also loved.
+
+    Args:
+        limit (int): Maximum number of movies
+        user: Current logged user
+        db (AsyncSession): The async database session
+
+    Returns:
+        dict: The recommended movies, best first, empty until the model of the worker is built
+    """
+    ratings = await get_user_ratings(db=db, user_id=user.id)
+    movies = await get_catalog_movies(db=db, catalog_ids=recommender.recommend(ratings, limit))
+    return {"results": [{"tmdb_id": movie.tmdb_id, "title": movie.title, "year": movie.year, "img_url": movie.img_url}
+                        for movie in movies]}
+
+
+@router.get("/autocomplete")
+async def autocomplete(q: str = Query(..., max_length=200), limit: int = Query(8, ge=1, le=AUTOCOMPLETE_LIMIT),
+                       user = Depends(manager), db: AsyncSession = Depends(get_db)):
+    """
+    Completes a partially typed movie title from the titles known to the worker, the catalog and the
+    TMDB search results seen before. TMDB is only searched when none of them matches, and its results
+    are returned as they are so a mistyped title can still be found. The movies the user already added
+    come with the ID of their movie, to open it instead of adding it again.
+
+    Args:
+        q (str): The typed text
+        limit (int): Maximum number of movies
+        user: Current logged user
+        db (AsyncSession): The async database session
+
+    Returns:
+        dict: The matched movies, the most added first, and whether they were searched in TMDB
+    """
+    titles = completer.complete(q, limit)
+    from_tmdb = not titles and len(q.strip()) >= AUTOCOMPLETE_TMDB_MIN_LENGTH
+    if from_tmdb:
+        results = await tmdb.client.search_movies(q)
+        completer.add_tmdb_results(results)
+        movies = [{"tmdb_id": result["id"], "title": result["original_title"],
+                   "year": year_of(result.get("release_date"))} for result in results[:limit]]
+    else:
+        movies = [{"tmdb_id": title.tmdb_id, "title": title.title, "year": title.year} for title in titles]
+    owned = await get_owned_movie_ids(db=db, user_id=user.id, tmdb_ids=[movie["tmdb_id"] for movie in movies])
+    for movie in movies:
+        movie["movie_id"] = owned.get(movie["tmdb_id"])
+    return {"results": movies, "from_tmdb": from_tmdb}
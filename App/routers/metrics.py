@@ -0,0 +1,85 @@
+import os
+import secrets
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+from db.client import engine, async_engine, pool_stats
+from metrics import format_histogram, format_cache_stats, render_prometheus
+import posters
+import tmdb
+
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def require_metrics_token(request: Request):
+    """
+    Restricts the metrics to the scrapers sending the METRICS_TOKEN as a bearer token.
+
+    The metrics are disabled when no token is configured, they expose the internals of the worker.
+
+    Args:
+        request (Request): The incoming HTTP request object
+
+    Raises:
+        HTTPException: If the metrics are disabled or the token is missing or wrong
+    """
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+router = APIRouter(dependencies=[Depends(require_metrics_token)])
+
+
+@router.get("/metrics/db_pool")
+async def db_pool_metrics():
+    """
+    Exposes the usage of the database connection pools of this worker.
+
+    Returns:
+        dict: The stats of the pool used by the async routes and of the sync one used by scripts.
+    """
+    return {"async": pool_stats(async_engine.pool), "sync": pool_stats(engine.pool)}
+
+
+@router.get("/metrics/posters")
+async def poster_cache_metrics():
+    """
+    Exposes the usage of the poster cache of this worker.
+
+    Returns:
+        dict: The hits, misses and bytes used by the cache.
+    """
+    return posters.cache.stats()
+
+
+@router.get("/metrics/cache")
+async def cache_metrics():
+    """
+    Exposes the usage of the TMDB response cache of this worker.
+
+    Returns:
+        dict: The hits, misses, failed shared backend calls and local entries of every cache.
+    """
+    return {"tmdb": tmdb.client.cache.stats()}
+
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    """
+    Exposes the request, SQL, external call and template metrics of this worker, plus the connection
+    pool waits and the TMDB cache counters, in the Prometheus text format.
+
+    Returns:
+        PlainTextResponse: The metrics
+    """
+    pool_wait = ["# HELP db_pool_wait_seconds Time spent waiting for a free database connection.",
+                 "# TYPE db_pool_wait_seconds histogram"]
+    for name, pool in (("async", async_engine.pool), ("sync", engine.pool)):
+        pool_wait.extend(format_histogram("db_pool_wait_seconds", pool.wait_time, {"pool": name}))
+    lines = pool_wait + format_cache_stats({"tmdb": tmdb.client.cache})
+    return PlainTextResponse(render_prometheus() + "\n".join(lines) + "\n", media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,64 @@
+import mimetypes
+import httpx
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from fastapi.responses import FileResponse
+import posters
+from http_cache import make_etag, etag_matches
+
+
+POSTER_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+router = APIRouter()
+
+
+def poster_url(img_url: str, size: str = "w342"):
+    """
+    Builds the url of a poster served through the local cache, used by the templates.
+
+    Args:
+        img_url (str): The poster url stored in the catalog
+        size (str): The poster size
+
+    Returns:
+        str: The local poster url, or the original one if it isn't a TMDB poster
+    """
+    name = posters.poster_name(img_url)
+    if name is None:
+        return img_url
+    return f"{router.url_path_for('poster', name=name)}?size={size}"
+
+
+@router.get("/posters/{name}")
+async def poster(name: str, request: Request, size: str = Query("w500")):
+    """
+    Serves a TMDB poster from the on-disk cache, it's downloaded the first time it's requested.
+
+    TMDB gives every new poster a new file name, so the name and size in the url identify the image. It's
+    cached by the browser for a year and revalidated against them before the cache is even looked up, and
+    otherwise sent from disk as a file response.
+
+    Args:
+        name (str): The TMDB poster file name, as in the poster_path of a movie without the leading slash
+        request (Request): The incoming HTTP request object
+        size (str): The TMDB poster size
+
+    Returns:
+        FileResponse: The image, sent straight from disk
+
+    Raises:
+        HTTPException: If the poster doesn't exist or TMDB can't be reached
+    """
+    if size not in posters.POSTER_SIZES or not posters.POSTER_NAME.match(name):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Poster not found")
+    headers = {"Cache-Control": POSTER_CACHE_CONTROL, "ETag": make_etag(name, size)}
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    try:
+        path, _ = await posters.cache.get(name, size)
+    except httpx.HTTPStatusError as error:
+        if error.response.status_code == status.HTTP_404_NOT_FOUND:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Poster not found")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="The poster couldn't be downloaded")
+    except httpx.TransportError:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="The poster couldn't be downloaded")
+    return FileResponse(path, media_type=mimetypes.guess_type(name)[0] or "image/jpeg", headers=headers)
@@ -1,149 +1,502 @@
 import os
-import requests
-from fastapi import Request, Form, APIRouter, status, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse
+import json
+import hashlib
+import tmdb
+import httpx
+from fastapi import Request, Response, Form, APIRouter, status, Depends, HTTPException, UploadFile, File, Query
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from db.schemas.schemas import MovieCreate, UserCreate, User
-from sqlalchemy.orm import Session
-from db.client import engine, Base, SessionLocal
-from db.crud import get_all_movies, get_movie_by_title, delete_movie_item, get_movie_by_id, create_movie_item
-from db.crud import create_user, get_user_by_username
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from db.schemas.schemas import MovieCreate, UserCreate, User, CurrentUser
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from db.client import AsyncSessionLocal
+from db.async_crud import get_all_movies, delete_movie_item, get_movie_by_id, create_movie_item, update_movie_rankings
+from db.async_crud import NEW_MOVIE_RANKING
+from db.async_crud import get_movie_description, stream_all_movies, update_movie_item
+from db.async_crud import get_catalog_movie, find_catalog_movie, search_catalog, create_catalog_movies
+from db.async_crud import create_user, get_user_by_username, get_movies_version, get_leaderboard
+from db.async_crud import get_user_ratings, get_catalog_movies, get_owned_movie_ids, commit_movie_changes
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_login import LoginManager
-from passlib.context import CryptContext
-from exceptions import NotAuthenticatedException
+from passwords import verify_password, verify_and_update_password, get_password_hash
+from exceptions import NotAuthenticatedException, MovieAlreadyAddedException
+from cache import LRUCache
+from importer import read_rows, import_movies
+from exporter import EXPORT_MEDIA_TYPES, export_movies, gzip_chunks
+from db.search import search_movies
+from routers.posters import poster_url
+from assets import asset_url, manifest
+from http_cache import make_etag, etag_matches
+from instrumentation import InstrumentedTemplate
+from recommendations import recommender
+from autocomplete import completer
 
 
 SECRET_KEY = os.environ.get("SECRET_KEY")
-API_KEY = os.environ.get("API_KEY")
-TBD_SEARCH_API = "https://api.themoviedb.org/3/search/movie"
-TBD_GET_API = "https://api.themoviedb.org/3/movie/"
-IMAGE_PATH = "https://image.tmdb.org/t/p/w500"
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 30))
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 4096))
+MOVIES_PAGE_SIZE = int(os.environ.get("MOVIES_PAGE_SIZE", 24))
+HOME_STREAMING = os.environ.get("HOME_STREAMING", "false").lower() in ("1", "true", "yes")
+STREAM_FLUSH_BYTES = int(os.environ.get("STREAM_FLUSH_BYTES", 8192))
+STREAM_FLUSH_MARKER = "<!-- stream-flush -->"
+TEMPLATE_CACHE_DIR = os.environ.get("TEMPLATE_CACHE_DIR", "/tmp/jinja2")
+TEMPLATE_AUTO_RELOAD = os.environ.get("TEMPLATE_AUTO_RELOAD", "false").lower() in ("1", "true", "yes")
+FRAGMENT_CACHE_SIZE = int(os.environ.get("FRAGMENT_CACHE_SIZE", 10000))
+FRAGMENT_CACHE_TTL = float(os.environ.get("FRAGMENT_CACHE_TTL", 3600))
+RECOMMENDATIONS_PAGE_SIZE = int(os.environ.get("RECOMMENDATIONS_PAGE_SIZE", 20))
+PAGE_CACHE_CONTROL = "private, no-cache"
 
 
 router = APIRouter()
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
 templates = Jinja2Templates(directory="templates")
-Base.metadata.create_all(bind=engine)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# The async environment compiles different code, so its bytecode is stored apart
+templates.env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+templates.env.auto_reload = TEMPLATE_AUTO_RELOAD
+templates.env.template_class = InstrumentedTemplate
+streaming_env = templates.env.overlay(
+    enable_async=True, bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR, "__jinja2_async_%s.cache"))
 manager = LoginManager(SECRET_KEY, "/user/signin", use_cookie=True, custom_exception=NotAuthenticatedException)
+user_cache = LRUCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+fragment_cache = LRUCache(maxsize=FRAGMENT_CACHE_SIZE, ttl=FRAGMENT_CACHE_TTL)
 
 
-def get_db():
+def movie_card(movie):
+    """
+    Renders the card of a movie, reusing the last rendered card until the movie is edited or moves in the list.
+
+    The card only links to paths, not to absolute urls, so it's the same whatever host it was first rendered for.
+
+    Args:
+        movie (Movies): The movie object
+
+    Returns:
+        Markup: The rendered "movie_card.html" template
+    """
+    key = (movie.id, movie.version, movie.ranking)
+    html = fragment_cache.get(key)
+    if html is None:
+        html = Markup(templates.get_template("movie_card.html").render({"movie": movie}))
+        fragment_cache.set(key, html)
+    return html
+
+
+def precompile_templates():
+    """
+    Compiles every template for both environments when the worker starts, so the first requests don't
+    pay for it. The compiled code is shared by the workers through the bytecode cache.
+    """
+    for name in templates.env.list_templates():
+        templates.env.get_template(name)
+        streaming_env.get_template(name)
+
+
+def get_templates_version():
+    """
+    Hashes the sources of the templates and the asset manifest, so the pages are versioned by the deploy too.
+
+    Returns:
+        str: The hex digest
+    """
+    digest = hashlib.sha1(json.dumps(manifest, sort_keys=True).encode())
+    for name in sorted(templates.env.list_templates()):
+        source, _, _ = templates.env.loader.get_source(templates.env, name)
+        digest.update(source.encode())
+    return digest.hexdigest()
+
+
+templates_version = get_templates_version()
+templates.env.globals.update(stream_flush=lambda: "", poster_url=poster_url, asset_url=asset_url,
+                             movie_card=movie_card, url_path_for=router.url_path_for)
+streaming_env.globals = {**templates.env.globals, "stream_flush": lambda: Markup(STREAM_FLUSH_MARKER)}
+
+
+async def get_db():
     """
     Function to ensure the application is connected to the database.
 
     Yields:
-        db: sqlalchemy session
+        db: sqlalchemy async session
     """
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-def verify_password(plain_password, hashed_password):
+async def get_user_identity(username: str):
     """
-    Checks the user password with the hashed password in the database.
+    Search for the user in the database with its own short lived session.
 
     Args:
-        plain_password (str): User password
-        hashed_password (str): User hashed password in db
+        username (str): User's username
 
     Returns:
-        bool: Returns true if the password matches with the one in the db and false if not
+        CurrentUser: The user identity or None if the user doesn't exist
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    async with AsyncSessionLocal() as db:
+        user = await get_user_by_username(db=db, username=username)
+        return CurrentUser.from_orm(user) if user else None
 
 
-def get_password_hash(password):
+@manager.user_loader()
+async def load_user(username: str):
     """
-    Hashes the user password with passlib.
+    Resolves the user of the access token and its used to make sure the user is authenticated,
+    before it can acces some endpoints. Identities are cached for a few seconds so most requests
+    don't need a database round trip.
 
     Args:
-        password (str): user inputed password
+        username (str): User's username
 
     Returns:
-        str: hashed password
+        CurrentUser: returns the user identity
     """
-    return pwd_context.hash(password)
+    user = user_cache.get(username)
+    if user is None:
+        user = await get_user_identity(username)
+        if user is not None:
+            user_cache.set(username, user)
+    return user
 
 
-@manager.user_loader()
-def load_user(username: str, db: Session = next(get_db())):
+async def stream_template(name: str, context: dict):
     """
-    Search for the user in the database and its used to make sure the user is authenticated,
-    before it can acces some endpoints.
+    Renders a template incrementally, sending the output at every flush point of the template.
+
+    The first flush point is always sent so the browser can start loading the page, the next ones
+    are sent once at least STREAM_FLUSH_BYTES are buffered.
 
     Args:
-        username (str): User's username
-        db (Session): The database session
+        name (str): The template name
+        context (dict): The template context, async iterables can be used in for loops
+
+    Yields:
+        str: The rendered chunks
+    """
+    buffer, size, flushed = [], 0, False
+    async for chunk in streaming_env.get_template(name).generate_async(context):
+        *parts, rest = chunk.split(STREAM_FLUSH_MARKER)
+        for part in parts:
+            buffer.append(part)
+            size += len(part)
+            if not flushed or size >= STREAM_FLUSH_BYTES:
+                yield "".join(buffer)
+                buffer, size, flushed = [], 0, True
+        buffer.append(rest)
+        size += len(rest)
+    yield "".join(buffer)
+
+
+async def get_page_etag(db: AsyncSession, user_id: int, *parts):
+    """
+    Builds the weak entity tag of a page rendered from the movies of the user, without loading them.
+
+    Args:
+        db (AsyncSession): The async database session
+        user_id (int): The ID of the user
+        *parts: Anything else the page depends on, like its query parameters
+
+    Returns:
+        str: The weak entity tag
+    """
+    version = await get_movies_version(db=db, user_id=user_id)
+    return make_etag(templates_version, user_id, version, *parts, weak=True)
+
+
+def not_modified(etag: str):
+    """
+    Builds the answer to a conditional request for a page the client already has.
+
+    Args:
+        etag (str): The entity tag of the page
+
+    Returns:
+        Response: An empty 304 response
+    """
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                    headers={"ETag": etag, "Cache-Control": PAGE_CACHE_CONTROL})
+
+
+async def get_movies_page(db: AsyncSession, user_id: int, cursor: str = None, limit: int = None,
+                          load_description: bool = False):
+    """
+    Retrieve one page of the movies of the user.
+
+    Args:
+        db (AsyncSession): The async database session
+        user_id (int): The ID of the user
+        cursor (str): The "ranking:id" cursor returned with the previous page, None for the first page
+        limit (int): The page size, MOVIES_PAGE_SIZE by default
+        load_description (bool): Whether to load the description of the movies
 
     Returns:
-        user: returns a user object
+        tuple: The movies of the page and the cursor of the next page, None if it's the last one
+
+    Raises:
+        HTTPException: If the cursor is malformed
     """
-    return get_user_by_username(db=db, username=username)
+    after = None
+    if cursor:
+        try:
+            ranking, movie_id = cursor.split(":")
+            after = (int(ranking), int(movie_id))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    limit = limit or MOVIES_PAGE_SIZE
+    movies = await get_all_movies(db=db, user_id=user_id, limit=limit + 1, after=after,
+                                  load_description=load_description)
+    if len(movies) > limit:
+        last = movies[limit - 1]
+        return movies[:limit], f"{last.ranking}:{last.id}"
+    return movies, None
+
+
+async def add_movie_from_tmdb(db: AsyncSession, user_id: int, tmdb_id: int):
+    """
+    Adds a movie to the list of the user from its catalog entry, the information of the movie is
+    only requested to TMDB the first time any user adds it. Once it's saved, its rating is queued for
+    the recommendations and a new catalog entry is added to the type-ahead index.
+
+    Args:
+        db (AsyncSession): The async database session
+        user_id (int): The ID of the user
+        tmdb_id (int): The TMDB movie id
+
+    Returns:
+        Movie: The created Movie object
+
+    Raises:
+        HTTPException: If TMDB doesn't know the movie
+        MovieAlreadyAddedException: If the movie is already in the list of the user
+    """
+    catalog_movie, movie_id = await find_catalog_movie(db=db, tmdb_id=tmdb_id, user_id=user_id)
+    if movie_id is not None:
+        raise MovieAlreadyAddedException(movie_id)
+    created = None
+    if catalog_movie is None:
+        try:
+            output = await tmdb.client.get_movie(tmdb_id)
+        except httpx.HTTPStatusError as error:
+            if error.response.status_code == status.HTTP_404_NOT_FOUND:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Movie not found")
+            raise
+        created = tmdb.to_catalog_movie(output)
+        await create_catalog_movies(db=db, movies=[created])
+        catalog_movie = await get_catalog_movie(db=db, tmdb_id=tmdb_id)
+    new_record = MovieCreate(catalog_id=catalog_movie.id, rating=1.0, ranking=NEW_MOVIE_RANKING, review=" ")
+    try:
+        new_movie = await create_movie_item(db=db, movie=new_record, user_id=user_id)
+    except IntegrityError:
+        # Added at the same time by another request of the user
+        await db.rollback()
+        _, movie_id = await find_catalog_movie(db=db, tmdb_id=tmdb_id, user_id=user_id)
+        raise MovieAlreadyAddedException(movie_id)
+    await update_movie_rankings(db=db, user_id=user_id)
+    recommender.record(user_id, new_movie.catalog_id, new_movie.rating)
+    if created is not None:
+        completer.add_catalog_movies([created])
+    return new_movie
 
 
 @router.get("/", response_class=HTMLResponse)
-async def home(request: Request, user = Depends(manager), db: Session = Depends(get_db)):
+async def home(request: Request, user = Depends(manager), db: AsyncSession = Depends(get_db)):
     """
     Renders the home page.
 
+    The page is versioned with a weak ETag built from the movie list of the user, so a client sending
+    If-None-Match with the current one gets a 304 without the movies being queried.
+
+    Args:
+        request (Request): The incoming HTTP request object
+        user: Current logged user
+        db (AsyncSession): The async database session
+
+    Returns:
+        - TemplateResponse: The response containing the rendered "index.html" template with the first page of movies.
+        - StreamingResponse: The "index.html" template streamed with every movie when HOME_STREAMING is enabled.
+        - Response: An empty 304 response if the client already has the current page.
+    """
+    etag = await get_page_etag(db, user.id, HOME_STREAMING)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    headers = {"ETag": etag, "Cache-Control": PAGE_CACHE_CONTROL}
+
+    if HOME_STREAMING:
+        movies = await stream_all_movies(db=db, user_id=user.id)
+        context = {"request": request, "movies": movies, "next_cursor": None, "logged": True}
+        return StreamingResponse(stream_template("index.html", context), media_type="text/html", headers=headers)
+
+    movies, next_cursor = await get_movies_page(db=db, user_id=user.id)
+    return templates.TemplateResponse("index.html", {"request": request, "movies": movies, "next_cursor": next_cursor,
+                                                     "logged": True}, headers=headers)
+
+
+@router.get("/movies")
+async def movies_page(request: Request, after: str, user = Depends(manager), db: AsyncSession = Depends(get_db)):
+    """
+    Renders the next page of movie cards for the infinite scroll of the home page.
+
     Args:
         request (Request): The incoming HTTP request object
+        after (str): The cursor of the page
+        user: Current logged user
+        db (AsyncSession): The async database session
+
+    Returns:
+        dict: The rendered cards and the cursor of the next page
+    """
+    movies, next_cursor = await get_movies_page(db=db, user_id=user.id, cursor=after)
+    html = templates.get_template("movie_cards.html").render({"request": request, "movies": movies})
+    return {"html": html, "next_cursor": next_cursor}
+
+
+@router.get("/movies/{movie_id}/description")
+async def movie_description(movie_id: int, user = Depends(manager), db: AsyncSession = Depends(get_db)):
+    """
+    Returns the description of a movie, it's loaded when its card is expanded.
+
+    Args:
+        movie_id (int): The id of the movie
         user: Current logged user
-        db (Session): The database session
+        db (AsyncSession): The async database session
 
     Returns:
-        - TemplateResponse: The response containing the rendered "index.html" template with the movies data.
+        dict: The movie description
     """
-    all_movies = get_all_movies(db=db, user_id=user.id)
-    for movie in all_movies:
-        ranking = all_movies.index(movie) + 1
-        movie_to_edit = get_movie_by_title(db=db, movie_title=movie.title, user_id=user.id)
-        movie_to_edit.ranking = ranking
-        db.commit()
-    return templates.TemplateResponse("index.html", {"request": request, "movies": all_movies, "logged": True})
+    description = await get_movie_description(db=db, movie_id=movie_id, user_id=user.id)
+    if description is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Movie not found")
+    return {"description": description}
+
+
+@router.get("/search", response_class=HTMLResponse)
+async def search(request: Request, q: str = Query("", max_length=200), user = Depends(manager),
+                 db: AsyncSession = Depends(get_db)):
+    """
+    Renders the search page.
+
+    Args:
+        request (Request): The incoming HTTP request object
+        q (str): The searched text
+        user: Current logged user
+        db (AsyncSession): The async database session
+
+    Returns:
+        TemplateResponse: The response containing the rendered "search.html" template with the matched movies.
+        Response: An empty 304 response if the client already has the current page.
+    """
+    etag = await get_page_etag(db, user.id, "search", q)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    results = await search_movies(db=db, user_id=user.id, query=q) if q.strip() else []
+    return templates.TemplateResponse("search.html", {"request": request, "query": q, "results": results,
+                                                      "logged": True},
+                                      headers={"ETag": etag, "Cache-Control": PAGE_CACHE_CONTROL})
+
+
+@router.get("/leaderboard", response_class=HTMLResponse)
+async def leaderboard(request: Request, user = Depends(manager), db: AsyncSession = Depends(get_db)):
+    """
+    Renders the most added and the top rated movies across every user, as of the last refresh.
+    The movies the user already added link to their edit page instead of adding them again.
+
+    Args:
+        request (Request): The incoming HTTP request object
+        user: Current logged user
+        db (AsyncSession): The async database session
+
+    Returns:
+        TemplateResponse: The response containing the rendered "leaderboard.html" template.
+    """
+    boards = [("Most added", await get_leaderboard(db=db, board="most_added")),
+              ("Top rated", await get_leaderboard(db=db, board="top_rated"))]
+    owned = await get_owned_movie_ids(db=db, user_id=user.id,
+                                      tmdb_ids=[entry.catalog.tmdb_id for _, entries in boards for entry in entries])
+    return templates.TemplateResponse("leaderboard.html", {"request": request, "boards": boards, "owned": owned,
+                                                           "logged": True})
+
+
+@router.get("/recommendations", response_class=HTMLResponse)
+async def recommendations(request: Request, user = Depends(manager), db: AsyncSession = Depends(get_db)):
+    """
+    Renders the movies that users with a taste like the user's also loved.
+    The movies the user already added link to their edit page instead of adding them again.
+
+    Args:
+        request (Request): The incoming HTTP request object
+        user: Current logged user
+        db (AsyncSession): The async database session
+
+    Returns:
+        TemplateResponse: The response containing the rendered "recommendations.html" template.
+    """
+    ratings = await get_user_ratings(db=db, user_id=user.id)
+    movies = await get_catalog_movies(db=db, catalog_ids=recommender.recommend(ratings, RECOMMENDATIONS_PAGE_SIZE))
+    owned = await get_owned_movie_ids(db=db, user_id=user.id, tmdb_ids=[movie.tmdb_id for movie in movies])
+    return templates.TemplateResponse("recommendations.html", {"request": request, "movies": movies,
+                                                               "owned": owned, "rated": bool(ratings),
+                                                               "logged": True})
 
 
 @router.get("/edit/{movie_id}", response_class=HTMLResponse)
-async def edit(movie_id: int, request: Request, user = Depends(manager)):
+async def edit(movie_id: int, request: Request, db: AsyncSession = Depends(get_db), user = Depends(manager)):
     """
     Renders the edit page.
 
     Args:
         movie_id (int): The id of the movie to edit
         request (Request): The incoming HTTP request object
+        db (AsyncSession): The async database session
         user : current logged user
 
     Returns:
-        - TemplateResponse: The response containing the rendered "edit.html" template.
+        - TemplateResponse: The response containing the rendered "edit.html" template with the current movie.
     """
-    return templates.TemplateResponse("edit.html", {"request": request})
+    movie = await get_movie_by_id(db=db, movie_id=movie_id, user_id=user.id)
+    if movie is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Movie not found")
+    return templates.TemplateResponse("edit.html", {"request": request, "movie": movie})
 
 
 @router.post("/edit/{movie_id}", response_class=HTMLResponse)
-async def edit_form(movie_id: int, request: Request, db: Session = Depends(get_db),
-                    rating: float = Form(...), review: str = Form(...), user = Depends(manager)):
+async def edit_form(movie_id: int, request: Request, db: AsyncSession = Depends(get_db),
+                    rating: float = Form(...), review: str = Form(...), version: int = Form(...),
+                    user = Depends(manager)):
     """
     Handles the form submission in the edit page.
 
+    The change is only saved if the movie wasn't changed since the page was rendered, otherwise the
+    page is rendered again with the current movie so the user can decide. The rankings are only
+    recomputed when the rating changed.
+
     Args:
         movie_id (int): The id of the movie to edit
         request (Request): The incoming HTTP request object
-        db (Session): The database session
+        db (AsyncSession): The async database session
         rating (float): The rating submitted in the form
         review (str): The review submitted in the form
+        version (int): The version of the movie when the page was rendered
         user: Current logged user
 
     Returns:
         - RedirectResponse: A redirect response to the home page.
-    """
-    movie_to_update = get_movie_by_id(db=db, movie_id=movie_id, user_id=user.id)
-    movie_to_update.rating = rating
-    movie_to_update.review = review
-    db.commit()
+        - TemplateResponse: The "edit.html" template with a conflict error if the movie changed in the meantime.
+    """
+    updated = await update_movie_item(db=db, movie_id=movie_id, user_id=user.id, version=version,
+                                      values={"rating": rating, "review": review})
+    if updated is None:
+        movie = await get_movie_by_id(db=db, movie_id=movie_id, user_id=user.id)
+        if movie is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Movie not found")
+        return templates.TemplateResponse("edit.html", {"request": request, "movie": movie, "conflict": True},
+                                          status_code=status.HTTP_409_CONFLICT)
+    catalog_id, previous_rating = updated
+    if rating != previous_rating:
+        await update_movie_rankings(db=db, user_id=user.id)
+        recommender.record(user.id, catalog_id, rating)
+    else:
+        await commit_movie_changes(db=db, user_id=user.id)
     return RedirectResponse(router.url_path_for("home"), status_code=status.HTTP_303_SEE_OTHER)
 
 
@@ -163,72 +516,127 @@ async def add(request: Request, user = Depends(manager)):
     
 
 @router.post("/add", response_class=HTMLResponse)
-async def add_form(request: Request, movie_title: str = Form(...), user = Depends(manager)):
+async def add_form(request: Request, movie_title: str = Form(...), source: str = Form("catalog"),
+                   db: AsyncSession = Depends(get_db), user = Depends(manager)):
     """
     Handles the form submission in the add page.
 
+    The movies already in the catalog are offered first, TMDB is only searched when none matches or
+    when the user asks for it.
+
     Args:
         request (Request): The incoming HTTP request object
         movie_title (str): The movie title submitted in the form
+        source (str): "catalog" to search the catalog first or "tmdb" to search TMDB directly
+        db (AsyncSession): The async database session
         user : Current user logged
 
     Returns:
         TemplateResponse: The response containing the rendered "select.html" template with the matched movie data.
     """
-    response = requests.get(TBD_SEARCH_API, params={"api_key": API_KEY, "query": movie_title})
-    output = response.json()
-    data = output["results"]
+    if source != "tmdb":
+        matched = await search_catalog(db=db, title=movie_title)
+        if matched:
+            data = [{"id": movie.tmdb_id, "title": movie.title, "release_date": movie.year} for movie in matched]
+            return templates.TemplateResponse("select.html", {"request": request, "matched_movies": data,
+                                                              "movie_title": movie_title, "from_catalog": True,
+                                                              "logged": True})
+    data = await tmdb.client.search_movies(movie_title)
+    completer.add_tmdb_results(data)
     return templates.TemplateResponse("select.html", {"request": request, "matched_movies": data, "logged": True})
 
 
 @router.get("/delete/{movie_id}", response_class=HTMLResponse)
-async def delete(movie_id: int, db: Session = Depends(get_db), user = Depends(manager)):
+async def delete(movie_id: int, db: AsyncSession = Depends(get_db), user = Depends(manager)):
     """
     Deletes the movie selected by te user.
 
     Args:
         movie_id (int): The id of the movie to delete
-        db (Session): The database session
+        db (AsyncSession): The async database session
         user: Current logged user
 
     Returns:
         RedirectResponse: A redirect response to the home page.
     """
-    delete_movie_item(db=db, movie_id=movie_id, user_id=user.id)
+    catalog_id = await delete_movie_item(db=db, movie_id=movie_id, user_id=user.id)
+    await update_movie_rankings(db=db, user_id=user.id)
+    if catalog_id is not None:
+        recommender.record(user.id, catalog_id, None)
     return RedirectResponse(router.url_path_for("home"), status_code=status.HTTP_303_SEE_OTHER)
 
 
 @router.get("/get_movie_data/{movie_id}", response_class=HTMLResponse)
-async def get_movie_data(movie_id: int, request: Request, db: Session = Depends(get_db), user = Depends(manager)):
+async def get_movie_data(movie_id: int, request: Request, db: AsyncSession = Depends(get_db), user = Depends(manager)):
     """
     Gets all the information of the movie and adds it to the database.
 
     Args:
         movie_id (int): The movie id
         request (Request): The incoming HTTP request object
-        db (Session): The database session
+        db (AsyncSession): The async database session
         user: Current user logged
 
     Returns:
-        RedirectResponse: A redirect response to the edit page.
-    """
-    movie_api_url = f"{TBD_GET_API}/{movie_id}"
-    response = requests.get(movie_api_url, params={"api_key": API_KEY, "language": "en-US"})
-    output = response.json()
-    new_record = MovieCreate(title=output["original_title"],
-                             description=output["overview"],
-                             year=output["release_date"].split("-")[0],
-                             img_url=f"{IMAGE_PATH}{output['poster_path']}",
-                             rating=1.0,
-                             ranking=1,
-                             review=" ")
-    create_movie_item(db=db, movie=new_record, user_id=user.id)
-    get_movie = get_movie_by_title(db=db, movie_title=output["original_title"], user_id=user.id)
-    get_id = get_movie.id
-    return RedirectResponse(router.url_path_for("edit_form", movie_id=get_id), 
+        RedirectResponse: A redirect response to the edit page of the movie, of the one already in the
+        list if the user had added it.
+    """
+    try:
+        new_movie_id = (await add_movie_from_tmdb(db=db, user_id=user.id, tmdb_id=movie_id)).id
+    except MovieAlreadyAddedException as error:
+        new_movie_id = error.movie_id
+    return RedirectResponse(router.url_path_for("edit_form", movie_id=new_movie_id), 
                             status_code=status.HTTP_303_SEE_OTHER)
 
 
+@router.post("/import")
+async def import_form(request: Request, file: UploadFile = File(...), db: AsyncSession = Depends(get_db),
+                      user = Depends(manager)):
+    """
+    Imports a movie list exported as CSV, JSON, NDJSON or from Letterboxd.
+
+    Args:
+        request (Request): The incoming HTTP request object
+        file (UploadFile): The uploaded list
+        db (AsyncSession): The async database session
+        user: Current user logged
+
+    Returns:
+        The import report with the status of every row, as the rendered "import.html" template for the
+        browsers that posted the form of the add page, or as JSON
+    """
+    report = await import_movies(db=db, user_id=user.id, rows=read_rows(file.file, file.filename))
+    if "text/html" in request.headers.get("accept", ""):
+        return templates.TemplateResponse("import.html", {"request": request, "report": report, "logged": True})
+    return report
+
+
+@router.get("/export")
+async def export(request: Request, export_format: str = Query("csv", alias="format"),
+                 db: AsyncSession = Depends(get_db), user = Depends(manager)):
+    """
+    Exports the movies of the user ordered by ranking, streamed straight from the database.
+
+    Args:
+        request (Request): The incoming HTTP request object
+        export_format (str): The file format, "csv" or "ndjson"
+        db (AsyncSession): The async database session
+        user: Current user logged
+
+    Returns:
+        StreamingResponse: The exported file, gzip encoded when the client accepts it
+    """
+    if export_format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported export format")
+    movies = await stream_all_movies(db=db, user_id=user.id, load_description=True)
+    body = export_movies(movies, export_format)
+    headers = {"Content-Disposition": f'attachment; filename="movies.{export_format}"', "Vary": "Accept-Encoding"}
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type=EXPORT_MEDIA_TYPES[export_format], headers=headers)
+
+
 @router.get("/user/signup", response_class=HTMLResponse)
 async def register(request: Request):
     """
@@ -244,14 +652,14 @@ async def register(request: Request):
 
 
 @router.post("/user/signup", response_class=HTMLResponse)
-async def register_form(request: Request, db: Session = Depends(get_db),  
+async def register_form(request: Request, db: AsyncSession = Depends(get_db),  
                         username: str = Form(...), email: str = Form(...), password: str = Form(...)):
     """
     Handles the form submission in the signup page.
 
     Args:
         request (Request): The incoming HTTP request object
-        db (Session): The database session
+        db (AsyncSession): The async database session
         username (str): The username submitted in the form
         email (str): The email submitted in the form
         password (str): The password submitted in the form
@@ -260,12 +668,12 @@ async def register_form(request: Request, db: Session = Depends(get_db),
         TemplateResponse: To the login if the user already exists
         RedirectResponse: A redirect response to the login page
     """
-    db_user = get_user_by_username(db=db, username=username)
+    db_user = await get_user_by_username(db=db, username=username)
     if db_user:
         return templates.TemplateResponse("login.html", {"request": request, "exists": True})
 
-    new_user = UserCreate(username=username, email=email, password=get_password_hash(password))
-    success = create_user(db=db, user=new_user)
+    new_user = UserCreate(username=username, email=email, password=await get_password_hash(password))
+    success = await create_user(db=db, user=new_user)
 
     if success:
         return RedirectResponse(router.url_path_for("login"), status_code=status.HTTP_303_SEE_OTHER)
@@ -286,13 +694,13 @@ async def login(request: Request):
 
 
 @router.post("/user/signin", response_class=HTMLResponse)
-async def login_form(request: Request, db: Session = Depends(get_db), data: OAuth2PasswordRequestForm = Depends()):
+async def login_form(request: Request, db: AsyncSession = Depends(get_db), data: OAuth2PasswordRequestForm = Depends()):
     """
     Handles the form submission in the signin page.
 
     Args:
         request (Request):  The incoming HTTP request object
-        db (Session): The database session
+        db (AsyncSession): The async database session
         data (OAuth2PasswordRequestForm): The Oauth2 authentication form
 
     Returns:
@@ -300,10 +708,13 @@ async def login_form(request: Request, db: Session = Depends(get_db), data: OAut
         TemplateResponse: If the user password is incorrect returns the "login.html" rendered template with an error.
         TemplateResponse: If the user don't exist returns the "register.html" rendered template with an error.
     """
-    user = get_user_by_username(db=db, username=data.username)
+    user = await get_user_by_username(db=db, username=data.username)
     if user:
-        is_password_correct = verify_password(data.password, user.password)
+        is_password_correct, new_hash = await verify_and_update_password(data.password, user.password)
         if is_password_correct:
+            if new_hash:
+                user.password = new_hash
+                await db.commit()
             token = manager.create_access_token(data={'sub': data.username})
             response = RedirectResponse(router.url_path_for("home"), status_code=status.HTTP_303_SEE_OTHER)
             manager.set_cookie(response, token)
@@ -346,7 +757,7 @@ async def forgot_password(request: Request):
 
 
 @router.post("/forgot_password", response_class=HTMLResponse)
-async def forgot_password_form(request: Request, db: Session = Depends(get_db),
+async def forgot_password_form(request: Request, db: AsyncSession = Depends(get_db),
                                username: str = Form(...), old_password: str = Form(...),
                                new_password: str = Form(...), confirm_password: str = Form(...)):
     """
@@ -354,7 +765,7 @@ async def forgot_password_form(request: Request, db: Session = Depends(get_db),
 
     Args:
         request (Request): The incoming HTTP request object
-        db (Session): The database session
+        db (AsyncSession): The async database session
         username (str): The username submitted in the form
         old_password (str):The old_password submitted in the form
         new_password (str): The new_password submitted in the form
@@ -365,12 +776,13 @@ async def forgot_password_form(request: Request, db: Session = Depends(get_db),
         TemplateResponse: If the old password doesn't match the one in the db renders the forgot_password with an error
         TemplateResponse: If the new password doesn't match the confirmation renders the forgot_password with an error
     """
-    user = get_user_by_username(db=db, username=username)
-    if verify_password(old_password, user.password):
+    user = await get_user_by_username(db=db, username=username)
+    if await verify_password(old_password, user.password):
         if new_password == confirm_password:
-            new_pass = get_password_hash(new_password)
+            new_pass = await get_password_hash(new_password)
             user.password = new_pass
-            db.commit()
+            await db.commit()
+            user_cache.delete(username)
             return RedirectResponse(router.url_path_for("login"), status_code=status.HTTP_303_SEE_OTHER)
         else:
             return templates.TemplateResponse("forgot_password.html", {"request": request,
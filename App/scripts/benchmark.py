@@ -0,0 +1,384 @@
+"""
+Benchmarks the hot endpoints of the app against a local stub of TMDB.
+
+A fresh database is seeded with synthetic users owning 10, 1k and 10k movies, then every scenario
+sends concurrent requests to the app in process and reports the p50/p95/p99 latency, the throughput
+and the database queries per request, plus the peak RSS of the run. With --baseline the run fails
+if a scenario runs more queries, fails requests or got slower relative to the other requests of the
+same run than the baseline allows. The baseline only keeps what doesn't depend on the machine: the
+queries per request and the p50 latency of every scenario as a ratio of the REFERENCE_SCENARIO one.
+
+Usage, from the App directory:
+    python -m scripts.benchmark [--baseline scripts/benchmark_baseline.json] [--save-baseline <file>]
+
+The database is BENCH_DATABASE_URL, a sqlite file in /tmp by default. It's dropped on every run, so
+never point it to a database you want to keep.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import resource
+import itertools
+import statistics
+import contextvars
+import subprocess
+from dataclasses import dataclass
+from typing import Callable
+
+
+BENCH_DATABASE_URL = os.environ.get("BENCH_DATABASE_URL", "sqlite:////tmp/mytopmovies-bench.db")
+BENCH_PASSWORD = "benchmark"
+SCALES = (10, 1000, 10000)
+# The add form searching TMDB runs no query and gets its results from the cache of the stub responses,
+# so it measures the fixed cost of a request on the machine
+REFERENCE_SCENARIO = "add_form_tmdb"
+TOLERANCE = 1.0
+
+request_queries = contextvars.ContextVar("request_queries", default=None)
+
+
+@dataclass
+class Scenario:
+    """
+    Requests sent to one endpoint during the benchmark.
+
+    Attributes:
+        name (str): The scenario name, used as its key in the results and the baseline.
+        username (str): The user the requests are sent as, None for anonymous requests.
+        request (Callable): Builds the method, url and keyword arguments of the request number i.
+
+    """
+    name: str
+    username: str
+    request: Callable
+
+
+def scenarios(scales: tuple):
+    """
+    Lists the benchmarked scenarios.
+
+    Args:
+        scales (tuple): The number of movies of every seeded user
+
+    Returns:
+        list: The scenarios
+    """
+    homes = [Scenario(f"home_{scale}", f"bench_{scale}", lambda i: ("GET", "/", {})) for scale in scales]
+    return homes + [
+        Scenario("login_form", None, lambda i: ("POST", "/user/signin",
+                                                {"data": {"username": f"bench_{scales[0]}", "password": BENCH_PASSWORD}})),
+        Scenario("add_form_catalog", f"bench_{scales[0]}",
+                 lambda i: ("POST", "/add", {"data": {"movie_title": f"Benchmark Movie {i % 100 + 1}"}})),
+        Scenario("add_form_tmdb", f"bench_{scales[0]}",
+                 lambda i: ("POST", "/add", {"data": {"movie_title": f"query {i % 100}", "source": "tmdb"}})),
+        Scenario("get_movie_data_catalog", "bench_add", lambda i: ("GET", f"/get_movie_data/{i + 1}", {})),
+        Scenario("get_movie_data_tmdb", "bench_add", lambda i: ("GET", f"/get_movie_data/{2_000_000 + i}", {})),
+    ]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub_tmdb(port: int):
+    """
+    Starts the stub TMDB server in its own process and waits until it accepts connections.
+
+    Args:
+        port (int): The port to listen on
+
+    Returns:
+        subprocess.Popen: The server process
+    """
+    process = subprocess.Popen([sys.executable, "-m", "scripts.stub_tmdb", "--port", str(port)],
+                               stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("The stub TMDB server didn't start")
+
+
+def reset_database():
+    """
+    Drops every table of the benchmark database and migrates it again.
+    """
+    from sqlalchemy import MetaData
+    from alembic import command
+    from alembic.config import Config
+    from db.client import engine
+
+    metadata = MetaData()
+    metadata.reflect(engine)
+    metadata.drop_all(engine)
+    command.upgrade(Config("alembic.ini"), "head")
+
+
+async def seed_database(scales: tuple, catalog_size: int):
+    """
+    Adds the synthetic catalog, the users and their movie lists.
+
+    Args:
+        scales (tuple): The number of movies of every seeded user
+        catalog_size (int): The number of catalog entries, the TMDB ids go from 1 to catalog_size
+    """
+    from sqlalchemy import insert
+    import tmdb
+    from db.async_crud import get_user_by_username, update_movie_rankings
+    from db.client import AsyncSessionLocal
+    from db.models.models import Catalog, Movies, Users
+    from passwords import pwd_context
+    from scripts.stub_tmdb import stub_movie
+
+    password = pwd_context.hash(BENCH_PASSWORD)
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(Catalog), [tmdb.to_catalog_movie(stub_movie(tmdb_id)).dict()
+                                           for tmdb_id in range(1, catalog_size + 1)])
+        for username in [f"bench_{scale}" for scale in scales] + ["bench_add"]:
+            db.add(Users(username=username, email=f"{username}@example.com", password=password))
+        await db.commit()
+        for scale in scales:
+            user = await get_user_by_username(db=db, username=f"bench_{scale}")
+            await db.execute(insert(Movies), [{"catalog_id": catalog_id,
+                                               "rating": round(1 + catalog_id * 7919 % 900 / 100, 1),
+                                               "ranking": 0,
+                                               "review": f"Review of the movie {catalog_id}",
+                                               "owner_id": user.id} for catalog_id in range(1, scale + 1)])
+            await update_movie_rankings(db=db, user_id=user.id)
+
+
+def count_queries(conn, cursor, statement, parameters, context, executemany):
+    queries = request_queries.get()
+    if queries is not None:
+        queries[0] += 1
+
+
+async def login(client, username: str):
+    """
+    Signs in a seeded user.
+
+    Args:
+        client (httpx.AsyncClient): The client bound to the app
+        username (str): The user to sign in
+
+    Returns:
+        httpx.Cookies: The session cookies
+    """
+    response = await client.post("/user/signin", data={"username": username, "password": BENCH_PASSWORD})
+    if response.status_code != 303:
+        raise RuntimeError(f"Couldn't sign in as {username}")
+    return response.cookies
+
+
+async def run_scenario(client, scenario: Scenario, cookies, requests: int, concurrency: int, warmup: int,
+                       first: int = 0):
+    """
+    Sends the requests of a scenario from concurrent workers and measures them.
+
+    Args:
+        client (httpx.AsyncClient): The client bound to the app
+        scenario (Scenario): The scenario to run
+        cookies (httpx.Cookies): The session cookies of its user, None for anonymous requests
+        requests (int): The number of measured requests
+        concurrency (int): The number of requests in flight at the same time
+        warmup (int): The number of requests sent before measuring, to fill the caches
+        first (int): The number of the first request, so repeated runs send different requests
+
+    Returns:
+        dict: The latency percentiles in milliseconds, the throughput, the queries per request and the errors
+    """
+    numbers = itertools.count(first)
+    latencies, queries, errors = [], [], 0
+
+    async def send(number: int):
+        method, url, kwargs = scenario.request(number)
+        counter = [0]
+        token = request_queries.set(counter)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, cookies=cookies, **kwargs)
+        finally:
+            request_queries.reset(token)
+        return time.perf_counter() - start, counter[0], response.status_code < 400
+
+    for _ in range(warmup):
+        await send(next(numbers))
+
+    async def worker():
+        nonlocal errors
+        while (number := next(numbers)) < first + warmup + requests:
+            latency, query_count, ok = await send(number)
+            latencies.append(latency)
+            queries.append(query_count)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50_ms": round(percentiles[49] * 1000, 2),
+            "p95_ms": round(percentiles[94] * 1000, 2),
+            "p99_ms": round(percentiles[98] * 1000, 2),
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "queries_per_request": round(statistics.mean(queries), 2),
+            "errors": errors}
+
+
+def median_result(runs: list):
+    """
+    Merges the repeated runs of a scenario.
+
+    Args:
+        runs (list): The results of every run
+
+    Returns:
+        dict: The median of every metric, and the errors of all the runs
+    """
+    result = {metric: statistics.median(run[metric] for run in runs) for metric in runs[0]}
+    result["errors"] = sum(run["errors"] for run in runs)
+    return result
+
+
+def relative_results(results: dict):
+    """
+    Keeps the results of a run that don't depend on the machine, to be saved as a baseline.
+
+    Args:
+        results (dict): The results of the run
+
+    Returns:
+        dict: The queries per request and the p50 latency ratio to the reference scenario of every scenario
+    """
+    reference = results["scenarios"][REFERENCE_SCENARIO]["p50_ms"]
+    return {"reference": REFERENCE_SCENARIO,
+            "scenarios": {name: {"queries_per_request": result["queries_per_request"],
+                                 "p50_ratio": round(result["p50_ms"] / reference, 2)}
+                          for name, result in results["scenarios"].items()}}
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """
+    Compares a run with the baseline.
+
+    The queries per request can't grow at all and no request may fail. The p50 latency ratio to the
+    reference scenario may grow up to the tolerance, the absolute latencies and the memory depend on the
+    machine and are only reported.
+
+    Args:
+        results (dict): The results of the run
+        baseline (dict): The relative results of the baseline run
+        tolerance (float): The allowed relative growth of the latency ratios
+
+    Returns:
+        list: The regressions found, empty if there aren't any
+    """
+    regressions = []
+    relative = relative_results(results)["scenarios"]
+    for name, result in results["scenarios"].items():
+        if result["errors"]:
+            regressions.append(f"{name}: {result['errors']} requests failed")
+        expected = baseline["scenarios"].get(name)
+        if expected is None:
+            continue
+        if result["queries_per_request"] > expected["queries_per_request"]:
+            regressions.append(f"{name}: queries_per_request {result['queries_per_request']} > "
+                               f"{expected['queries_per_request']}")
+        if relative[name]["p50_ratio"] > expected["p50_ratio"] * (1 + tolerance):
+            regressions.append(f"{name}: p50_ratio {relative[name]['p50_ratio']} > {expected['p50_ratio']}")
+    return regressions
+
+
+async def benchmark(args, scales: tuple):
+    """
+    Seeds the database and runs every scenario against the app.
+
+    Args:
+        args (argparse.Namespace): The command line arguments
+        scales (tuple): The number of movies of every seeded user
+
+    Returns:
+        dict: The results of every scenario and the peak RSS
+    """
+    import httpx
+    from sqlalchemy import event
+    import main
+    from db.client import engine, async_engine
+
+    reset_database()
+    requests_per_scenario = args.repeat * (args.warmup + args.requests)
+    await seed_database(scales, max(max(scales), requests_per_scenario))
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_queries)
+    event.listen(engine, "before_cursor_execute", count_queries)
+
+    await main.startup()
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            sessions = {}
+            for scenario in scenarios(scales):
+                if scenario.username is not None and scenario.username not in sessions:
+                    sessions[scenario.username] = await login(client, scenario.username)
+                runs = [await run_scenario(client, scenario, sessions.get(scenario.username), args.requests,
+                                           args.concurrency, args.warmup, first=repeat * (args.warmup + args.requests))
+                        for repeat in range(args.repeat)]
+                results[scenario.name] = median_result(runs)
+                print(f"{scenario.name}\t{json.dumps(results[scenario.name])}", file=sys.stderr)
+    finally:
+        await main.shutdown()
+    return {"scenarios": results,
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot endpoints of the app")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight at the same time")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of every scenario, the median is reported")
+    parser.add_argument("--warmup", type=int, default=10, help="Requests sent before measuring every scenario")
+    parser.add_argument("--scales", default=",".join(map(str, SCALES)), help="Comma separated movies per user")
+    parser.add_argument("--baseline", help="Fail if the run regressed compared to this results file")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed growth of the latency ratios")
+    parser.add_argument("--save-baseline", help="Write the relative results to this file")
+    args = parser.parse_args()
+    scales = tuple(int(scale) for scale in args.scales.split(","))
+
+    port = free_port()
+    stub = start_stub_tmdb(port)
+    os.environ.update(DATABASE_URL=BENCH_DATABASE_URL,
+                      TMDB_API_URL=f"http://127.0.0.1:{port}",
+                      TMDB_IMAGE_URL=f"http://127.0.0.1:{port}/t/p")
+    os.environ.setdefault("API_KEY", "benchmark")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    # Identities are looked up again when their cache entry expires, the queries per request would then
+    # depend on how long the run takes
+    os.environ.setdefault("USER_CACHE_TTL", "86400")
+    try:
+        results = asyncio.run(benchmark(args, scales))
+    finally:
+        stub.terminate()
+
+    print(json.dumps(results, indent=2))
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            json.dump(relative_results(results), file, indent=2)
+            file.write("\n")
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"FAIL\t{regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
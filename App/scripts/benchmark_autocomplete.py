@@ -0,0 +1,99 @@
+"""
+Benchmarks the type-ahead titles index on synthetic titles, without a database.
+
+The titles are made of a few words picked from a vocabulary of made up words, the most added ones
+first. The run reports the build time, the peak RSS, the latency of completing prefixes of the titles
+as if they were being typed, alone and between additions of new titles, the latency of those additions
+and the time of the compaction merging them, which runs in the background.
+
+Usage, from the App directory:
+    python -m scripts.benchmark_autocomplete [--titles 50000] [--samples 10000]
+"""
+import json
+import time
+import random
+import argparse
+import resource
+import statistics
+from autocomplete import Title, TitleIndex, compact_titles, AUTOCOMPLETE_MAX_TITLES
+
+
+VOCABULARY = 5000
+SYLLABLES = ("ka", "lo", "mi", "ne", "ro", "sa", "tu", "vi", "dre", "gon", "star", "the", "war", "an", "el", "or")
+
+
+def synthetic_titles(count: int, seed: int = 0):
+    """
+    Generates titles of one to five made up words, the most added first.
+
+    Args:
+        count (int): The number of titles
+        seed (int): The random seed, so runs are comparable
+
+    Returns:
+        list: The Title objects
+    """
+    rng = random.Random(seed)
+    words = ["".join(rng.choices(SYLLABLES, k=rng.randint(1, 4))) for _ in range(VOCABULARY)]
+    return [Title(tmdb_id=tmdb_id, title=" ".join(rng.choices(words, k=rng.randint(1, 5))).title(),
+                  year=rng.randint(1920, 2023), users=int(count / tmdb_id), popularity=rng.random() * 100)
+            for tmdb_id in range(1, count + 1)]
+
+
+def typed_prefix(rng: random.Random, title: Title):
+    return title.title[:rng.randint(1, len(title.title))]
+
+
+def percentile_ms(latencies: list, percentile: int):
+    return round(statistics.quantiles(latencies, n=100, method="inclusive")[percentile - 1] * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the type-ahead titles index")
+    parser.add_argument("--titles", type=int, default=AUTOCOMPLETE_MAX_TITLES)
+    parser.add_argument("--samples", type=int, default=10000, help="Typed prefixes whose completion is timed")
+    parser.add_argument("--inserts", type=int, default=1000, help="New titles whose addition is timed")
+    args = parser.parse_args()
+
+    titles = synthetic_titles(args.titles + args.inserts)
+    start = time.perf_counter()
+    index = TitleIndex.build(titles[:args.titles], max_titles=args.titles + args.inserts)
+    build_seconds = time.perf_counter() - start
+
+    rng = random.Random(1)
+    latencies = []
+    for title in rng.choices(titles[:args.titles], k=args.samples):
+        typed = typed_prefix(rng, title)
+        start = time.perf_counter()
+        index.search(typed, 8)
+        latencies.append(time.perf_counter() - start)
+
+    insert_latencies, mixed_latencies = [], []
+    searched = rng.choices(titles, k=args.samples)
+    for number, title in enumerate(titles[args.titles:]):
+        start = time.perf_counter()
+        index.add(title)
+        insert_latencies.append(time.perf_counter() - start)
+        for typed in (typed_prefix(rng, other) for other in searched[number::args.inserts]):
+            start = time.perf_counter()
+            index.search(typed, 8)
+            mixed_latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    compacted = compact_titles(list(index.titles.values()), index.max_titles)
+    compact_seconds = time.perf_counter() - start
+
+    print(json.dumps({"titles": len(compacted), "keys": len(compacted._keys),
+                      "build_seconds": round(build_seconds, 2),
+                      "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                      "search_p50_ms": percentile_ms(latencies, 50),
+                      "search_p95_ms": percentile_ms(latencies, 95),
+                      "search_p99_ms": percentile_ms(latencies, 99),
+                      "search_while_adding_p99_ms": percentile_ms(mixed_latencies, 99),
+                      "add_p50_ms": percentile_ms(insert_latencies, 50),
+                      "add_p99_ms": percentile_ms(insert_latencies, 99),
+                      "compact_seconds": round(compact_seconds, 2)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmarks the recommendations model on synthetic ratings, without a database.
+
+Every user likes the movies of one of a few genres more than the rest and rates a number of movies
+picked by popularity. The model is built from those ratings, then the run reports the build time, the
+model size, the peak RSS, the latency of the recommendations of single users and of an incremental
+update.
+
+Usage, from the App directory:
+    python -m scripts.benchmark_recommendations [--users 100000] [--movies 20000] [--ratings 50]
+"""
+import json
+import time
+import argparse
+import resource
+import statistics
+import numpy as np
+from recommendations import build_model, RECOMMENDATIONS_NEIGHBORS, RECOMMENDATIONS_MEMORY_MB
+
+
+GENRES = 20
+
+
+def synthetic_ratings(users: int, movies: int, ratings_per_user: int, seed: int = 0):
+    """
+    Generates the ratings of users that prefer one genre, picking popular movies more often.
+
+    Args:
+        users (int): The number of users
+        movies (int): The number of movies
+        ratings_per_user (int): The average number of movies rated by every user
+        seed (int): The random seed, so runs are comparable
+
+    Returns:
+        tuple: The user IDs, catalog IDs and ratings, as arrays
+    """
+    rng = np.random.default_rng(seed)
+    counts = np.clip(rng.poisson(ratings_per_user, users), 1, movies)
+    user_ids = np.repeat(np.arange(1, users + 1), counts)
+    popularity = 1 / np.arange(1, movies + 1) ** 0.8
+    item_ids = rng.choice(movies, size=len(user_ids), p=popularity / popularity.sum()) + 1
+    pairs = np.unique(user_ids * (movies + 1) + item_ids)
+    user_ids, item_ids = pairs // (movies + 1), pairs % (movies + 1)
+
+    user_genres = rng.integers(0, GENRES, users + 1)
+    movie_genres = rng.integers(0, GENRES, movies + 1)
+    liked = user_genres[user_ids] == movie_genres[item_ids]
+    ratings = np.clip(np.where(liked, 8, 5) + rng.normal(0, 1.5, len(user_ids)), 1, 10).round(1)
+    return user_ids, item_ids, ratings.astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommendations model")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--movies", type=int, default=20000)
+    parser.add_argument("--ratings", type=int, default=50, help="Average ratings per user")
+    parser.add_argument("--neighbors", type=int, default=RECOMMENDATIONS_NEIGHBORS)
+    parser.add_argument("--memory-mb", type=float, default=RECOMMENDATIONS_MEMORY_MB)
+    parser.add_argument("--samples", type=int, default=1000, help="Users whose recommendations are timed")
+    parser.add_argument("--changes", type=int, default=100, help="Ratings changed by the incremental update")
+    args = parser.parse_args()
+
+    user_ids, item_ids, ratings = synthetic_ratings(args.users, args.movies, args.ratings)
+    start = time.perf_counter()
+    model = build_model(user_ids, item_ids, ratings, k=args.neighbors, memory_bytes=int(args.memory_mb * 2 ** 20))
+    build_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(1)
+    boundaries = np.searchsorted(user_ids, np.arange(1, args.users + 2))
+    latencies = []
+    for user_id in rng.choice(args.users, args.samples, replace=False) + 1:
+        rows = slice(boundaries[user_id - 1], boundaries[user_id])
+        user_ratings = dict(zip(item_ids[rows].tolist(), ratings[rows].tolist()))
+        start = time.perf_counter()
+        model.recommend(user_ratings, 20)
+        latencies.append(time.perf_counter() - start)
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+
+    changes = {(int(user_id), int(item_id)): float(rng.integers(1, 11))
+               for user_id, item_id in zip(rng.integers(1, args.users + 1, args.changes),
+                                           rng.integers(1, args.movies + 1, args.changes))}
+    start = time.perf_counter()
+    model.updated(changes)
+    update_seconds = time.perf_counter() - start
+
+    print(json.dumps({"users": len(model.user_ids), "movies": len(model.item_ids), "ratings": model.ratings.nnz,
+                      "build_seconds": round(build_seconds, 2),
+                      "model_mb": round(model.nbytes / 2 ** 20, 1),
+                      "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                      "recommend_p50_ms": round(percentiles[49] * 1000, 3),
+                      "recommend_p95_ms": round(percentiles[94] * 1000, 3),
+                      "recommend_p99_ms": round(percentiles[98] * 1000, 3),
+                      "update_seconds": round(update_seconds, 2)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Builds the static assets: downloads the third party assets under static/vendor, copies every asset to
+static/dist with the hash of its content in the name, precompresses them with gzip and brotli and
+writes the manifest used by the asset_url template helper.
+
+Usage, from the App directory:
+    python -m scripts.build_assets
+"""
+import os
+import gzip
+import json
+import shutil
+import hashlib
+import brotli
+import httpx
+from assets import STATIC_DIR, DIST_DIR, MANIFEST_PATH, VENDOR_ASSETS
+
+
+COMPRESSED_EXTENSIONS = (".css", ".js", ".svg", ".json", ".txt")
+
+
+def vendor_assets():
+    """
+    Downloads the third party assets that aren't in static/vendor yet.
+    """
+    with httpx.Client(timeout=30, follow_redirects=True) as client:
+        for path, url in VENDOR_ASSETS.items():
+            target = os.path.join(STATIC_DIR, path)
+            if os.path.exists(target):
+                continue
+            response = client.get(url)
+            response.raise_for_status()
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as file:
+                file.write(response.content)
+            print(f"vendored\t{path}")
+
+
+def source_files():
+    """
+    Lists the assets to build.
+
+    Yields:
+        str: The path of every file under the static directory, except the built ones
+    """
+    for root, directories, files in os.walk(STATIC_DIR):
+        if root == STATIC_DIR:
+            directories[:] = [directory for directory in directories if directory != DIST_DIR]
+        for file in sorted(files):
+            yield os.path.relpath(os.path.join(root, file), STATIC_DIR).replace(os.sep, "/")
+
+
+def build_asset(path: str):
+    """
+    Copies an asset to the dist directory with its content hash in the name, plus its compressed variants.
+
+    Args:
+        path (str): The asset path relative to the static directory
+
+    Returns:
+        str: The fingerprinted path relative to the static directory
+    """
+    with open(os.path.join(STATIC_DIR, path), "rb") as file:
+        content = file.read()
+    name, extension = os.path.splitext(path)
+    fingerprinted = f"{DIST_DIR}/{name}.{hashlib.sha256(content).hexdigest()[:12]}{extension}"
+    target = os.path.join(STATIC_DIR, fingerprinted)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, "wb") as file:
+        file.write(content)
+    if extension in COMPRESSED_EXTENSIONS:
+        with open(target + ".gz", "wb") as file:
+            file.write(gzip.compress(content, compresslevel=9, mtime=0))
+        with open(target + ".br", "wb") as file:
+            file.write(brotli.compress(content, quality=11))
+    return fingerprinted
+
+
+def main():
+    vendor_assets()
+    shutil.rmtree(os.path.join(STATIC_DIR, DIST_DIR), ignore_errors=True)
+    manifest = {path: build_asset(path) for path in source_files()}
+    with open(MANIFEST_PATH, "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    for path, fingerprinted in sorted(manifest.items()):
+        print(f"built\t{path}\t{fingerprinted}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Checks that the hot per user movie queries are served by an index instead of a full table scan.
+
+Usage, from the App directory against a migrated database:
+    DATABASE_URL=postgresql://... python -m scripts.check_query_plans
+"""
+import sys
+import json
+from sqlalchemy import select, text
+from db.client import engine
+from db.models.models import Catalog, Leaderboard, Movies
+
+
+HOT_QUERIES = {
+    "get_all_movies": select(Movies).where(Movies.owner_id == 1).order_by(Movies.ranking, Movies.id),
+    "get_movie_by_id": select(Movies).where(Movies.owner_id == 1, Movies.id == 1),
+    "get_movie_by_title": select(Movies).join(Movies.catalog).where(Movies.owner_id == 1,
+                                                                    Catalog.title == "The Godfather"),
+    "get_catalog_movie": select(Catalog).where(Catalog.tmdb_id == 238),
+    "get_leaderboard": select(Leaderboard).where(Leaderboard.board == "most_added").order_by(Leaderboard.position),
+}
+
+
+def postgres_plan(connection, query):
+    """
+    Explains a query in postgres, with sequential scans disabled so small tables still show if an index is usable.
+
+    Args:
+        connection: The database connection
+        query: The select to explain
+
+    Returns:
+        list: The nodes of the plan that scan the movies table or sort without an index
+    """
+    connection.execute(text("SET enable_seqscan = off"))
+    compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+    plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    nodes, bad = [plan[0]["Plan"]], []
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node.get("Plans", []))
+        if node["Node Type"] == "Seq Scan" and node.get("Relation Name") == "movies":
+            bad.append(node["Node Type"])
+        if node["Node Type"] == "Sort":
+            bad.append(node["Node Type"])
+    return bad
+
+
+def sqlite_plan(connection, query):
+    """
+    Explains a query in sqlite.
+
+    Args:
+        connection: The database connection
+        query: The select to explain
+
+    Returns:
+        list: The plan steps that scan the movies table or sort without an index
+    """
+    compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+    steps = [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+    return [step for step in steps if step.startswith("SCAN movies") and "INDEX" not in step
+            or "TEMP B-TREE" in step]
+
+
+def main():
+    explain = postgres_plan if engine.dialect.name == "postgresql" else sqlite_plan
+    failed = False
+    with engine.connect() as connection:
+        for name, query in HOT_QUERIES.items():
+            bad = explain(connection, query)
+            print(f"{'FAIL' if bad else 'ok'}\t{name}\t{', '.join(bad)}")
+            failed = failed or bool(bad)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
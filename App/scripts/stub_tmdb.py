@@ -0,0 +1,99 @@
+"""
+Local stand-in for the TMDB api and image server, answering with deterministic synthetic movies.
+
+Usage, from the App directory:
+    python -m scripts.stub_tmdb --port 8001
+and point the app to it with TMDB_API_URL=http://127.0.0.1:8001 and TMDB_IMAGE_URL=http://127.0.0.1:8001/t/p
+"""
+import re
+import json
+import time
+import zlib
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+SEARCH_RESULTS = 20
+MOVIE_PATH = re.compile(r"^/movie/(\d+)$")
+IMAGE_PATH = re.compile(r"^/t/p/\w+/[\w-]+\.jpg$")
+# Placeholder served as every poster, only its size matters to the benchmark
+IMAGE = b"\xff\xd8\xff" + bytes(16 * 1024) + b"\xff\xd9"
+
+
+def stub_movie(movie_id: int):
+    """
+    Builds the TMDB details of a synthetic movie, always the same for the same id.
+
+    Args:
+        movie_id (int): The TMDB movie id
+
+    Returns:
+        dict: The movie details
+    """
+    return {"id": movie_id,
+            "title": f"Benchmark Movie {movie_id}",
+            "original_title": f"Benchmark Movie {movie_id}",
+            "release_date": f"{1950 + movie_id % 70}-01-01",
+            "overview": f"The synthetic movie number {movie_id}, used to benchmark the app without calling TMDB.",
+            "poster_path": f"/poster{movie_id}.jpg"}
+
+
+def search(query: str):
+    """
+    Builds the TMDB search results of a query, always the same for the same query.
+
+    Args:
+        query (str): The searched title
+
+    Returns:
+        dict: The search response
+    """
+    first = zlib.crc32(query.encode()) % 1_000_000 + 1
+    return {"page": 1, "results": [stub_movie(first + offset) for offset in range(SEARCH_RESULTS)]}
+
+
+class StubTMDBHandler(BaseHTTPRequestHandler):
+    """
+    Answers the TMDB endpoints used by the app, after the configured latency.
+    """
+    latency = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        time.sleep(self.latency)
+        if url.path == "/search/movie":
+            self._send(json.dumps(search(parse_qs(url.query).get("query", [""])[0])).encode(), "application/json")
+        elif MOVIE_PATH.match(url.path):
+            self._send(json.dumps(stub_movie(int(MOVIE_PATH.match(url.path).group(1)))).encode(), "application/json")
+        elif IMAGE_PATH.match(url.path):
+            self._send(IMAGE, "image/jpeg")
+        else:
+            self.send_error(404)
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a stub of the TMDB api")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before every answer")
+    args = parser.parse_args()
+
+    StubTMDBHandler.latency = args.latency
+    server = ThreadingHTTPServer((args.host, args.port), StubTMDBHandler)
+    print(f"stub TMDB listening on http://{args.host}:{args.port}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
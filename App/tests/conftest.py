@@ -0,0 +1,106 @@
+"""
+Shared fixtures of the tests, run from the App directory with `python -m pytest`.
+
+The app is configured before it's imported to use a throwaway SQLite database and poster cache, and a
+local stub of the TMDB api and image server, so the tests never reach the network.
+"""
+import os
+import tempfile
+import threading
+import itertools
+from http.server import ThreadingHTTPServer
+import pytest
+from scripts.stub_tmdb import StubTMDBHandler
+
+
+class ScriptedTMDBHandler(StubTMDBHandler):
+    """
+    Stub TMDB that can be told to fail, it answers the queued replies before the synthetic movies.
+
+    Attributes:
+        replies (list): The (status code, headers) to answer the next requests with, in order.
+        paths (list): The path of every request received.
+
+    """
+    replies = []
+    paths = []
+
+    def do_GET(self):
+        self.paths.append(self.path)
+        if self.replies:
+            status_code, headers = self.replies.pop(0)
+            self.send_response(status_code)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        super().do_GET()
+
+
+TEST_DIR = tempfile.mkdtemp(prefix="mytopmovies-tests-")
+stub_server = ThreadingHTTPServer(("127.0.0.1", 0), ScriptedTMDBHandler)
+threading.Thread(target=stub_server.serve_forever, daemon=True).start()
+STUB_URL = f"http://127.0.0.1:{stub_server.server_port}"
+
+os.environ.pop("CACHE_REDIS_URL", None)
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{TEST_DIR}/tests.db",
+    "SECRET_KEY": "a secret key only used by the tests",
+    "API_KEY": "test",
+    "TMDB_API_URL": STUB_URL,
+    "TMDB_IMAGE_URL": f"{STUB_URL}/t/p",
+    "TMDB_BACKOFF": "0.01",
+    "POSTER_CACHE_DIR": os.path.join(TEST_DIR, "posters"),
+    "TEMPLATE_CACHE_DIR": os.path.join(TEST_DIR, "jinja2"),
+    "RECOMMENDATIONS_MODEL_PATH": os.path.join(TEST_DIR, "recommendations.npz"),
+    "BCRYPT_ROUNDS": "4",
+    "METRICS_TOKEN": "a metrics token only used by the tests",
+})
+METRICS_HEADERS = {"Authorization": f"Bearer {os.environ['METRICS_TOKEN']}"}
+
+usernames = (f"user{number}" for number in itertools.count())
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def stub_tmdb():
+    """
+    The stub TMDB handler, without queued replies or recorded requests.
+    """
+    ScriptedTMDBHandler.replies.clear()
+    ScriptedTMDBHandler.paths.clear()
+    yield ScriptedTMDBHandler
+    ScriptedTMDBHandler.replies.clear()
+
+
+@pytest.fixture(scope="session")
+def app():
+    """
+    The app, started once against a fresh database.
+    """
+    from fastapi.testclient import TestClient
+    from db.client import Base, engine
+    import db.models.models  # noqa: F401, registers the tables
+    import main
+
+    Base.metadata.create_all(engine)
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def client(app):
+    """
+    The app client, signed in as a new user.
+    """
+    username = next(usernames)
+    app.cookies.clear()
+    app.post("/user/signup", data={"username": username, "email": f"{username}@example.com", "password": "password"})
+    response = app.post("/user/signin", data={"username": username, "password": "password"}, follow_redirects=False)
+    assert response.status_code == 303
+    return app
@@ -0,0 +1,29 @@
+import gzip
+import brotli
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from assets import PrecompressedStaticFiles
+
+
+CSS = b"body { color: white; }"
+
+
+@pytest.fixture
+def static_client(tmp_path):
+    (tmp_path / "dist").mkdir()
+    for suffix, content in [("", CSS), (".gz", gzip.compress(CSS)), (".br", brotli.compress(CSS))]:
+        (tmp_path / "dist" / f"styles.0123456789ab.css{suffix}").write_bytes(content)
+    app = FastAPI()
+    app.mount("/static", PrecompressedStaticFiles(directory=str(tmp_path)), name="static")
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("accept_encoding, encoding", [("gzip, br", "br"), ("br;q=0, gzip", "gzip"),
+                                                        ("gzip;q=0", None), ("", None)])
+def test_serves_the_precompressed_variant_the_client_accepts(static_client, accept_encoding, encoding):
+    response = static_client.get("/static/dist/styles.0123456789ab.css", headers={"Accept-Encoding": accept_encoding})
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding") == encoding
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.content == CSS
@@ -0,0 +1,48 @@
+import heapq
+import random
+import autocomplete
+from autocomplete import Title, TitleIndex, compact_titles, normalize, title_keys
+
+
+def titles(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    words = ["star", "stars", "war", "wars", "the", "godfather", "alien", "aliens", "heat", "her"]
+    return [Title(tmdb_id=tmdb_id, title=" ".join(rng.choices(words, k=rng.randint(1, 4))),
+                  users=rng.randint(0, 5), popularity=rng.random()) for tmdb_id in range(1, count + 1)]
+
+
+def expected(index: TitleIndex, query: str, limit: int):
+    prefix = normalize(query)
+    matches = [title for title in index.titles.values() if any(key.startswith(prefix) for key in title_keys(title.title))]
+    return [title.rank() for title in heapq.nlargest(limit, matches, key=Title.rank)]
+
+
+def test_completions_follow_the_additions():
+    known = titles(400)
+    index = TitleIndex.build(known[:300], scan_limit=8)
+    for title in known[300:]:
+        index.add(title)
+    index.add(Title(tmdb_id=7, title=known[6].title, users=50))
+    for query in ["s", "st", "star w", "the", "wars", "g", "her", "alien heat", "x"]:
+        assert [title.rank() for title in index.search(query, 10)] == expected(index, query, 10)
+
+
+def test_compaction_merges_the_recent_keys_and_evicts_the_worst_titles():
+    known = titles(120)
+    index = TitleIndex.build(known[:100], max_titles=100)
+    for title in known[100:]:
+        index.add(title)
+    assert index.needs_compaction()
+    compacted = compact_titles(list(index.titles.values()), index.max_titles)
+    assert len(compacted) == int(100 * autocomplete.EVICTION_RATIO)
+    assert not compacted.needs_compaction()
+    assert [title.rank() for title in compacted.search("star", 8)] == expected(compacted, "star", 8)
+    # The compacted index has its own copies of the titles
+    compacted.add(Title(tmdb_id=compacted.search("star", 1)[0].tmdb_id, title="", users=99))
+    assert max(title.users for title in index.titles.values()) < 99
+
+
+def test_owned_suggestions_open_the_movie(client, stub_tmdb):
+    movie = client.post("/api/v1/movies", json={"tmdb_id": 900501}).json()
+    results = client.get("/api/v1/autocomplete", params={"q": "benchmark movie 900501"}).json()["results"]
+    assert [(result["tmdb_id"], result["movie_id"]) for result in results] == [(900501, movie["id"])]
@@ -0,0 +1,42 @@
+import pytest
+from cache import Cache
+from conftest import METRICS_HEADERS
+
+
+@pytest.mark.anyio
+async def test_serves_without_the_shared_backend_when_it_fails(anyio_backend):
+    # Nothing listens on the port, so every redis call fails
+    cache = Cache("tests", backend_url="redis://127.0.0.1:1/0")
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return {"value": len(calls)}
+
+    assert await cache.fetch("key", loader) == {"value": 1}
+    assert await cache.fetch("key", loader) == {"value": 1}
+    assert len(calls) == 1
+    assert cache.errors == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "errors": 1, "size": 1}
+    await cache.close()
+
+
+def test_cache_counters_are_exposed(client, stub_tmdb):
+    client.post("/api/v1/movies", json={"tmdb_id": 900101})
+    body = client.get("/metrics", headers=METRICS_HEADERS).text
+    assert 'cache_misses_total{cache="tmdb"}' in body
+    assert 'cache_backend_errors_total{cache="tmdb"} 0' in body
+    assert client.get("/metrics/cache", headers=METRICS_HEADERS).json()["tmdb"]["misses"] >= 1
+
+
+def test_movie_cards_follow_the_edits_and_the_rankings(client, stub_tmdb):
+    first = client.post("/api/v1/movies", json={"tmdb_id": 900102}).json()
+    second = client.post("/api/v1/movies", json={"tmdb_id": 900103}).json()
+    assert '<p class="large">1</p>' in client.get("/").text.split("Benchmark Movie 900103")[0]
+    # Changes made within the same second, that the update times can't tell apart
+    client.patch(f"/api/v1/movies/{first['id']}", json={"review": "Seen twice"})
+    client.put("/api/v1/movies/order", json={"movie_ids": [second["id"], first["id"]]})
+    page = client.get("/").text
+    assert "Seen twice" in page
+    assert '<p class="large">2</p>' in page.split("Benchmark Movie 900102")[0]
+    assert f'href="/edit/{first["id"]}"' in page and "http://testserver/edit" not in page
@@ -0,0 +1,30 @@
+import pytest
+from compression import BrotliEncoder, GzipEncoder, negotiate_encoder
+
+
+@pytest.mark.parametrize("accept_encoding, encoder", [
+    ("gzip, deflate, br", BrotliEncoder),
+    ("GZIP", GzipEncoder),
+    ("br;q=0, gzip;q=0.5", GzipEncoder),
+    ("br; q=0.0", None),
+    ("deflate, identity", None),
+    ("", None),
+])
+def test_negotiates_the_best_accepted_encoding(accept_encoding, encoder):
+    assert negotiate_encoder(accept_encoding) is encoder
+
+
+@pytest.mark.parametrize("accept_encoding, encoding", [("gzip, br", "br"), ("br;q=0, gzip", "gzip"),
+                                                        ("identity", None)])
+def test_pages_are_compressed_with_the_negotiated_encoding(client, accept_encoding, encoding):
+    plain = client.get("/", headers={"Accept-Encoding": "identity"})
+    response = client.get("/", headers={"Accept-Encoding": accept_encoding})
+    assert response.headers.get("content-encoding") == encoding
+    assert response.text == plain.text
+    if encoding:
+        assert "Accept-Encoding" in response.headers["vary"]
+
+
+def test_small_responses_are_sent_as_they_are(client):
+    response = client.get("/api/v1/user", headers={"Accept-Encoding": "br"})
+    assert "content-encoding" not in response.headers
@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+import pytest
+import exporter
+
+
+@pytest.fixture
+def exported_movies(client, stub_tmdb):
+    first = client.post("/api/v1/movies", json={"tmdb_id": 900701}).json()
+    second = client.post("/api/v1/movies", json={"tmdb_id": 900702}).json()
+    client.patch(f"/api/v1/movies/{second['id']}", json={"rating": 9.5, "review": 'Tense, "perfect"\nending'})
+    return [second["id"], first["id"]]
+
+
+def test_csv_exports_list_the_movies_by_ranking(client, exported_movies):
+    response = client.get("/export", params={"format": "csv"})
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == 'attachment; filename="movies.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(row["id"], row["ranking"], row["rating"]) for row in rows] == \
+        [(str(exported_movies[0]), "1", "9.5"), (str(exported_movies[1]), "2", "1.0")]
+    assert rows[0]["title"] == "Benchmark Movie 900702"
+    assert rows[0]["review"] == 'Tense, "perfect"\nending'
+
+
+def test_ndjson_exports_match_the_api(client, exported_movies):
+    response = client.get("/export", params={"format": "ndjson"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    movies = [json.loads(line) for line in response.text.splitlines()]
+    assert [movie["id"] for movie in movies] == exported_movies
+    api_movie = client.get(f"/api/v1/movies/{exported_movies[0]}").json()
+    assert {key: api_movie[key] for key in movies[0]} == movies[0]
+
+
+def test_exports_are_gzipped_when_accepted(client, exported_movies):
+    plain = client.get("/export", params={"format": "ndjson"}, headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/export", params={"format": "ndjson"}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in plain.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.text == plain.text
+    assert client.get("/export", params={"format": "xml"}).status_code == 400
+
+
+@pytest.mark.anyio
+async def test_exports_are_sent_in_buffers(monkeypatch, anyio_backend):
+    class Row:
+        def __init__(self, number):
+            self.id, self.title, self.year, self.description = number, f"Movie {number}", 2000, "About it"
+            self.rating, self.ranking, self.review, self.img_url = 5.0, number, "Fine", "poster.jpg"
+            self.owner_id = 1
+
+    async def movies():
+        for number in range(1, 6):
+            yield Row(number)
+
+    monkeypatch.setattr(exporter, "EXPORT_BUFFER_SIZE", 100)
+    chunks = [chunk async for chunk in exporter.export_movies(movies(), "ndjson")]
+    assert len(chunks) > 2
+    assert [json.loads(line)["ranking"] for line in "".join(chunks).splitlines()] == [1, 2, 3, 4, 5]
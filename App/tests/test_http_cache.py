@@ -0,0 +1,20 @@
+from http_cache import make_etag
+
+
+def test_unchanged_pages_are_not_sent_again(client, stub_tmdb):
+    page = client.get("/")
+    etag = page.headers["etag"]
+    assert etag.startswith("W/") and page.headers["cache-control"] == "private, no-cache"
+    revalidated = client.get("/", headers={"If-None-Match": f'"other", {etag.removeprefix("W/")}'})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == etag and revalidated.content == b""
+    client.post("/api/v1/movies", json={"tmdb_id": 900801})
+    changed = client.get("/", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_etags_change_with_any_of_their_parts():
+    assert make_etag(1, "a") == make_etag(1, "a")
+    assert make_etag(1, "a") != make_etag(1, "b")
+    assert make_etag(1, weak=True) == f"W/{make_etag(1)}"
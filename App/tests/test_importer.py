@@ -0,0 +1,70 @@
+import io
+import json
+import pytest
+import importer
+import tmdb
+from scripts.stub_tmdb import stub_movie
+
+
+def read(data: bytes, filename: str = "list.json"):
+    return list(importer.read_rows(io.BytesIO(data), filename))
+
+
+@pytest.mark.parametrize("read_size", [1, 5, importer.JSON_READ_SIZE])
+def test_reads_json_arrays_in_chunks(monkeypatch, read_size):
+    monkeypatch.setattr(importer, "JSON_READ_SIZE", read_size)
+    movies = [{"title": f"Movie {number}", "year": 1950 + number, "rating": number + 0.5} for number in range(50)]
+    rows = read(json.dumps(movies).encode())
+    assert [(row["title"], row["year"], row["rating"]) for row in rows] == \
+        [(movie["title"], movie["year"], movie["rating"]) for movie in movies]
+    assert not any(row["error"] for row in rows)
+
+
+@pytest.mark.parametrize("data, filename, errors", [
+    (b'[{"title": "Alien"}, 3, "Heat"]', "list.json", [None, "Not an object", "Not an object"]),
+    (b'[{"title": "Alien"}, {"title": ', "list.json", [None, "Invalid JSON: Expecting value"]),
+    (b'[{"title": "Alien"} {"title": "Heat"}]', "list.json", [None, "Invalid JSON: Expecting ',' delimiter"]),
+    (b'{"title": "Alien"}\nnot json\n{"title": "Heat"}\n', "list.ndjson", [None, "Invalid JSON: Expecting value", None]),
+    (b'\xff\xfetitle\n', "list.csv", ["The file isn't UTF-8 encoded"]),
+    (b'[{"title": "Alien"}]\xff', "list.json", ["The file isn't UTF-8 encoded"]),
+])
+def test_reports_invalid_files_and_rows(data, filename, errors):
+    assert [row["error"] for row in read(data, filename)] == errors
+
+
+def test_invalid_rows_keep_their_title():
+    row, = read(b"title,year\nAlien,nineteen\n", "list.csv")
+    assert row["title"] == "Alien"
+    assert row["error"] == "Invalid rating or year"
+
+
+def test_import_reports_malformed_files(client, stub_tmdb):
+    response = client.post("/import", files={"file": ("list.json", b'[{"title": "Alien", "year": 1979}, {')})
+    assert response.status_code == 200
+    assert [entry["status"] for entry in response.json()] == ["imported", "invalid"]
+
+
+def test_import_keeps_movies_sharing_a_title(client, stub_tmdb, monkeypatch):
+    async def search_movies(query: str):
+        return [{**stub_movie(900201), "original_title": "Solaris", "release_date": "1972-03-20"},
+                {**stub_movie(900202), "original_title": "Solaris", "release_date": "2002-11-27"}]
+
+    monkeypatch.setattr(tmdb.client, "search_movies", search_movies)
+    rows = b'[{"title": "Solaris", "year": 1972}, {"title": "Solaris", "year": 2002}, {"title": "Solaris", "year": 2002}]'
+    report = client.post("/import", files={"file": ("list.json", rows)}).json()
+    assert [(entry["status"], entry["tmdb_id"]) for entry in report] == \
+        [("imported", 900201), ("imported", 900202), ("duplicate", 900202)]
+
+
+def test_import_reports_why_rows_failed(client, stub_tmdb):
+    stub_tmdb.replies += [(500, {})] * 4
+    response = client.post("/import", files={"file": ("list.json", b'[{"title": "Nosferatu"}]')})
+    assert response.json() == [{"row": 1, "title": "Nosferatu", "status": "error", "error": "TMDB answered 500"}]
+
+
+def test_import_form_renders_the_report(client, stub_tmdb):
+    rows = b'[{"title": "Alien", "year": 1979}, {"title": "Alien", "year": "soon"}]'
+    response = client.post("/import", files={"file": ("list.json", rows)}, headers={"Accept": "text/html"})
+    assert response.headers["content-type"].startswith("text/html")
+    assert "1 of 2 rows imported" in response.text
+    assert "Invalid rating or year" in response.text
@@ -0,0 +1,21 @@
+import leaderboard
+
+
+def sign_in(app, username: str):
+    app.cookies.clear()
+    app.post("/user/signup", data={"username": username, "email": f"{username}@example.com", "password": "password"})
+    app.post("/user/signin", data={"username": username, "password": "password"})
+
+
+def test_owned_movies_link_to_their_edit_page(app, stub_tmdb, monkeypatch):
+    sign_in(app, "leaderboard_other")
+    app.post("/api/v1/movies", json={"tmdb_id": 900402})
+    sign_in(app, "leaderboard_owner")
+    owned = app.post("/api/v1/movies", json={"tmdb_id": 900401}).json()
+
+    monkeypatch.setattr(leaderboard.refresher, "size", 10000)
+    app.portal.call(leaderboard.refresher.refresh)
+    page = app.get("/leaderboard").text
+    assert f"/edit/{owned['id']}\"" in page
+    assert "/get_movie_data/900401\"" not in page
+    assert "/get_movie_data/900402\"" in page
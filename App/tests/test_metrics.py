@@ -0,0 +1,21 @@
+import pytest
+from routers import metrics
+from conftest import METRICS_HEADERS
+
+
+METRICS_URLS = ["/metrics", "/metrics/db_pool", "/metrics/posters", "/metrics/cache"]
+
+
+@pytest.mark.parametrize("url", METRICS_URLS)
+def test_metrics_require_the_token(app, url):
+    assert app.get(url, headers=METRICS_HEADERS).status_code == 200
+    missing = app.get(url)
+    assert missing.status_code == 401
+    assert missing.headers["www-authenticate"] == "Bearer"
+    assert app.get(url, headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+
+@pytest.mark.parametrize("url", METRICS_URLS)
+def test_metrics_are_disabled_without_a_token(app, url, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", None)
+    assert app.get(url, headers=METRICS_HEADERS).status_code == 404
@@ -0,0 +1,118 @@
+def test_adding_an_owned_movie_again_is_a_conflict(client, stub_tmdb):
+    created = client.post("/api/v1/movies", json={"tmdb_id": 900301})
+    assert created.status_code == 201
+    again = client.post("/api/v1/movies", json={"tmdb_id": 900301})
+    assert again.status_code == 409
+    assert again.json()["detail"]["id"] == created.json()["id"]
+
+
+def test_adding_an_owned_movie_again_opens_it(client, stub_tmdb):
+    first = client.get("/get_movie_data/900302", follow_redirects=False)
+    second = client.get("/get_movie_data/900302", follow_redirects=False)
+    assert first.status_code == second.status_code == 303
+    assert first.headers["location"] == second.headers["location"]
+    assert len(client.get("/api/v1/movies").json()["movies"]) == 1
+
+
+def test_every_change_of_the_list_changes_its_etag(client, stub_tmdb):
+    movie = client.post("/api/v1/movies", json={"tmdb_id": 900303}).json()
+    etags = [client.get("/api/v1/movies").headers["etag"]]
+    # Changes made within the same second, that the update times can't tell apart
+    client.patch(f"/api/v1/movies/{movie['id']}", json={"review": "Seen twice"})
+    etags.append(client.get("/api/v1/movies").headers["etag"])
+    client.delete(f"/api/v1/movies/{movie['id']}")
+    client.post("/api/v1/movies", json={"tmdb_id": 900303})
+    etags.append(client.get("/api/v1/movies").headers["etag"])
+    assert len(set(etags)) == 3
+    stale = client.get("/api/v1/movies", headers={"If-None-Match": etags[0]})
+    assert stale.status_code == 200
+    assert client.get("/api/v1/movies", headers={"If-None-Match": etags[-1]}).status_code == 304
+
+
+def catalog_stats(tmdb_id: int):
+    from sqlalchemy import select
+    from db.client import engine
+    from db.models.models import Catalog, CatalogStats
+
+    with engine.connect() as connection:
+        return connection.execute(select(CatalogStats.movie_count, CatalogStats.rating_sum)
+                                  .join(Catalog, Catalog.id == CatalogStats.catalog_id)
+                                  .where(Catalog.tmdb_id == tmdb_id)).one()
+
+
+def test_rating_changes_replace_the_rating_in_the_catalog_stats(client, stub_tmdb):
+    movie = client.post("/api/v1/movies", json={"tmdb_id": 900304}).json()
+    assert client.patch(f"/api/v1/movies/{movie['id']}", json={"rating": 7.5}).status_code == 200
+    assert client.patch(f"/api/v1/movies/{movie['id']}", json={"review": "Better"}).status_code == 200
+    stale = client.patch(f"/api/v1/movies/{movie['id']}", json={"rating": 2.0, "version": movie["version"]})
+    assert stale.status_code == 409
+    assert tuple(catalog_stats(900304)) == (1, 7.5)
+
+
+def test_empty_changes_keep_the_list_etag(client, stub_tmdb):
+    movie = client.post("/api/v1/movies", json={"tmdb_id": 900305}).json()
+    etag = client.get("/api/v1/movies").headers["etag"]
+    response = client.patch(f"/api/v1/movies/{movie['id']}", json={})
+    assert response.status_code == 200
+    assert response.json()["version"] == movie["version"]
+    assert client.get("/api/v1/movies").headers["etag"] == etag
+
+
+def test_only_rating_changes_recompute_the_rankings(client, stub_tmdb, monkeypatch):
+    from routers import api
+
+    reranked = []
+    update_movie_rankings = api.update_movie_rankings
+
+    async def counted(db, user_id):
+        reranked.append(user_id)
+        await update_movie_rankings(db=db, user_id=user_id)
+
+    monkeypatch.setattr(api, "update_movie_rankings", counted)
+    movie = client.post("/api/v1/movies", json={"tmdb_id": 900306}).json()
+    etag = client.get("/api/v1/movies").headers["etag"]
+    client.patch(f"/api/v1/movies/{movie['id']}", json={"review": "Seen again"})
+    client.patch(f"/api/v1/movies/{movie['id']}", json={"rating": movie["rating"]})
+    assert reranked == []
+    assert client.get("/api/v1/movies").headers["etag"] != etag
+    client.patch(f"/api/v1/movies/{movie['id']}", json={"rating": 9.0})
+    assert len(reranked) == 1
+
+
+def test_manual_orders_are_kept_until_dropped(client, stub_tmdb):
+    ids = [client.post("/api/v1/movies", json={"tmdb_id": tmdb_id}).json()["id"]
+           for tmdb_id in (900307, 900308, 900309)]
+    assert client.put("/api/v1/movies/order", json={"movie_ids": ids[:2]}).status_code == 400
+    assert client.put("/api/v1/movies/order", json={"movie_ids": [ids[0], *ids]}).status_code == 400
+    assert client.put("/api/v1/movies/order", json={"movie_ids": ids[::-1]}).status_code == 204
+    client.patch(f"/api/v1/movies/{ids[0]}", json={"rating": 9.0})
+    client.delete(f"/api/v1/movies/{ids[1]}")
+    added = client.post("/api/v1/movies", json={"tmdb_id": 900310}).json()
+    page = client.get("/api/v1/movies", params={"limit": 2}).json()
+    rest = client.get("/api/v1/movies", params={"after": page["next_cursor"]}).json()["movies"]
+    assert [movie["id"] for movie in page["movies"] + rest] == [ids[2], ids[0], added["id"]]
+    assert [movie["ranking"] for movie in page["movies"] + rest] == [1, 2, 3]
+    assert client.delete("/api/v1/movies/order").status_code == 204
+    movies = client.get("/api/v1/movies", params={"limit": 2}).json()["movies"]
+    assert [movie["id"] for movie in movies] == [ids[0], ids[2]]
+
+
+def test_blank_searches_match_nothing(client, stub_tmdb):
+    movie = client.post("/api/v1/movies", json={"tmdb_id": 900311}).json()
+    assert client.get("/api/v1/movies/search", params={"q": "   "}).json() == {"results": []}
+    results = client.get("/api/v1/movies/search", params={"q": " 900311 "}).json()["results"]
+    assert [result["id"] for result in results] == [movie["id"]]
+
+
+def test_pages_split_equal_ratings_without_gaps_or_repeats(client, stub_tmdb):
+    ids = [client.post("/api/v1/movies", json={"tmdb_id": tmdb_id}).json()["id"] for tmdb_id in range(900312, 900317)]
+    client.patch(f"/api/v1/movies/{ids[3]}", json={"rating": 8.0})
+    listed, cursor = [], None
+    while True:
+        page = client.get("/api/v1/movies", params={"limit": 2, **({"after": cursor} if cursor else {})}).json()
+        listed.extend(movie["id"] for movie in page["movies"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert listed == [ids[3], ids[0], ids[1], ids[2], ids[4]]
+    assert client.get("/api/v1/movies", params={"after": "1.0:2"}).status_code == 400
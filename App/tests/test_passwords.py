@@ -0,0 +1,48 @@
+import threading
+import anyio
+import pytest
+from passlib.context import CryptContext
+from sqlalchemy import select
+import passwords
+from exceptions import ServiceBusyException
+
+
+def stored_hash(username: str):
+    from db.client import engine
+    from db.models.models import Users
+
+    with engine.connect() as connection:
+        return connection.scalar(select(Users.password).where(Users.username == username))
+
+
+@pytest.mark.anyio
+async def test_operations_beyond_the_queue_limit_are_refused(monkeypatch, anyio_backend):
+    monkeypatch.setattr(passwords, "PASSWORD_QUEUE_LIMIT", 1)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_hash(password):
+        started.set()
+        release.wait(5)
+        return password
+
+    async with anyio.create_task_group() as tasks:
+        tasks.start_soon(passwords._run, slow_hash, "first")
+        await anyio.to_thread.run_sync(started.wait, 5)
+        with pytest.raises(ServiceBusyException):
+            await passwords.get_password_hash("second")
+        release.set()
+    assert await passwords.get_password_hash("third") != "third"
+
+
+def test_login_rehashes_passwords_of_an_outdated_cost(app, monkeypatch):
+    app.cookies.clear()
+    app.post("/user/signup", data={"username": "rehashed", "email": "rehashed@example.com", "password": "password"})
+    assert stored_hash("rehashed").startswith("$2b$04$")
+    monkeypatch.setattr(passwords, "pwd_context", CryptContext(schemes=["bcrypt"], deprecated="auto",
+                                                               bcrypt__rounds=5, bcrypt__min_rounds=5))
+    response = app.post("/user/signin", data={"username": "rehashed", "password": "password"}, follow_redirects=False)
+    assert response.status_code == 303
+    assert stored_hash("rehashed").startswith("$2b$05$")
+    wrong = app.post("/user/signin", data={"username": "rehashed", "password": "wrong"}, follow_redirects=False)
+    assert wrong.status_code == 200
+    assert stored_hash("rehashed").startswith("$2b$05$")
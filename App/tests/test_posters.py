@@ -0,0 +1,57 @@
+import os
+import shutil
+import pytest
+import posters
+from scripts.stub_tmdb import IMAGE
+
+
+@pytest.fixture
+def poster_cache(tmp_path, anyio_backend):
+    return posters.PosterCache(str(tmp_path), max_bytes=len(IMAGE))
+
+
+@pytest.mark.anyio
+async def test_downloads_a_poster_once(poster_cache, stub_tmdb):
+    path, digest = await poster_cache.get("poster1.jpg", "w92")
+    assert await poster_cache.get("poster1.jpg", "w92") == (path, digest)
+    with open(path, "rb") as blob:
+        assert blob.read() == IMAGE
+    assert stub_tmdb.paths == ["/t/p/w92/poster1.jpg"]
+    assert (poster_cache.hits, poster_cache.misses) == (1, 1)
+
+
+def test_serves_posters(client, stub_tmdb):
+    response = client.get("/posters/poster4.jpg?size=w154")
+    assert response.status_code == 200
+    assert response.content == IMAGE
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.headers["content-length"] == str(len(IMAGE))
+    revalidated = client.get("/posters/poster4.jpg?size=w154", headers={"If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+def test_revalidates_posters_without_the_cache(client, stub_tmdb):
+    etag = client.get("/posters/poster2.jpg?size=w92").headers["etag"]
+    shutil.rmtree(os.path.join(posters.cache.directory, "blobs"))
+    assert client.get("/posters/poster2.jpg?size=w92", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/posters/poster2.jpg?size=w185", headers={"If-None-Match": etag}).status_code == 200
+    assert stub_tmdb.paths == ["/t/p/w92/poster2.jpg", "/t/p/w185/poster2.jpg"]
+
+
+def test_serves_evicted_posters_again(client, stub_tmdb):
+    assert client.get("/posters/poster5.jpg?size=w185").status_code == 200
+    shutil.rmtree(os.path.join(posters.cache.directory, "blobs"))
+    response = client.get("/posters/poster5.jpg?size=w185")
+    assert response.status_code == 200
+    assert response.content == IMAGE
+    assert len(stub_tmdb.paths) == 2
+
+
+@pytest.mark.parametrize("url", ["/posters/poster6.jpg?size=w1", "/posters/..%2Fposter6.jpg", "/posters/poster6.png"])
+def test_unknown_posters_are_not_found(client, stub_tmdb, url):
+    assert client.get(url).status_code == 404
+
+
+def test_tmdb_errors_are_bad_gateway(client, stub_tmdb):
+    stub_tmdb.replies += [(500, {})] * 4
+    assert client.get("/posters/poster7.jpg?size=w342").status_code == 502
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import recommendations
+from recommendations import Recommender, RecommendationModel, build_model
+
+
+def small_model(memory_bytes: int = 2 ** 20):
+    user_ids = np.array([1, 1, 2, 2, 3])
+    item_ids = np.array([10, 11, 10, 11, 11])
+    ratings = np.array([8, 7, 9, 6, 5], np.float32)
+    return build_model(user_ids, item_ids, ratings, k=2, memory_bytes=memory_bytes)
+
+
+def test_updates_apply_changed_ratings():
+    model = small_model().updated({(3, 10): 4.0, (1, 11): None, (4, 12): 7.0})
+    assert model.ratings[model.user_index[3], model.item_index[10]] == 4.0
+    assert model.ratings[model.user_index[1], model.item_index[11]] == 0
+    assert 12 in model.item_index
+
+
+def test_updates_stay_within_the_memory_budget():
+    model = small_model()
+    full = RecommendationModel(model.ratings, model.user_ids, model.item_ids, model.neighbors, model.weights,
+                               model.nbytes)
+    updated = full.updated({(4, 12): 7.0, (3, 10): 4.0, (1, 10): 3.0})
+    assert 4 not in updated.user_index and 12 not in updated.item_index
+    assert updated.ratings[updated.user_index[3], updated.item_index[10]] == 0
+    assert updated.ratings[updated.user_index[1], updated.item_index[10]] == 3.0
+    assert updated.nbytes <= full.memory_bytes
+
+
+def test_saved_models_load_the_same(tmp_path):
+    model = small_model()
+    path = str(tmp_path / "model.npz")
+    model.save(path)
+    loaded = RecommendationModel.load(path)
+    assert (loaded.ratings != model.ratings).nnz == 0
+    assert loaded.item_index == model.item_index and loaded.memory_bytes == model.memory_bytes
+    assert loaded.recommend({10: 8.0}, 5) == model.recommend({10: 8.0}, 5)
+
+
+@pytest.mark.anyio
+async def test_workers_load_the_model_another_one_just_built(tmp_path, monkeypatch, anyio_backend):
+    path = str(tmp_path / "model.npz")
+    small_model().save(path)
+
+    async def load_ratings(db):
+        raise AssertionError("The ratings were read again")
+
+    monkeypatch.setattr(recommendations, "load_ratings", load_ratings)
+    worker = Recommender(model_path=path)
+    worker.record(3, 10, 4.0)
+    assert await worker.rebuild()
+    assert worker.model.item_index == {10: 0, 11: 1}
+    await worker.update()
+    assert worker.model.ratings[worker.model.user_index[3], 0] == 4.0
+
+
+@pytest.mark.anyio
+async def test_only_the_worker_holding_the_lock_rebuilds(tmp_path, anyio_backend):
+    path = str(tmp_path / "model.npz")
+    with recommendations.try_lock(f"{path}.lock") as locked:
+        assert locked
+        assert not await Recommender(model_path=path).rebuild()
+
+
+def test_ratings_are_queued_once_changed(client, stub_tmdb, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(recommendations.recommender, "record",
+                        lambda user_id, catalog_id, rating=None: recorded.append(rating))
+    movie = client.post("/api/v1/movies", json={"tmdb_id": 900401}).json()
+    client.patch(f"/api/v1/movies/{movie['id']}", json={"rating": 7.5})
+    stale = client.patch(f"/api/v1/movies/{movie['id']}", json={"rating": 3.0, "version": movie["version"]})
+    assert stale.status_code == 409
+    client.delete(f"/api/v1/movies/{movie['id']}")
+    assert recorded == [movie["rating"], 7.5, None]
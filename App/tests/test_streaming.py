@@ -0,0 +1,35 @@
+import pytest
+from jinja2 import DictLoader, Environment
+from markupsafe import Markup
+from routers import routes
+
+
+@pytest.mark.anyio
+async def test_streamed_templates_are_sent_at_their_flush_points(monkeypatch, anyio_backend):
+    env = Environment(loader=DictLoader({"page.html": "head{{ flush() }}{% for n in numbers %}{{ n }}{{ flush() }}"
+                                                      "{% endfor %}tail"}), enable_async=True)
+    env.globals["flush"] = lambda: Markup(routes.STREAM_FLUSH_MARKER)
+    monkeypatch.setattr(routes, "streaming_env", env)
+    monkeypatch.setattr(routes, "STREAM_FLUSH_BYTES", 2)
+
+    async def numbers():
+        for number in range(5):
+            yield number
+
+    chunks = [chunk async for chunk in routes.stream_template("page.html", {"numbers": numbers()})]
+    assert chunks == ["head", "01", "23", "4tail"]
+
+
+def test_streamed_home_lists_every_movie(client, stub_tmdb, monkeypatch):
+    ids = [client.post("/api/v1/movies", json={"tmdb_id": tmdb_id}).json()["id"] for tmdb_id in (900601, 900602)]
+    monkeypatch.setattr(routes, "MOVIES_PAGE_SIZE", 1)
+    paged = client.get("/")
+    monkeypatch.setattr(routes, "HOME_STREAMING", True)
+    streamed = client.get("/")
+    assert streamed.status_code == 200
+    assert streamed.headers["content-type"].startswith("text/html")
+    assert all(f'href="/edit/{movie_id}"' in streamed.text for movie_id in ids)
+    assert f'href="/edit/{ids[1]}"' not in paged.text
+    assert routes.STREAM_FLUSH_MARKER not in streamed.text and 'data-next-cursor=""' in streamed.text
+    assert streamed.headers["etag"] != paged.headers["etag"]
+    assert client.get("/", headers={"If-None-Match": streamed.headers["etag"]}).status_code == 304
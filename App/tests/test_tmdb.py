@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+import httpx
+import pytest
+import tmdb
+from cache import Cache
+
+
+@pytest.fixture
+async def tmdb_client(anyio_backend):
+    client = tmdb.TMDBClient("test", retries=2, backoff=0.01, cache=Cache("tests"))
+    await client.start()
+    yield client
+    await client.close()
+
+
+def test_retry_after_reads_seconds_and_dates():
+    in_30_seconds = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert tmdb.retry_after("2", 0.5) == 2.0
+    assert 28 <= tmdb.retry_after(in_30_seconds, 0.5) <= 30
+    assert tmdb.retry_after("Wed, 21 Oct 2015 07:28:00 GMT", 0.5) == 0.0
+    assert tmdb.retry_after("soon", 0.5) == 0.5
+    assert tmdb.retry_after(None, 0.5) == 0.5
+
+
+@pytest.mark.anyio
+async def test_get_movie(tmdb_client, stub_tmdb):
+    movie = await tmdb_client.get_movie(5)
+    assert movie["id"] == 5
+    assert tmdb.to_catalog_movie(movie).title == "Benchmark Movie 5"
+
+
+@pytest.mark.anyio
+async def test_search_is_cached(tmdb_client, stub_tmdb):
+    first = await tmdb_client.search_movies("The  Godfather")
+    second = await tmdb_client.search_movies("the godfather")
+    assert first == second
+    assert len(stub_tmdb.paths) == 1
+
+
+@pytest.mark.anyio
+async def test_retries_with_an_http_date_retry_after(tmdb_client, stub_tmdb):
+    stub_tmdb.replies += [(429, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}), (503, {"Retry-After": "0"})]
+    movie = await tmdb_client.get_movie(6)
+    assert movie["id"] == 6
+    assert len(stub_tmdb.paths) == 3
+
+
+@pytest.mark.anyio
+async def test_long_retry_after_fails_right_away(tmdb_client, stub_tmdb):
+    stub_tmdb.replies += [(429, {"Retry-After": "3600"})]
+    with pytest.raises(httpx.HTTPStatusError) as error:
+        await tmdb_client.get_movie(9)
+    assert error.value.response.status_code == 429
+    assert len(stub_tmdb.paths) == 1
+
+
+@pytest.mark.anyio
+async def test_gives_up_after_the_retries(tmdb_client, stub_tmdb):
+    stub_tmdb.replies += [(500, {})] * 3
+    with pytest.raises(httpx.HTTPStatusError):
+        await tmdb_client.get_movie(7)
+    assert len(stub_tmdb.paths) == 3
+
+
+@pytest.mark.anyio
+async def test_not_found_isnt_retried(tmdb_client, stub_tmdb):
+    stub_tmdb.replies.append((404, {}))
+    with pytest.raises(httpx.HTTPStatusError) as error:
+        await tmdb_client.get_movie(8)
+    assert error.value.response.status_code == 404
+    assert len(stub_tmdb.paths) == 1
+
+
+def test_unknown_movie_is_not_found(client, stub_tmdb):
+    stub_tmdb.replies.append((404, {}))
+    assert client.post("/api/v1/movies", json={"tmdb_id": 900001}).status_code == 404
+    stub_tmdb.replies.append((404, {}))
+    assert client.get("/get_movie_data/900002", follow_redirects=False).status_code == 404
+
+
+def test_adds_a_movie_from_tmdb(client, stub_tmdb):
+    response = client.post("/api/v1/movies", json={"tmdb_id": 900003})
+    assert response.status_code == 201
+    assert response.json()["title"] == "Benchmark Movie 900003"
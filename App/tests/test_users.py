@@ -0,0 +1,28 @@
+from routers import routes
+
+
+def test_identities_are_loaded_once_per_cache_lifetime(client, monkeypatch):
+    loaded = []
+    get_user_identity = routes.get_user_identity
+
+    async def counted(username):
+        loaded.append(username)
+        return await get_user_identity(username)
+
+    monkeypatch.setattr(routes, "get_user_identity", counted)
+    routes.user_cache.clear()
+    assert client.get("/api/v1/user").status_code == 200
+    assert client.get("/api/v1/user").status_code == 200
+    assert len(loaded) == 1
+
+
+def test_password_changes_drop_the_cached_identity(client):
+    username = client.get("/api/v1/user").json()["username"]
+    assert routes.user_cache.get(username) is not None
+    response = client.post("/forgot_password", data={"username": username, "old_password": "password",
+                                                     "new_password": "changed", "confirm_password": "changed"},
+                           follow_redirects=False)
+    assert response.status_code == 303
+    assert routes.user_cache.get(username) is None
+    signin = client.post("/user/signin", data={"username": username, "password": "changed"}, follow_redirects=False)
+    assert signin.status_code == 303
@@ -0,0 +1,211 @@
+import os
+import random
+import asyncio
+import httpx
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from cache import Cache
+from instrumentation import span, EXTERNAL_DURATION
+from db.schemas.schemas import CatalogMovieCreate
+
+
+API_KEY = os.environ.get("API_KEY")
+TMDB_API_URL = os.environ.get("TMDB_API_URL", "https://api.themoviedb.org/3")
+TBD_SEARCH_API = f"{TMDB_API_URL}/search/movie"
+TBD_GET_API = f"{TMDB_API_URL}/movie"
+TMDB_IMAGE_URL = os.environ.get("TMDB_IMAGE_URL", "https://image.tmdb.org/t/p")
+IMAGE_PATH = "https://image.tmdb.org/t/p/w500"
+
+TMDB_TIMEOUT = float(os.environ.get("TMDB_TIMEOUT", 5.0))
+TMDB_MAX_CONNECTIONS = int(os.environ.get("TMDB_MAX_CONNECTIONS", 20))
+TMDB_MAX_IN_FLIGHT = int(os.environ.get("TMDB_MAX_IN_FLIGHT", 10))
+TMDB_RETRIES = int(os.environ.get("TMDB_RETRIES", 3))
+TMDB_BACKOFF = float(os.environ.get("TMDB_BACKOFF", 0.25))
+TMDB_CACHE_TTL = float(os.environ.get("TMDB_CACHE_TTL", 3600))
+TMDB_CACHE_SIZE = int(os.environ.get("TMDB_CACHE_SIZE", 2048))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def retry_after(value: str, default: float):
+    """
+    Reads how long to wait before retrying from a Retry-After header.
+
+    Args:
+        value (str): The header, either a number of seconds or an HTTP date, None if it wasn't sent
+        default (float): The seconds to wait if the header is missing or can't be parsed
+
+    Returns:
+        float: The seconds to wait, never negative
+    """
+    if value is None:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class TMDBClient:
+    """
+    Asynchronous client for the TMDB API shared by every request of a worker.
+
+    The underlying connection pool is created once on startup and kept alive between requests,
+    every call is bounded by a timeout, the number of in flight calls is capped by a semaphore
+    and failed calls are retried with exponential backoff. Search and detail responses are served
+    through a read-through cache.
+
+    Attributes:
+        api_key (str): The TMDB api key.
+        timeout (float): Seconds to wait for connect, read, write and pool operations.
+        max_connections (int): Maximum number of connections kept in the pool.
+        max_in_flight (int): Maximum number of concurrent calls to TMDB per worker.
+        retries (int): How many times a failed call is retried.
+        backoff (float): Base delay in seconds between retries, doubled on every attempt.
+        cache (Cache): Cache for the search and detail responses.
+
+    """
+    def __init__(self, api_key: str, timeout: float = TMDB_TIMEOUT, max_connections: int = TMDB_MAX_CONNECTIONS,
+                 max_in_flight: int = TMDB_MAX_IN_FLIGHT, retries: int = TMDB_RETRIES, backoff: float = TMDB_BACKOFF,
+                 cache: Cache = None):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache or Cache("tmdb", maxsize=TMDB_CACHE_SIZE, ttl=TMDB_CACHE_TTL)
+        self._client = None
+        self._semaphore = None
+
+    async def start(self):
+        """
+        Opens the connection pool, it's called once when the application starts.
+        """
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+        self._client = httpx.AsyncClient(timeout=httpx.Timeout(self.timeout), limits=limits)
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    async def close(self):
+        """
+        Closes the connection pool, it's called once when the application shuts down.
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        await self.cache.close()
+
+    async def _request(self, url: str, params: dict = None):
+        """
+        Performs a GET request against TMDB retrying timeouts, connection errors and retryable status codes.
+        The time spent, retries included, is recorded as an external call. A Retry-After longer than the
+        timeout fails the request right away rather than holding the handler for that long.
+
+        Args:
+            url (str): The TMDB endpoint
+            params (dict): The query parameters
+
+        Returns:
+            httpx.Response: The successful response
+
+        Raises:
+            httpx.HTTPError: If the request keeps failing after all the retries
+        """
+        with span(f"tmdb {url}", EXTERNAL_DURATION.labels("tmdb")):
+            for attempt in range(self.retries + 1):
+                try:
+                    async with self._semaphore:
+                        response = await self._client.get(url, params=params)
+                    if response.status_code not in RETRY_STATUS_CODES or attempt == self.retries:
+                        response.raise_for_status()
+                        return response
+                    delay = retry_after(response.headers.get("Retry-After"), self.backoff * 2 ** attempt)
+                    if delay > self.timeout:
+                        response.raise_for_status()
+                except httpx.TransportError:
+                    if attempt == self.retries:
+                        raise
+                    delay = self.backoff * 2 ** attempt
+                await asyncio.sleep(delay + random.uniform(0, self.backoff))
+
+    async def _get(self, url: str, params: dict):
+        """
+        Performs an authenticated GET request against the TMDB api.
+
+        Args:
+            url (str): The TMDB endpoint
+            params (dict): The query parameters, without the api key
+
+        Returns:
+            dict: The decoded json response
+        """
+        response = await self._request(url, {"api_key": self.api_key, **params})
+        return response.json()
+
+    async def search_movies(self, query: str):
+        """
+        Searches movies in TMDB by title.
+
+        Args:
+            query (str): The movie title to search
+
+        Returns:
+            list: The matched movies
+        """
+        query = " ".join(query.lower().split())
+        output = await self.cache.fetch(f"search:{query}", lambda: self._get(TBD_SEARCH_API, {"query": query}))
+        return output["results"]
+
+    async def get_movie(self, movie_id: int):
+        """
+        Gets the details of a movie from TMDB.
+
+        Args:
+            movie_id (int): The TMDB movie id
+
+        Returns:
+            dict: The movie details
+        """
+        return await self.cache.fetch(f"movie:{movie_id}",
+                                      lambda: self._get(f"{TBD_GET_API}/{movie_id}", {"language": "en-US"}))
+
+    async def get_image(self, path: str, size: str):
+        """
+        Downloads an image from the TMDB image server, the api key isn't sent.
+
+        Args:
+            path (str): The image file name, as in the poster_path of a movie without the leading slash
+            size (str): The TMDB image size, like "w342" or "original"
+
+        Returns:
+            tuple: The image bytes and their content type
+        """
+        response = await self._request(f"{TMDB_IMAGE_URL}/{size}/{path}")
+        return response.content, response.headers.get("content-type", "image/jpeg")
+
+
+def to_catalog_movie(movie: dict):
+    """
+    Converts a TMDB search result or movie details into a catalog entry.
+
+    Args:
+        movie (dict): The TMDB movie
+
+    Returns:
+        CatalogMovieCreate: The catalog entry of the movie
+    """
+    return CatalogMovieCreate(tmdb_id=movie["id"],
+                              title=movie["original_title"],
+                              year=movie["release_date"].split("-")[0],
+                              description=movie["overview"],
+                              img_url=f"{IMAGE_PATH}{movie['poster_path']}")
+
+
+client = TMDBClient(API_KEY)